@@ -0,0 +1,42 @@
+"""
+Batch compile throughput (`src.models.batch_compile`) for growing pool sizes.
+Needs a LaTeX engine in PATH (e.g. inside the Docker image). Run from the
+repo root:
+
+    python -m benchmarks.bench_compile --jobs 48 --workers 1 2 4
+"""
+import os
+import json
+import argparse
+import tempfile
+import itertools
+
+from src.models.batch_compile import LATEX_ENGINE, default_workers, run_batch
+from src.models.inference import LAYOUTS, COMPONENT_TYPES, POSITIONS
+
+def write_manifest(path, jobs):
+    combos = itertools.cycle(itertools.product(LAYOUTS, COMPONENT_TYPES, POSITIONS))
+    with open(path, "w") as f:
+        for _, (layout, c_type, pos) in zip(range(jobs), combos):
+            f.write(json.dumps({"layout": layout, "type": c_type, "pos": pos}) + "\n")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=48)
+    parser.add_argument("--engine", default=LATEX_ENGINE)
+    parser.add_argument("--workers", type=int, nargs="+", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_compile_")
+    manifest = os.path.join(workdir, "manifest.jsonl")
+    write_manifest(manifest, args.jobs)
+
+    workers = args.workers or sorted({1, 2, default_workers(args.engine)})
+    print(f"{'workers':>8} {'jobs/s':>8} {'p50 s':>7} {'p95 s':>7} {'failed':>7}")
+    for n in workers:
+        stats = run_batch(manifest, os.path.join(workdir, f"w{n}"), args.engine, n)
+        print(f"{n:>8} {stats['jobs_per_second']:>8.2f} {stats['compile_p50']:>7.2f} "
+              f"{stats['compile_p95']:>7.2f} {stats['failed']:>7}")
+
+if __name__ == "__main__":
+    main()
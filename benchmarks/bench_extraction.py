@@ -0,0 +1,153 @@
+"""
+Line extraction of a large PDF: the original dict-per-line extractor vs
+`src.data.extraction` (compact records, one process and page-parallel).
+Reports pages/sec for the worker side
+(extract + pickle) and for the parent side (unpickle + buffer into the
+LayoutFeatureWriter), which is the single-threaded stage of the pipeline.
+The compact format speeds up the parent side; the worker side stays within
+noise of the original, since PyMuPDF's "dict" extraction dominates it.
+Row parity with the original extractor is checked by tests/test_labeling.py.
+Run from the repo root:
+
+    python -m benchmarks.bench_extraction --pages 300 --workers 4
+"""
+import os
+import time
+import pickle
+import argparse
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")  # src.data.* reads it at import
+
+from benchmarks.fixtures import make_pdf
+from src.data.extraction import extract_pdf, sanitize_text
+from src.data.feature_writer import LayoutFeatureWriter
+from src.data.labeling import label_lines
+
+def legacy_extract_layout_rows(doc):
+    """
+    The extractor as it was before the compact record format (kept for timing).
+    Yields one dict per image block / text line, keyed by LayoutFeatures columns
+    (without pdf_id, which is assigned by the caller). Text lines are labeled
+    one page at a time with the vectorized heuristic labeler.
+    """
+    for page_num, page in enumerate(doc):
+        _, _, page_w, page_h = page.rect
+        blocks = page.get_text("dict")["blocks"]
+        page_dims = dict(page_number=page_num, page_width=round(page_w, 2), page_height=round(page_h, 2))
+
+        page_rows = []
+        text_rows = []
+        line_attrs = []
+
+        for b in blocks:
+            # IMAGE BLOCK
+            if b["type"] == 1:
+                page_rows.append(dict(
+                    is_image=True,
+                    x0=round(b["bbox"][0], 2), y0=round(b["bbox"][1], 2),
+                    width=round(b["bbox"][2]-b["bbox"][0], 2),
+                    height=round(b["bbox"][3]-b["bbox"][1], 2),
+                    label="image", **page_dims
+                ))
+                continue
+
+            # TEXT BLOCK
+            if "lines" in b:
+                for l in b["lines"]:
+                    # --- AGGREGATE SPANS INTO A SINGLE LINE ---
+                    line_text_parts = []
+                    sizes = []
+                    bolds = []
+
+                    for s in l["spans"]:
+                        line_text_parts.append(s["text"])
+                        sizes.append(s["size"])
+                        bolds.append("bold" in s["font"].lower())
+
+                    full_text = " ".join(line_text_parts).strip()
+                    full_text = sanitize_text(full_text) # <--- FIX APPLIED HERE
+
+                    if not full_text: continue
+
+                    # Calculate Line Attributes
+                    avg_size = sum(sizes) / len(sizes)
+                    is_bold = sum(bolds) > (len(bolds) / 2)
+                    x0, y0, x1, y1 = l["bbox"]
+                    width = x1 - x0
+                    height = y1 - y0
+
+                    row = dict(
+                        text_content=full_text[:1000], # Truncate if huge
+                        font_size=round(avg_size, 2),
+                        is_bold=is_bold,
+                        x0=round(x0, 2), y0=round(y0, 2),
+                        width=round(width, 2),
+                        height=round(height, 2),
+                        **page_dims
+                    )
+                    page_rows.append(row)
+                    text_rows.append(row)
+                    line_attrs.append((avg_size, is_bold, x0, y0, width))
+
+        # Heuristic Labeling (whole page at once, on unrounded values)
+        if line_attrs:
+            size, bold, x0, y0, width = zip(*line_attrs)
+            labels = label_lines(size, bold, x0, y0, width, page_w, page_h)
+            for row, label in zip(text_rows, labels.tolist()):
+                row["label"] = label
+
+        yield from page_rows
+
+def legacy_extract(path):
+    import fitz
+    with fitz.open(path) as doc:
+        return list(legacy_extract_layout_rows(doc))
+
+def measure(fn, repeat):
+    """Best-of-`repeat` seconds of `fn` + pickling its result (the worker side)."""
+    best, result, payload = float("inf"), None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        payload = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        best = min(best, time.perf_counter() - start)
+    return result, payload, best
+
+def parent_side(payload, repeat):
+    """Best-of-`repeat` seconds to unpickle a document and buffer it for the DB."""
+    best = float("inf")
+    for _ in range(repeat):
+        writer = LayoutFeatureWriter(None, flush_size=10**9, use_copy=False)
+        start = time.perf_counter()
+        rows = pickle.loads(payload)
+        writer.add_document(1, rows)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_extraction_"), "fixture.pdf")
+    with open(path, "wb") as f:
+        f.write(make_pdf(args.pages, seed=0, images=True))
+
+    _, legacy_payload, legacy_s = measure(lambda: legacy_extract(path), args.repeat)
+    _, compact_payload, compact_s = measure(lambda: extract_pdf(path), args.repeat)
+    _, _, parallel_s = measure(lambda: extract_pdf(path, workers=args.workers), args.repeat)
+
+    print(f"{'extractor':<22} {'worker pages/s':>15} {'parent pages/s':>15} {'payload KB':>11}")
+    for name, payload, seconds in [
+        ("dicts (original)", legacy_payload, legacy_s),
+        ("compact records", compact_payload, compact_s),
+        (f"compact x{args.workers} workers", compact_payload, parallel_s),
+    ]:
+        parent_s = parent_side(payload, args.repeat)
+        print(f"{name:<22} {args.pages / seconds:>15.1f} {args.pages / parent_s:>15.0f} {len(payload) / 1024:>11.0f}")
+
+if __name__ == "__main__":
+    main()
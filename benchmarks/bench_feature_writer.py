@@ -0,0 +1,98 @@
+"""
+Rows/sec of the ORM `bulk_save_objects` path vs `LayoutFeatureWriter`
+(executemany on SQLite, COPY on PostgreSQL). Run from the repo root:
+
+    python -m benchmarks.bench_feature_writer --rows 200000
+    python -m benchmarks.bench_feature_writer --postgres-url postgresql://user:pw@localhost/bench
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+def synthetic_rows(n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        rows.append(dict(
+            text_content=f"synthetic line {i} " * 4, font_size=round(rng.uniform(8, 20), 2),
+            is_bold=rng.random() < 0.1, x0=round(rng.uniform(50, 300), 2), y0=round(rng.uniform(40, 800), 2),
+            width=round(rng.uniform(50, 500), 2), height=round(rng.uniform(8, 14), 2),
+            page_number=i // 60, label=rng.choice(["body", "header", "title", "footer"]),
+        ))
+    return rows
+
+def bench(url, rows, rows_per_pdf, flush_size):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from src.data.db_session import Base
+    from src.data.models_db import PDFMetadata, LayoutFeatures
+    from src.data.feature_writer import LayoutFeatureWriter
+
+    engine = create_engine(url)
+    Session = sessionmaker(bind=engine)
+    n_pdfs = max(1, len(rows) // rows_per_pdf)
+    chunks = [rows[i * rows_per_pdf:(i + 1) * rows_per_pdf] for i in range(n_pdfs)]
+
+    def reset():
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        db = Session()
+        pdfs = [PDFMetadata(pmid=str(i), processed=False) for i in range(n_pdfs)]
+        db.add_all(pdfs)
+        db.commit()
+        ids = [pdf.id for pdf in pdfs]
+        db.close()
+        return ids
+
+    results = {}
+
+    ids = reset()
+    db = Session()
+    start = time.perf_counter()
+    for pdf_id, chunk in zip(ids, chunks):
+        db.bulk_save_objects([LayoutFeatures(pdf_id=pdf_id, **row) for row in chunk])
+        db.query(PDFMetadata).filter(PDFMetadata.id == pdf_id).update({"processed": True})
+        db.commit()
+    results["bulk_save_objects"] = time.perf_counter() - start
+    db.close()
+
+    ids = reset()
+    db = Session()
+    writer = LayoutFeatureWriter(db, flush_size=flush_size)
+    start = time.perf_counter()
+    for pdf_id, chunk in zip(ids, chunks):
+        writer.add_document(pdf_id, chunk)
+    writer.flush()
+    results["copy" if writer.use_copy else "executemany"] = time.perf_counter() - start
+    db.close()
+
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--rows-per-pdf", type=int, default=2_000)
+    parser.add_argument("--flush-size", type=int, default=20_000)
+    parser.add_argument("--postgres-url", default=os.getenv("BENCH_POSTGRES_URL"))
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_writer_")
+    sqlite_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.setdefault("DATABASE_URL", sqlite_url)
+
+    rows = synthetic_rows(args.rows)
+    targets = [("sqlite", sqlite_url)]
+    if args.postgres_url:
+        targets.append(("postgresql", args.postgres_url))
+
+    print(f"{'backend':<12} {'path':<18} {'seconds':>8} {'rows/s':>12}")
+    for backend, url in targets:
+        for path, elapsed in bench(url, rows, args.rows_per_pdf, args.flush_size).items():
+            print(f"{backend:<12} {path:<18} {elapsed:>8.2f} {len(rows) / elapsed:>12,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Streaming feature engineering (`load_features`) vs the original in-memory
+`pd.read_sql` + groupby-lambda code: checks the outputs match and reports
+time and peak traced memory. Run from the repo root:
+
+    python -m benchmarks.bench_features --rows 1000000 --chunksize 100000
+"""
+import os
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.models.features import FEATURES, load_features
+
+def legacy_features(engine):
+    """Feature engineering exactly as train_layout_model did it originally."""
+    query = "SELECT pdf_id, page_number, font_size, is_bold, x0, y0, width, height, label FROM layout_features"
+    df = pd.read_sql(query, engine)
+    df['is_bold'] = df['is_bold'].fillna(False).astype(int)
+    df['font_size'] = df['font_size'].fillna(0)
+    df['label'] = df['label'].fillna('body')
+    df = df.sort_values(['pdf_id', 'page_number', 'y0']).reset_index(drop=True)
+    df['dist_prev_y'] = df.groupby(['pdf_id', 'page_number'])['y0'].diff().fillna(0)
+    df['center_dev'] = abs(300 - (df['x0'] + df['width']/2))
+    df['is_first_page'] = (df['page_number'] == 0).astype(int)
+    df['rel_font_size'] = df.groupby('pdf_id')['font_size'].transform(
+        lambda x: (x - x.mean()) / (x.std() + 0.001) if x.std() > 0 else 0
+    )
+    df['aspect_ratio'] = df['width'] / (df['height'] + 0.1)
+    return df[['pdf_id'] + FEATURES + ['label']]
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(prefix="bench_features_"), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    frame = synthetic_layout_frame(args.rows, pdfs=max(1, args.rows // 800))
+    frame.index.name = "id"
+    frame.index += 1
+    frame.to_sql("layout_features", engine, index=True, chunksize=50_000)
+
+    legacy, legacy_s, legacy_peak = measure(lambda: legacy_features(engine))
+    streamed, stream_s, stream_peak = measure(lambda: load_features(engine, chunksize=args.chunksize))
+
+    diff = np.abs(legacy[FEATURES].to_numpy(float) - streamed[FEATURES].to_numpy(float)).max()
+    labels_equal = (legacy['label'].to_numpy() == streamed['label'].to_numpy()).all()
+    print(f"rows: {len(streamed):,}  max |diff| over features: {diff:.3g}  labels equal: {labels_equal}")
+    print(f"{'path':<10} {'seconds':>8} {'peak MB':>9}")
+    print(f"{'legacy':<10} {legacy_s:>8.2f} {legacy_peak / 2**20:>9.1f}")
+    print(f"{'stream':<10} {stream_s:>8.2f} {stream_peak / 2**20:>9.1f}")
+    if diff > 1e-9 or not labels_equal:
+        raise SystemExit("Streaming features do not match the legacy implementation.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Fit-to-one-page search (`src.models.fit_check`) over every layout/type/pos
+combination, optionally padded with extra lipsum paragraphs so most
+documents overflow and the binary search has to work. Reports compiles per
+document (cold cache, then warm), checks that every fitted document really
+compiles to one page (page count of the final PDF) and that no document
+needed more than the 1 + ceil(log2(n + 1)) bound. Needs a LaTeX engine in
+PATH (e.g. inside the Docker image). Run from the repo root:
+
+    python -m benchmarks.bench_fit --extra-paragraphs 4 --workers 4
+"""
+import os
+import re
+import math
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+from src.models.batch_compile import LATEX_ENGINE, compile_tex, default_workers
+from src.models.fit_check import FitCache, count_paragraphs, fit_to_one_page
+from src.models.inference import AcademicEngine, COMPONENT_TYPES, LAYOUTS, POSITIONS, build_document
+
+def pad(tex, extra):
+    """Extends the last lipsum range by `extra` paragraphs (more content than the page holds)."""
+    matches = list(re.finditer(r"\\lipsum\[(\d+)-(\d+)\]", tex))
+    if not extra or not matches:
+        return tex
+    last = matches[-1]
+    longer = f"\\lipsum[{last.group(1)}-{int(last.group(2)) + extra}]"
+    return tex[:last.start()] + longer + tex[last.end():]
+
+def run(docs, engine_name, cache, workers):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda tex: fit_to_one_page(tex, engine_name, cache), docs))
+    return results, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engine", default=LATEX_ENGINE)
+    parser.add_argument("--extra-paragraphs", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if shutil.which(args.engine) is None:
+        raise SystemExit(f"LaTeX engine '{args.engine}' not found in PATH.")
+    workers = args.workers or default_workers(args.engine)
+    workdir = tempfile.mkdtemp(prefix="bench_fit_")
+
+    engine = AcademicEngine()
+    combos = list(itertools.product(LAYOUTS, COMPONENT_TYPES, POSITIONS))
+    docs = [pad(build_document(engine, *combo), args.extra_paragraphs) for combo in combos]
+    cache = FitCache(os.path.join(workdir, "cache"))
+
+    print(f"{len(docs)} documents ({len(set(docs))} distinct), {workers} workers, +{args.extra_paragraphs} paragraphs")
+    print(f"\n{'pass':<6} {'compiles':>9} {'max/doc':>8} {'mean/doc':>9} {'cache hits':>11} {'seconds':>8}")
+    for name in ("cold", "warm"):
+        results, seconds = run(docs, args.engine, cache, workers)
+        compiles = [report["compiles"] for _, report in results]
+        hits = sum(report["cache_hits"] for _, report in results)
+        print(f"{name:<6} {sum(compiles):>9} {max(compiles):>8} {sum(compiles) / len(docs):>9.2f} {hits:>11} {seconds:>8.2f}")
+
+    # Every fitted document, compiled for real, is one page
+    bad, over_bound = [], []
+    for (layout, c_type, pos), (tex, report), source in zip(combos, results, docs):
+        name = f"{layout}_{c_type}_{pos}"
+        path = os.path.join(workdir, f"{name}.tex")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(tex)
+        result = compile_tex(path, workdir, args.engine)
+        pages = fitz.open(os.path.join(workdir, f"{name}.pdf")).page_count if result["ok"] else None
+        if pages != 1:
+            bad.append((name, pages, result["error"]))
+        if report["compiles"] + report["cache_hits"] > 1 + math.ceil(math.log2(count_paragraphs(source) + 1)):
+            over_bound.append(name)
+        print(f"  {name:<24} kept {report['paragraphs']:>2}/{report['of']:<2} overfull "
+              f"{report['overfull_hbox']}h/{report['overfull_vbox']}v -> {pages} page(s)")
+
+    if bad or over_bound:
+        raise SystemExit(f"Not one page: {bad}; over the probe bound: {over_bound}")
+    print("\nOK: every document compiles to exactly one page.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Per-line `heuristic_labeling` vs vectorized `label_lines` on synthetic lines.
+Checks exact parity before timing. Run from the repo root:
+
+    python -m benchmarks.bench_labeling --lines 3000000
+"""
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+
+from src.data.labeling import heuristic_labeling, label_lines
+
+def synthetic_lines(n, seed=0):
+    rng = np.random.default_rng(seed)
+    page_w = rng.choice([595.0, 612.0], n)
+    page_h = rng.choice([842.0, 792.0], n)
+    return dict(
+        size=rng.uniform(5, 24, n),
+        is_bold=rng.random(n) < 0.15,
+        x0=rng.uniform(0, 300, n),
+        y0=rng.uniform(0, 1, n) * page_h,
+        width=rng.uniform(0, 1, n) * page_w,
+        page_width=page_w,
+        page_height=page_h,
+        has_text=rng.random(n) > 0.01,
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=3_000_000)
+    args = parser.parse_args()
+
+    data = synthetic_lines(args.lines)
+    columns = [data[k].tolist() for k in ("size", "is_bold", "x0", "y0", "width", "page_width", "page_height")]
+    texts = ["line" if t else "  " for t in data["has_text"].tolist()]
+
+    start = time.perf_counter()
+    expected = [heuristic_labeling(t, *row) for t, row in zip(texts, zip(*columns))]
+    per_line = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = label_lines(**data)
+    vectorized = time.perf_counter() - start
+
+    mismatches = int(np.sum(labels != np.array(expected)))
+    if mismatches:
+        raise SystemExit(f"Parity check failed: {mismatches} labels differ.")
+
+    print(f"parity: OK on {args.lines:,} lines")
+    print(f"{'labeler':<12} {'seconds':>8} {'lines/s':>14}")
+    print(f"{'per-line':<12} {per_line:>8.2f} {args.lines / per_line:>14,.0f}")
+    print(f"{'vectorized':<12} {vectorized:>8.2f} {args.lines / vectorized:>14,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Peak memory of extracting and writing one very large synthetic PDF, whole
+(`extract_pdf` + `LayoutFeatureWriter.add_document`) versus streamed
+(`stream_extraction` + `write_document`, one page range at a time). Each
+mode runs in a fresh process, so VmHWM is its own peak. Fails when the
+streamed peak grows more than --budget-mb over the RSS after imports (which
+depends on the environment, not on the PDF), when both modes do not store
+the same rows, or when a stream that breaks mid-document leaves any of its
+rows behind. tests/test_large_pdf.py runs the same checks on a 100-page PDF.
+Run from the repo root:
+
+    python -m benchmarks.bench_large_pdf --pages 600 --budget-mb 64
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import fitz
+
+from benchmarks.fixtures import make_pdf
+
+def make_large_pdf(path, pages, distinct=40):
+    """Writes a `pages`-page PDF built from `distinct` synthetic pages repeated (much faster than drawing each)."""
+    with fitz.open("pdf", make_pdf(min(pages, distinct), seed=0, images=True)) as source, fitz.open() as doc:
+        while doc.page_count < pages:
+            doc.insert_pdf(source, to_page=min(source.page_count, pages - doc.page_count) - 1)
+        doc.save(path, garbage=1)
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+def child(mode, path, database_url, pages_per_task):
+    """Runs in a fresh process: extracts and writes `path` once in `mode`, prints JSON."""
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import func, select
+    from src.data.db_session import SessionLocal, init_db
+    from src.data.extraction import extract_pdf, stream_extraction
+    from src.data.feature_writer import LayoutFeatureWriter
+    from src.data.models_db import PDFMetadata, LayoutFeatures
+    from src.data.pdf_cache import file_sha256
+    from src.data.pdf_processor import stream_document
+
+    init_db()
+    db = SessionLocal()
+    pdf = PDFMetadata(pmid="1", processed=False)
+    db.add(pdf)
+    db.commit()
+    writer = LayoutFeatureWriter(db)
+    base = _status_kb("VmRSS:")
+
+    start = time.perf_counter()
+    if mode == "whole":
+        rows = extract_pdf(path)
+        writer.add_document(pdf.id, rows, file_sha256(path))
+        del rows
+        writer.flush()
+    else:
+        stream_document(writer, pdf.id, stream_extraction(path, pages_per_task=pages_per_task), file_sha256(path))
+    seconds = time.perf_counter() - start
+
+    stored = db.scalar(select(func.count()).select_from(LayoutFeatures).where(LayoutFeatures.pdf_id == pdf.id))
+    print(json.dumps({
+        "seconds": seconds, "rows": stored, "peak_rss_mb": _status_kb("VmHWM:") / 1024, "base_rss_mb": base / 1024,
+    }))
+    db.close()
+
+def check_rollback(path, database_url, pages_per_task):
+    """A stream that fails after two page ranges must leave the stored document untouched."""
+    os.environ["DATABASE_URL"] = database_url
+    from sqlalchemy import select
+    from src.data.db_session import SessionLocal
+    from src.data.extraction import stream_extraction
+    from src.data.feature_writer import LayoutFeatureWriter
+    from src.data.models_db import PDFMetadata, LayoutFeatures
+
+    db = SessionLocal()
+    pdf_id = db.scalar(select(PDFMetadata.id))
+
+    def snapshot():
+        db.expire_all()
+        ids = db.scalars(select(LayoutFeatures.id).where(LayoutFeatures.pdf_id == pdf_id).order_by(LayoutFeatures.id)).all()
+        return ids, db.get(PDFMetadata, pdf_id).content_sha256
+
+    def failing():
+        for i, chunk in enumerate(stream_extraction(path, pages_per_task=pages_per_task)):
+            if i == 2:
+                raise RuntimeError("simulated extraction failure")
+            yield chunk
+
+    before = snapshot()
+    try:
+        LayoutFeatureWriter(db).write_document(pdf_id, failing(), "0" * 64)
+        raised = False
+    except RuntimeError:
+        raised = True
+    after = snapshot()
+    db.close()
+    return raised and after == before
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=600)
+    parser.add_argument("--pages-per-task", type=int, default=32, help="Pages per streamed range.")
+    parser.add_argument("--budget-mb", type=float, default=64, help="Peak RSS growth allowed to the streamed run.")
+    parser.add_argument("--child", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mode, path, database_url, pages_per_task = args.child
+        return child(mode, path, database_url, int(pages_per_task))
+
+    workdir = tempfile.mkdtemp(prefix="bench_large_pdf_")
+    path = os.path.join(workdir, "large.pdf")
+    start = time.perf_counter()
+    make_large_pdf(path, args.pages)
+    print(f"{args.pages}-page PDF ({os.path.getsize(path) / 2**20:.1f} MB) built in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    for mode in ("whole", "stream"):
+        database_url = f"sqlite:///{os.path.join(workdir, f'{mode}.db')}"
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_large_pdf", "--child", mode, path, database_url, str(args.pages_per_task)],
+            capture_output=True, text=True, check=True,
+        )
+        results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    print(f"\n{'mode':<8} {'rows':>8} {'seconds':>8} {'base MB':>8} {'peak MB':>8} {'growth MB':>10}")
+    for mode, r in results.items():
+        print(f"{mode:<8} {r['rows']:>8} {r['seconds']:>8.2f} {r['base_rss_mb']:>8.1f} {r['peak_rss_mb']:>8.1f} "
+              f"{r['peak_rss_mb'] - r['base_rss_mb']:>10.1f}")
+
+    problems = []
+    growth = results["stream"]["peak_rss_mb"] - results["stream"]["base_rss_mb"]
+    if growth > args.budget_mb:
+        problems.append(f"streamed peak grew {growth:.1f} MB, over the {args.budget_mb:.0f} MB budget")
+    if results["stream"]["rows"] != results["whole"]["rows"]:
+        problems.append(f"streamed {results['stream']['rows']} rows, whole {results['whole']['rows']}")
+    if not check_rollback(path, f"sqlite:///{os.path.join(workdir, 'stream.db')}", args.pages_per_task):
+        problems.append("a stream failing mid-document changed the stored rows")
+
+    if problems:
+        raise SystemExit("; ".join(problems))
+    print(f"\nOK: streamed peak growth within {args.budget_mb:.0f} MB, same rows, failed stream rolled back.")
+
+if __name__ == "__main__":
+    main()
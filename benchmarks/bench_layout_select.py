@@ -0,0 +1,105 @@
+"""
+Automatic layout selection (`AcademicEngine.choose_layout`): synthetic PDFs
+with a figure or a table at known places (full width at the top/middle/bottom,
+half width left/right, none) are extracted once, then selection is timed per
+document with heuristic labels and with a small model trained on the same
+corpus. Checks every document gets the template and component type matching
+its figure or table. Run
+from the repo root:
+
+    python -m benchmarks.bench_layout_select --repeat 200
+"""
+import os
+import time
+import argparse
+import tempfile
+
+from benchmarks.fixtures import make_pdf
+
+# Component type and rectangle on an A4 page (595x842pt) -> expected (layout, pos, c_type)
+PLACEMENTS = [
+    (("image", (60, 100, 535, 240)), ("top", "top", "image")),
+    (("image", (60, 380, 535, 520)), ("middle", "top", "image")),
+    (("image", (60, 620, 535, 760)), ("bottom", "top", "image")),
+    (("image", (60, 100, 280, 300)), ("left", "top", "image")),
+    (("image", (315, 300, 535, 465)), ("right", "middle", "image")),
+    (("image", (315, 560, 535, 760)), ("right", "bottom", "image")),
+    (("table", (60, 100, 535, 240)), ("top", "top", "table")),
+    (("table", (60, 620, 535, 760)), ("bottom", "top", "table")),
+    (("table", (315, 300, 535, 465)), ("right", "middle", "table")),
+    ((None, None), ("full", "top", "image")),
+]
+
+def train_small_model(docs, path):
+    import joblib
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from src.models.features import FEATURES, engineer_features
+
+    frames = []
+    for pdf_id, doc in enumerate(docs):
+        frame = pd.DataFrame(doc.records)
+        frames.append(frame[~frame["is_image"]].assign(pdf_id=pdf_id))
+    engineered = engineer_features(pd.concat(frames, ignore_index=True))
+    model = RandomForestClassifier(n_estimators=50, max_depth=15, random_state=42)
+    model.fit(engineered[FEATURES], engineered["label"])
+    joblib.dump(model, path, compress=0)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--columns", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--repeat", type=int, default=200, help="Selections timed per document.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_layout_select_")
+    from src.data.extraction import extract_pdf
+    from src.models.inference import AcademicEngine
+    from src.models.layout_index import layout_index
+
+    start = time.perf_counter()
+    layout_index()
+    print(f"layout index: {len(layout_index())} templates in {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    cases = []
+    for i, ((kind, rect), expected) in enumerate(PLACEMENTS):
+        for columns in args.columns:
+            path = os.path.join(workdir, f"{kind or 'none'}_{i}_{columns}col.pdf")
+            with open(path, "wb") as f:
+                f.write(make_pdf(args.pages, seed=i, images=kind == "image", columns=columns,
+                                 figure_rect=rect if kind == "image" else (0, 0, 1, 1),
+                                 table_rect=rect if kind == "table" else None))
+            cases.append((path, expected))
+
+    start = time.perf_counter()
+    docs = [extract_pdf(path) for path, _ in cases]
+    extract_ms = (time.perf_counter() - start) / len(docs) * 1000
+
+    model_path = os.path.join(workdir, "layout_model.joblib")
+    train_small_model(docs, model_path)
+
+    print(f"\n{'labels':<10} {'backend':<9} {'correct':>8} {'select ms/doc':>14} {'extract ms/doc':>15}")
+    failed = False
+    for labels, backend, path in [("heuristic", "-", os.path.join(workdir, "missing.joblib")),
+                                  ("model", "sklearn", model_path), ("model", "compiled", model_path)]:
+        engine = AcademicEngine(path, backend=None if backend == "-" else backend)
+        engine.load()
+        choices = [engine.choose_layout(doc) for doc in docs]  # Warm-up (lazy imports, model load)
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for doc in docs:
+                engine.choose_layout(doc)
+        select_ms = (time.perf_counter() - start) / (args.repeat * len(docs)) * 1000
+
+        wrong = [(os.path.basename(p), exp, (c.layout, c.pos, c.c_type)) for (p, exp), c in zip(cases, choices)
+                 if (c.layout, c.pos, c.c_type) != exp]
+        print(f"{labels:<10} {backend:<9} {len(cases) - len(wrong):>4}/{len(cases):<3} {select_ms:>14.2f} {extract_ms:>15.1f}")
+        for name, expected, got in wrong:
+            print(f"    {name}: expected {expected}, got {got}")
+        failed |= bool(wrong)
+
+    if failed:
+        raise SystemExit("Some documents got a template that does not match their figure or table.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Serial `process_and_label` vs staged `run_pipeline` (cold and warm PDF cache)
+against the local HTTP stand-in. Run from the repo root:
+
+    python -m benchmarks.bench_pipeline --pdfs 40 --pages 6 --latency 0.2
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from benchmarks.fixtures import make_pdf, FixtureServer
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per HTTP request.")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--extract-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    pdfs = {str(1000 + i): make_pdf(args.pages, seed=i) for i in range(args.pdfs)}
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+
+    with FixtureServer(pdfs, latency=args.latency) as server:
+        # Configuration is read at import time, so set it before importing src.*
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ["PMC_OA_API_URL"] = server.oa_url
+        cache_dir = os.environ["PDF_CACHE_DIR"] = os.path.join(workdir, "cache")
+
+        from src.data.db_session import SessionLocal, init_db
+        from src.data.models_db import PDFMetadata, LayoutFeatures
+        from src.data import pdf_processor, pipeline
+
+        init_db()
+
+        def reset(clear_cache=True):
+            if clear_cache:
+                shutil.rmtree(cache_dir, ignore_errors=True)
+            db = SessionLocal()
+            db.query(LayoutFeatures).delete()
+            db.query(PDFMetadata).delete()
+            db.add_all(PDFMetadata(pmid=pmid, processed=False) for pmid in pdfs)
+            db.commit()
+            db.close()
+
+        def count_rows():
+            db = SessionLocal()
+            n = db.query(LayoutFeatures).count()
+            db.close()
+            return n
+
+        results = {}
+        run_pipeline = lambda: pipeline.run_pipeline(args.download_workers, args.extract_workers)
+        for name, run, clear_cache in [
+            ("serial", pdf_processor.process_and_label, True),
+            ("pipeline", run_pipeline, True),
+            ("warm", run_pipeline, False),
+        ]:
+            reset(clear_cache)
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            results[name] = (elapsed, count_rows())
+
+    print(f"\n{'mode':<10} {'seconds':>8} {'rows':>8} {'pdfs/s':>8}")
+    for name, (elapsed, rows) in results.items():
+        print(f"{name:<10} {elapsed:>8.2f} {rows:>8} {args.pdfs / elapsed:>8.2f}")
+
+    if len({rows for _, rows in results.values()}) != 1:
+        raise SystemExit("Row counts differ between runs.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Rows/sec and latency percentiles of AcademicEngine.predict_layout for the
+sklearn and compiled backends at batch sizes 1 .. 100k. Run from the repo root:
+
+    python -m benchmarks.bench_predict --train-rows 60000
+"""
+import os
+import time
+import argparse
+import tempfile
+import joblib
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.models.features import FEATURES, engineer_features
+from src.models.inference import AcademicEngine
+
+BATCH_SIZES = [1, 10, 100, 1_000, 10_000, 100_000]
+
+def train_model(rows, path):
+    df = engineer_features(synthetic_layout_frame(rows, pdfs=max(1, rows // 600)))
+    model = RandomForestClassifier(
+        n_estimators=200, max_depth=15, min_samples_leaf=4,
+        class_weight='balanced', random_state=42, n_jobs=-1,
+    )
+    model.fit(df[FEATURES], df['label'])
+    joblib.dump(model, path)
+
+def time_batches(engine, frame, batch_size, budget=2.0):
+    """Repeats predictions of `batch_size` rows for ~`budget` seconds."""
+    latencies = []
+    deadline = time.perf_counter() + budget
+    offset = 0
+    while time.perf_counter() < deadline or len(latencies) < 3:
+        if offset + batch_size > len(frame):
+            offset = 0
+        batch = frame.iloc[offset:offset + batch_size]
+        start = time.perf_counter()
+        engine.predict_layout(batch)
+        latencies.append(time.perf_counter() - start)
+        offset += batch_size
+    latencies = np.array(latencies)
+    return batch_size * len(latencies) / latencies.sum(), np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--train-rows", type=int, default=60_000)
+    parser.add_argument("--model", default=None, help="Existing .joblib model (skips synthetic training).")
+    parser.add_argument("--budget", type=float, default=2.0, help="Seconds spent per batch size and backend.")
+    args = parser.parse_args()
+
+    model_path = args.model
+    if model_path is None:
+        model_path = os.path.join(tempfile.mkdtemp(prefix="bench_predict_"), "layout_model.joblib")
+        train_model(args.train_rows, model_path)
+
+    frame = synthetic_layout_frame(max(BATCH_SIZES), pdfs=200, seed=1).drop(columns="label")
+    engines = {backend: AcademicEngine(model_path, backend=backend) for backend in ("sklearn", "compiled")}
+
+    sample = frame.iloc[:20_000]
+    agreement = (engines["sklearn"].predict_layout(sample)["label"] == engines["compiled"].predict_layout(sample)["label"]).mean()
+    print(f"\nlabel agreement sklearn vs compiled: {agreement:.4%}")
+
+    print(f"{'backend':<10} {'batch':>8} {'rows/s':>12} {'p50 ms':>9} {'p99 ms':>9}")
+    for backend, engine in engines.items():
+        for batch_size in BATCH_SIZES:
+            rows_per_sec, p50, p99 = time_batches(engine, frame, batch_size, args.budget)
+            print(f"{backend:<10} {batch_size:>8} {rows_per_sec:>12,.0f} {p50 * 1e3:>9.2f} {p99 * 1e3:>9.2f}")
+
+if __name__ == "__main__":
+    main()
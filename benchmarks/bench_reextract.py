@@ -0,0 +1,164 @@
+"""
+Incremental re-extraction (`src.data.reextract`) against the local HTTP
+stand-in: a full crawl, then re-runs with nothing changed, with new labeler
+thresholds (re-label only), with new bytes for some PDFs (`--refresh`) and
+with some PDFs recorded under an older extractor version. Checks that only
+the affected PDFs are re-parsed, that their rows are replaced (never
+duplicated) and that a failed flush leaves the previous rows in place.
+Run from the repo root:
+
+    python -m benchmarks.bench_reextract --pdfs 40 --pages 6 --changed 4
+"""
+import os
+import time
+import argparse
+import tempfile
+from collections import Counter
+
+from benchmarks.fixtures import make_pdf, FixtureServer
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=6)
+    parser.add_argument("--changed", type=int, default=4, help="PDFs whose bytes / extractor version change.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP request.")
+    parser.add_argument("--download-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    pdfs = {str(1000 + i): make_pdf(args.pages, seed=i) for i in range(args.pdfs)}
+    workdir = tempfile.mkdtemp(prefix="bench_reextract_")
+
+    with FixtureServer(pdfs, latency=args.latency) as server:
+        # Configuration is read at import time, so set it before importing src.*
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ["PMC_OA_API_URL"] = server.oa_url
+        os.environ["PDF_CACHE_DIR"] = os.path.join(workdir, "cache")
+
+        from sqlalchemy import select, update
+        from src.data.db_session import SessionLocal, init_db
+        from src.data.extraction import EXTRACTOR_VERSION, extract_pdf
+        from src.data.feature_writer import LayoutFeatureWriter
+        from src.data.labeling import DEFAULT_RULES, LabelingRules
+        from src.data.models_db import PDFMetadata, LayoutFeatures
+        from src.data.pdf_cache import PDFCache
+        from src.data.pipeline import run_pipeline
+        from src.data.reextract import reextract
+
+        init_db()
+        db = SessionLocal()
+        db.add_all(PDFMetadata(pmid=pmid, processed=False) for pmid in pdfs)
+        db.commit()
+        pmid_of = dict(db.execute(select(PDFMetadata.id, PDFMetadata.pmid)).all())
+
+        def snapshot():
+            """{pdf_id: (ids, labels)} of every stored row."""
+            db.expire_all()
+            rows = db.execute(select(LayoutFeatures.pdf_id, LayoutFeatures.id, LayoutFeatures.label)
+                              .order_by(LayoutFeatures.id)).all()
+            docs = {}
+            for pdf_id, row_id, label in rows:
+                ids, labels = docs.setdefault(pdf_id, ([], []))
+                ids.append(row_id)
+                labels.append(label)
+            return docs
+
+        def reparsed(before, after):
+            return {pdf_id for pdf_id in after if after[pdf_id][0] != before.get(pdf_id, ([], []))[0]}
+
+        def timed(fn):
+            start = time.perf_counter()
+            result = fn()
+            return result, time.perf_counter() - start
+
+        results, problems = [], []
+        _, seconds = timed(lambda: run_pipeline(args.download_workers))
+        base = snapshot()
+        results.append(("full crawl", args.pdfs, 0, seconds))
+
+        # 1. Nothing changed: no PDF is touched
+        report, seconds = timed(lambda: reextract(DEFAULT_RULES))
+        if any(report.values()) or reparsed(base, snapshot()):
+            problems.append(f"unchanged corpus did work: {report}")
+        results.append(("unchanged", 0, 0, seconds))
+
+        # 2. New labeler thresholds: every PDF re-labeled, none re-parsed
+        rules = LabelingRules(footer_y=0.85)
+        report, seconds = timed(lambda: reextract(rules))
+        relabeled = snapshot()
+        changed_labels = sum(a != b for pdf_id in base for a, b in zip(base[pdf_id][1], relabeled[pdf_id][1]))
+        if report != {"extractor": 0, "content": 0, "labeler": args.pdfs} or reparsed(base, relabeled):
+            problems.append(f"labeler change re-parsed PDFs: {report}")
+        results.append(("labeler", 0, changed_labels, seconds))
+        reextract(DEFAULT_RULES)  # Back to the default labels
+        if snapshot() != base:
+            problems.append("re-labeling with the default rules did not restore the original labels")
+
+        # 3. New bytes for some PDFs: only those are re-parsed, their rows replaced
+        changed = list(pdfs)[:args.changed]
+        for i, pmid in enumerate(changed):
+            server.pdfs[pmid] = make_pdf(args.pages + 1, seed=10_000 + i)
+
+        def refresh():
+            report = reextract(DEFAULT_RULES, refresh=True, download_workers=args.download_workers)
+            run_pipeline(args.download_workers)
+            return report
+
+        report, seconds = timed(refresh)
+        after = snapshot()
+        expected = {pdf_id for pdf_id, pmid in pmid_of.items() if pmid in changed}
+        if report["content"] != args.changed or reparsed(base, after) != expected:
+            problems.append(f"byte change re-parsed {sorted(reparsed(base, after))}, expected {sorted(expected)}")
+        for pdf_id in expected:
+            path = os.path.join(workdir, "fresh.pdf")
+            with open(path, "wb") as f:
+                f.write(server.pdfs[pmid_of[pdf_id]])
+            if len(after[pdf_id][0]) != len(extract_pdf(path)):
+                problems.append(f"PDF {pdf_id} has {len(after[pdf_id][0])} rows, not those of its new bytes")
+        results.append(("bytes", len(reparsed(base, after)), 0, seconds))
+
+        # 4. Older extractor version recorded on some PDFs: only those are re-parsed
+        base = after
+        older = sorted(pmid_of)[-args.changed:]
+        db.execute(update(PDFMetadata).where(PDFMetadata.id.in_(older)).values(extractor_version=EXTRACTOR_VERSION - 1))
+        db.commit()
+
+        def extractor():
+            report = reextract(DEFAULT_RULES)
+            run_pipeline(args.download_workers)
+            return report
+
+        report, seconds = timed(extractor)
+        after = snapshot()
+        if report["extractor"] != args.changed or reparsed(base, after) != set(older):
+            problems.append(f"extractor change re-parsed {sorted(reparsed(base, after))}, expected {older}")
+        results.append(("extractor", len(reparsed(base, after)), 0, seconds))
+
+        # 5. A failed flush keeps the previous rows of a re-extracted PDF
+        class FailingWriter(LayoutFeatureWriter):
+            def _insert_texts(self, text_rows):
+                raise RuntimeError("simulated failure")
+
+        pdf_id = older[0]
+        cache = PDFCache()
+        rows = extract_pdf(cache.lookup(pmid_of[pdf_id]))
+        cache.close()
+        writer = FailingWriter(db)
+        writer.add_document(pdf_id, rows, "0" * 64)
+        if writer.flush() or snapshot() != after:
+            problems.append("a failed flush changed the stored rows")
+
+        counts = Counter(db.scalars(select(LayoutFeatures.pdf_id)).all())
+        db.close()
+
+    print(f"\n{'run':<12} {'re-parsed':>10} {'labels changed':>15} {'seconds':>8}")
+    for name, parsed, labels, seconds in results:
+        print(f"{name:<12} {parsed:>10} {labels:>15} {seconds:>8.2f}")
+    print(f"{sum(counts.values())} rows over {len(counts)} PDFs")
+
+    if problems:
+        raise SystemExit("; ".join(problems))
+    print("\nOK: only affected PDFs re-parsed, rows replaced atomically.")
+
+if __name__ == "__main__":
+    main()
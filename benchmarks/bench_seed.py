@@ -0,0 +1,112 @@
+"""
+Seeding against a local esearch mock: the original sequential loop (10 ids
+per term, one existence query per id) vs `seed_massive_diverse_pdfs` with
+1 and N workers, then an interrupted run resumed from its checkpoint.
+Run from the repo root:
+
+    python -m benchmarks.bench_seed --terms 40 --ids-per-term 300 --latency 0.05
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import requests
+import xml.etree.ElementTree as ET
+
+from benchmarks.fixtures import FixtureServer
+
+def legacy_seed(db, PDFMetadata, esearch_url, terms):
+    """The seeding loop as it was: sequential, retmax=10, a query per id."""
+    for term in terms:
+        r = requests.get(f"{esearch_url}?db=pmc&term={term}&retmax=10", timeout=10)
+        for pmid in [e.text for e in ET.fromstring(r.text).findall(".//Id")]:
+            if not db.query(PDFMetadata).filter(PDFMetadata.pmid == pmid).first():
+                db.add(PDFMetadata(pmid=pmid, processed=False))
+        db.commit()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--terms", type=int, default=40)
+    parser.add_argument("--ids-per-term", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per request.")
+    parser.add_argument("--rate-limit", type=float, default=50, help="Requests/s allowed by the mock.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    # Overlapping id pools, so dedupe across terms matters
+    rng = random.Random(0)
+    pool = [str(9_000_000 + i) for i in range(args.terms * args.ids_per_term // 2)]
+    esearch = {f"term{i}": rng.sample(pool, args.ids_per_term) for i in range(args.terms)}
+    expected = set().union(*esearch.values())
+    workdir = tempfile.mkdtemp(prefix="bench_seed_")
+
+    with FixtureServer({}, latency=args.latency, esearch=esearch) as server:
+        # Configuration is read at import time, so set it before importing src.*
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        os.environ["ESEARCH_URL"] = server.esearch_url
+
+        from src.data.db_session import SessionLocal, init_db
+        from src.data.models_db import PDFMetadata
+        from src.data.seed_data import seed_massive_diverse_pdfs
+
+        init_db()
+        terms = list(esearch)
+
+        def reset():
+            db = SessionLocal()
+            db.query(PDFMetadata).delete()
+            db.commit()
+            db.close()
+
+        def stored():
+            db = SessionLocal()
+            pmids = [p for (p,) in db.query(PDFMetadata.pmid)]
+            db.close()
+            if len(pmids) != len(set(pmids)):
+                raise SystemExit("Duplicate pmids stored.")
+            return set(pmids)
+
+        def seed(workers, checkpoint, reset_checkpoint=True):
+            return seed_massive_diverse_pdfs(
+                terms, workers=workers, page_size=args.page_size, max_per_term=args.ids_per_term,
+                rate_limit=args.rate_limit, checkpoint_path=checkpoint, reset=reset_checkpoint,
+            )
+
+        results = []
+        reset()
+        db = SessionLocal()
+        start = time.perf_counter()
+        legacy_seed(db, PDFMetadata, server.esearch_url, terms)
+        results.append(("original (10/term)", time.perf_counter() - start, len(stored())))
+        db.close()
+
+        for workers in sorted({1, args.workers}):
+            reset()
+            start = time.perf_counter()
+            seed(workers, os.path.join(workdir, f"checkpoint_{workers}.json"))
+            results.append((f"engine x{workers}", time.perf_counter() - start, len(stored())))
+            if stored() != expected:
+                raise SystemExit("Seeded pmids differ from the mock's ids.")
+
+        # Interrupted run: the mock fails after a third of the requests, then recovers
+        reset()
+        checkpoint = os.path.join(workdir, "checkpoint_resume.json")
+        pages_needed = args.terms * -(-args.ids_per_term // args.page_size)
+        server.esearch_requests, server.fail_after = 0, pages_needed // 3
+        seed(args.workers, checkpoint)
+        partial = len(stored())
+        server.esearch_requests, server.fail_after = 0, None
+        seed(args.workers, checkpoint, reset_checkpoint=False)
+        if stored() != expected:
+            raise SystemExit("Resumed run did not converge to the full id set.")
+        print(f"\nResume OK: {partial} ids before the failure, {len(expected)} after resuming "
+              f"with {server.esearch_requests} of {pages_needed} requests")
+
+    print(f"\n{'mode':<20} {'seconds':>8} {'pmids':>8}")
+    for name, seconds, n in results:
+        print(f"{name:<20} {seconds:>8.2f} {n:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Load test for the HTTP service (`src.models.service`) on localhost: cold
+start (process spawn to first prediction), then warm /predict latency with
+concurrent keep-alive clients for each micro-batch window. Run from the
+repo root:
+
+    python -m benchmarks.bench_service --clients 16 --requests 200 --windows 0 5
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+import http.client
+import numpy as np
+
+from benchmarks.fixtures import synthetic_layout_frame
+from benchmarks.bench_predict import train_model
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def request(conn, method, path, payload=None):
+    body = json.dumps(payload) if payload is not None else None
+    conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    data = json.loads(response.read())
+    if response.status != 200:
+        raise RuntimeError(f"{method} {path} -> {response.status}: {data}")
+    return data
+
+def start_service(port, model_path, window_ms, backend):
+    """Spawns the service and returns (process, seconds until /health answered)."""
+    env = dict(os.environ, MODEL_PATH=model_path, MODEL_BACKEND=backend)
+    cmd = [sys.executable, "-m", "src.models.service", "--port", str(port), "--max-wait-ms", str(window_ms)]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    while True:
+        try:
+            request(http.client.HTTPConnection("127.0.0.1", port, timeout=1), "GET", "/health")
+            return proc, time.perf_counter() - start
+        except (ConnectionError, OSError):
+            if proc.poll() is not None:
+                raise RuntimeError("Service exited during startup.")
+            time.sleep(0.01)
+
+def load(port, payloads, clients, requests_per_client):
+    """Each client thread sends its requests back-to-back on one connection."""
+    latencies = [[] for _ in range(clients)]
+
+    def client(i):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        for j in range(requests_per_client):
+            start = time.perf_counter()
+            request(conn, "POST", "/predict", payloads[(i + j) % len(payloads)])
+            latencies[i].append(time.perf_counter() - start)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return np.concatenate(latencies), time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default=None, help="Existing .joblib model (skips synthetic training).")
+    parser.add_argument("--train-rows", type=int, default=60_000)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Requests per client.")
+    parser.add_argument("--rows", type=int, default=40, help="Lines per /predict request (about one page).")
+    parser.add_argument("--windows", type=float, nargs="+", default=[0, 5], help="Micro-batch windows (ms).")
+    parser.add_argument("--backend", default="compiled")
+    args = parser.parse_args()
+
+    model_path = args.model
+    if model_path is None:
+        model_path = os.path.join(tempfile.mkdtemp(prefix="bench_service_"), "layout_model.joblib")
+        train_model(args.train_rows, model_path)
+
+    frame = synthetic_layout_frame(args.rows * 64, pdfs=64, seed=1).drop(columns="label")
+    payloads = [
+        {"rows": json.loads(frame.iloc[i:i + args.rows].to_json(orient="records"))}
+        for i in range(0, len(frame), args.rows)
+    ]
+
+    print(f"{'window ms':>9} {'cold s':>7} {'first ms':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'req/batch':>9}")
+    for window in args.windows:
+        port = free_port()
+        proc, cold = start_service(port, model_path, window, args.backend)
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            start = time.perf_counter()
+            request(conn, "POST", "/predict", payloads[0])
+            first = time.perf_counter() - start
+
+            latencies, wall = load(port, payloads, args.clients, args.requests)
+            metrics = request(conn, "GET", "/metrics")
+            per_batch = metrics["batched_requests"] / max(1, metrics["batches"])
+            print(f"{window:>9g} {cold:>7.2f} {first * 1e3:>9.1f} {len(latencies) / wall:>8.0f} "
+                  f"{np.percentile(latencies, 50) * 1e3:>8.2f} {np.percentile(latencies, 99) * 1e3:>8.2f} {per_batch:>9.1f}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Loading training data from the DB (`pd.read_sql`) vs an exported snapshot
+(`src.data.snapshot`): checks the engineered features match and reports
+load time and the peak resident memory each loader adds on top of the
+process baseline. Each loader runs in its own process so the peak (VmHWM,
+reset through /proc/self/clear_refs) is not polluted by the others. Run from the repo root:
+
+    python -m benchmarks.bench_snapshot --rows 1000000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.data.snapshot import export_snapshot, read_snapshot_chunks, _iter_batches, _load_manifest
+from src.models.features import FEATURES, collect_features, load_features, stream_features
+
+QUERY = "SELECT * FROM layout_features"
+
+def build_db(path, rows):
+    engine = create_engine(f"sqlite:///{path}")
+    frame = synthetic_layout_frame(rows, pdfs=max(1, rows // 800))
+    frame["page_width"], frame["page_height"], frame["is_image"] = 595.0, 842.0, False
+    frame.index.name = "id"
+    frame.index += 1
+    frame.to_sql("layout_features", engine, index=True, chunksize=50_000)
+
+    pdf_ids = np.unique(frame["pdf_id"])
+    pd.DataFrame({"id": pdf_ids, "pmid": [str(30_000_000 + i) for i in pdf_ids], "processed": True}).to_sql(
+        "pdf_metadata", engine, index=False
+    )
+    return engine
+
+def load(mode, db_path, snapshot_dir):
+    """Runs one loader and returns (rows, seconds)."""
+    start = time.perf_counter()
+    if mode == "read_sql":
+        rows = len(pd.read_sql(QUERY, create_engine(f"sqlite:///{db_path}")))
+    elif mode == "snapshot":
+        rows = len(pd.concat(read_snapshot_chunks(snapshot_dir), ignore_index=True))
+    else:  # "mmap": scan the Arrow batches without materializing a DataFrame
+        rows = 0
+        for part in _load_manifest(snapshot_dir)["parts"]:
+            for batch in _iter_batches(os.path.join(snapshot_dir, part["file"])):
+                rows += batch.num_rows
+    return rows, time.perf_counter() - start
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+def child(args):
+    # Linux only: start the peak from the current RSS, not from the parent's
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    base = _status_kb("VmRSS:")
+    rows, seconds = load(args.child, args.db, args.snapshot)
+    print(json.dumps({"rows": rows, "seconds": seconds, "rss_mb": (_status_kb("VmHWM:") - base) / 1024}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--child", choices=["read_sql", "snapshot", "mmap"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--snapshot", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    workdir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    db_path = os.path.join(workdir, "bench.db")
+    engine = build_db(db_path, args.rows)
+
+    for fmt in ("arrow", "parquet"):
+        snapshot_dir = os.path.join(workdir, fmt)
+        start = time.perf_counter()
+        export_snapshot(engine, snapshot_dir, fmt, args.chunksize)
+        export_s = time.perf_counter() - start
+        size_mb = sum(
+            os.path.getsize(os.path.join(snapshot_dir, p["file"])) for p in _load_manifest(snapshot_dir)["parts"]
+        ) / 1024**2
+        print(f"{fmt:>8} export: {export_s:.2f}s, {size_mb:.1f} MB on disk")
+
+    # Parity: features from the snapshot match the DB up to float32 storage
+    snapshot_dir = os.path.join(workdir, "arrow")
+    from_db = load_features(engine, chunksize=args.chunksize)
+    from_snapshot = collect_features(stream_features(
+        lambda: read_snapshot_chunks(snapshot_dir),
+        lambda: read_snapshot_chunks(snapshot_dir, ["pdf_id", "font_size"]),
+    ))
+    assert len(from_db) == len(from_snapshot)
+    assert (from_db["label"].to_numpy() == from_snapshot["label"].astype(str).to_numpy()).all()
+    np.testing.assert_allclose(
+        from_db[FEATURES].to_numpy(float), from_snapshot[FEATURES].to_numpy(float), rtol=1e-4, atol=1e-3
+    )
+    print(f"Parity OK on {len(from_db)} rows")
+
+    print(f"{'loader':>18} {'seconds':>8} {'added RSS MB':>13}")
+    for mode, snapshot_dir in [
+        ("read_sql", None), ("snapshot", os.path.join(workdir, "arrow")),
+        ("snapshot", os.path.join(workdir, "parquet")), ("mmap", os.path.join(workdir, "arrow")),
+    ]:
+        cmd = [sys.executable, "-m", "benchmarks.bench_snapshot", "--child", mode, "--db", db_path]
+        if snapshot_dir:
+            cmd += ["--snapshot", snapshot_dir]
+        result = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+        name = mode if not snapshot_dir else f"{mode}/{os.path.basename(snapshot_dir)}"
+        print(f"{name:>18} {result['seconds']:>8.2f} {result['rss_mb']:>13.1f}")
+
+if __name__ == "__main__":
+    main()
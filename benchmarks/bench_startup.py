@@ -0,0 +1,106 @@
+"""
+Startup cost of the inference CLI and of loading the model. Reports:
+
+* wall time of `python src/models/inference.py full image` (median of N runs,
+  checked against --target-ms; exits 1 when slower),
+* the slowest top-level imports from `python -X importtime`,
+* model load time and private (anonymous) RSS for joblib.load with and
+  without mmap_mode='r', for the sklearn export and the compiled export.
+  Memory-mapped pages are file-backed, so they are shared between processes
+  instead of counted in every process's private memory. That only holds for
+  the compiled export: sklearn's Tree.__setstate__ copies the mapped node
+  arrays, so the sklearn export stays private either way.
+
+Run from the repo root:
+
+    python -m benchmarks.bench_startup --runs 10 --target-ms 250
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+
+from benchmarks.bench_predict import train_model
+
+SCRIPT = os.path.join("src", "models", "inference.py")
+
+def run_cli(out_dir, importtime=False):
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else []) + [SCRIPT, "full", "image"]
+    env = dict(os.environ, OUTPUT_DIR=out_dir)
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start, proc.stderr
+
+def top_imports(stderr, n=8):
+    """(module, cumulative µs) of the slowest top-level imports."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):  # Top level: one leading space only
+            rows.append((name.strip(), int(cumulative)))
+    return sorted(rows, key=lambda r: -r[1])[:n]
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+def child(path, mmap):
+    import joblib
+    import sklearn.ensemble  # noqa: F401  (import cost is not load cost)
+    import src.models.compiled_forest  # noqa: F401
+    base = _status_kb("RssAnon:")
+    start = time.perf_counter()
+    model = joblib.load(path, mmap_mode="r" if mmap else None)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "anon_mb": (_status_kb("RssAnon:") - base) / 1024, "type": type(model).__name__}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--target-ms", type=float, default=250, help="Maximum median CLI wall time.")
+    parser.add_argument("--train-rows", type=int, default=60_000)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--mmap", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child, args.mmap)
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+
+    # 1. CLI wall time and import profile
+    run_cli(workdir)  # Warm the page cache / .pyc files
+    walls = [run_cli(workdir)[0] for _ in range(args.runs)]
+    median_ms = float(np.median(walls)) * 1000
+    _, stderr = run_cli(workdir, importtime=True)
+    print(f"CLI wall time: median {median_ms:.0f} ms, min {min(walls) * 1000:.0f} ms (target {args.target_ms:.0f} ms)")
+    print("Slowest top-level imports:")
+    for name, micros in top_imports(stderr):
+        print(f"  {micros / 1000:>8.1f} ms  {name}")
+
+    # 2. Model load (each in a fresh process)
+    from src.models.trainer import export_model
+    from src.models.compiled_forest import compiled_path
+    model_path = os.path.join(workdir, "layout_model.joblib")
+    train_model(args.train_rows, model_path)
+    import joblib
+    export_model(joblib.load(model_path), model_path)
+
+    print(f"\n{'export':<10} {'mmap':>5} {'load ms':>9} {'private MB':>11}")
+    for label, path in [("sklearn", model_path), ("compiled", compiled_path(model_path))]:
+        for mmap in (False, True):
+            cmd = [sys.executable, "-m", "benchmarks.bench_startup", "--child", path] + (["--mmap"] if mmap else [])
+            result = json.loads(subprocess.run(cmd, check=True, capture_output=True, text=True).stdout.splitlines()[-1])
+            print(f"{label:<10} {str(mmap):>5} {result['seconds'] * 1000:>9.1f} {result['anon_mb']:>11.1f}")
+
+    if median_ms > args.target_ms:
+        print(f"\nFAIL: CLI startup {median_ms:.0f} ms exceeds target {args.target_ms:.0f} ms")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Overhead of `src.telemetry`: the per-call cost of a disabled stage/counter,
+and extraction over a synthetic corpus with telemetry off, on, and on with
+cProfile for the parse stage. Also runs page-range extraction on a process
+pool to check that worker metrics reach the parent, and writes the
+Prometheus/JSON export. Run from the repo root:
+
+    python -m benchmarks.bench_telemetry --pdfs 12 --pages 8
+"""
+import os
+import time
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.fixtures import make_corpus
+from src import telemetry
+
+def per_call_ns(fn, calls=1_000_000):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+def disabled_stage():
+    with telemetry.stage("noop"):
+        pass
+
+def extraction_seconds(paths, repeat):
+    from src.data.extraction import extract_pdf
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            extract_pdf(path)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pdfs", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_telemetry_")
+    # src.data reads its configuration at import time (nothing is written to this database)
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from src.data.extraction import ExtractedLines, submit_extraction
+
+    paths = make_corpus(os.path.join(workdir, "corpus"), args.pdfs, args.pages)
+    extraction_seconds(paths[:1], 1)  # Warm up imports and caches
+
+    # 1. Disabled hooks
+    print(f"disabled stage(): {per_call_ns(disabled_stage):.0f} ns/call, "
+          f"inc(): {per_call_ns(lambda: telemetry.inc('noop')):.0f} ns/call")
+
+    # 2. Extraction off / on / on + cProfile
+    off = extraction_seconds(paths, args.repeat)
+    telemetry.enable()
+    on = extraction_seconds(paths, args.repeat)
+    telemetry.PROFILE_STAGES.add("parse")
+    profiled = extraction_seconds(paths, 1)
+    telemetry.PROFILE_STAGES.discard("parse")
+
+    print(f"\n{'extraction':<16} {'seconds':>8} {'overhead':>9}")
+    for name, seconds in [("off", off), ("on", on), ("on + cProfile", profiled)]:
+        print(f"{name:<16} {seconds:>8.3f} {seconds / off - 1:>+9.1%}")
+
+    # 3. Worker metrics merged into the parent
+    telemetry.drain()
+    with ProcessPoolExecutor(max_workers=2) as pool:
+        docs = [ExtractedLines.concat(f.result() for f in submit_extraction(pool, path, pages_per_task=2))
+                for path in paths]
+    parsed_pages = telemetry.summary()["histograms"]['stage_seconds{stage="parse"}']["count"]
+    print(f"\npages parsed in workers: {parsed_pages} (expected {sum(d.pages for d in docs)})")
+    if parsed_pages != args.pdfs * args.pages:
+        raise SystemExit("Worker telemetry was lost or counted twice.")
+
+    report = telemetry.write_run("bench", directory=os.path.join(workdir, "telemetry"))
+    print(f"export: {sorted(os.listdir(os.path.dirname(report)))}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Hyperparameter search and compaction (`src.models.tuning`) on synthetic
+layout rows: grouped cross-validation over a small grid, then the footprint
+of every candidate, the Pareto front and the compaction report of the
+selected one. Checks that no PDF is on both sides of a fold, that the front
+is non-dominated and that float32 thresholds change no prediction. Run from
+the repo root:
+
+    python -m benchmarks.bench_tuning --rows 60000 --jobs -1
+"""
+import os
+import time
+import argparse
+
+import numpy as np
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.models.compiled_forest import CompiledForest
+from src.models.features import FEATURES, engineer_features
+from src.models.tuning import _forest, grouped_folds, pareto_front, search
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=60_000)
+    parser.add_argument("--pdfs", type=int, default=100)
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=[25, 50, 100])
+    parser.add_argument("--max-depth", type=int, nargs="+", default=[8, 15])
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    df = engineer_features(synthetic_layout_frame(args.rows, pdfs=args.pdfs))
+    pdf_ids = df["pdf_id"].to_numpy()
+    leaked = [i for i, (train, test) in enumerate(grouped_folds(pdf_ids, args.folds))
+              if np.intersect1d(pdf_ids[train], pdf_ids[test]).size]
+
+    grid = {"n_estimators": args.n_estimators, "max_depth": args.max_depth, "min_samples_leaf": args.min_samples_leaf}
+    start = time.perf_counter()
+    report = search(df, grid, args.folds, args.jobs)
+    seconds = time.perf_counter() - start
+
+    print(f"\n{len(report['candidates'])} candidates x {args.folds} folds, {args.rows} rows, "
+          f"{os.cpu_count()} cores: {seconds:.1f}s")
+    print(f"{'':2}{'trees':>6} {'depth':>6} {'leaf':>5} {'accuracy':>9} {'size MB':>8} {'load ms':>8} "
+          f"{'sklearn ms':>11} {'compiled ms':>12}")
+    for i, r in enumerate(report["candidates"]):
+        mark = "*" if i == report["selected"] else ("p" if i in report["pareto"] else " ")
+        p = r["params"]
+        print(f"{mark:<2}{p['n_estimators']:>6} {p['max_depth']:>6} {p['min_samples_leaf']:>5} {r['accuracy']:>9.4f} "
+              f"{r['size_mb']:>8.2f} {r['load_ms']:>8.1f} {r['predict_ms']:>11.2f} {r['compiled_ms']:>12.2f}")
+
+    print(f"\n{'compaction (cumulative)':<50} {'backend':<9} {'accuracy':>9} {'delta':>8} {'size MB':>8} {'ms':>7}")
+    for v in report["compaction"]:
+        print(f"{v['option']:<50} {v['backend']:<9} {v['accuracy']:>9.4f} {v['delta']:>+8.4f} "
+              f"{v['size_mb']:>8.2f} {v['latency_ms']:>7.2f}")
+    print(f"selected params {report['params']}, compact {report['compact']}")
+
+    # float32 thresholds are rounded down, so predictions are unchanged
+    X, y = df[FEATURES].to_numpy(np.float32), df["label"].to_numpy(str)
+    train, test = grouped_folds(pdf_ids, args.folds)[0]
+    compiled = CompiledForest.from_sklearn(_forest(report["params"], n_jobs=-1).fit(X[train], y[train]))
+    changed = int((compiled.predict(X[test]) != compiled.compact(float32=True).predict(X[test])).sum())
+
+    front = pareto_front(report["candidates"])
+    problems = []
+    if leaked:
+        problems.append(f"PDFs on both sides of folds {leaked}")
+    if sorted(front) != sorted(report["pareto"]) or report["selected"] not in front:
+        problems.append("selected candidate is not on the Pareto front")
+    if changed:
+        problems.append(f"float32 thresholds changed {changed} predictions")
+    if problems:
+        raise SystemExit("; ".join(problems))
+    print("\nOK: grouped folds, non-dominated front, lossless float32 thresholds.")
+
+if __name__ == "__main__":
+    main()
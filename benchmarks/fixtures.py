@@ -0,0 +1,213 @@
+"""
+Offline fixtures for benchmarks: deterministic synthetic academic PDFs and a
+local HTTP stand-in for the PMC OA API + PDF download host.
+"""
+import os
+import re
+import time
+import random
+import threading
+from urllib.parse import parse_qs, urlparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import fitz
+import numpy as np
+import pandas as pd
+
+WORDS = (
+    "layout model page column figure table results method analysis data sample "
+    "protein signal network energy cell model study effect value measure test"
+).split()
+
+# Base-14 (regular, bold) font pairs available to synthetic PDFs
+FONT_FAMILIES = {"helvetica": ("helv", "hebo"), "times": ("tiro", "tibo"), "courier": ("cour", "cobo")}
+
+def make_pdf(pages=4, seed=0, images=False, columns=2, font_family="helvetica", figure_rect=(315, 300, 535, 465),
+             table_rect=None):
+    """
+    Builds an academic-looking PDF with `columns` text columns in
+    `font_family` and returns its bytes. With `images`, every other page
+    also carries a figure at `figure_rect` (x0, y0, x1, y1). With
+    `table_rect`, every other page carries a 4-column numeric table there,
+    which the text columns flow around.
+    """
+    rng = random.Random(seed)
+    regular, bold = FONT_FAMILIES[font_family]
+    words_per_line = max(3, 14 // columns)
+    doc = fitz.open()
+    figure = None
+    if images:
+        figure = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 300), False)
+        figure.set_rect(figure.irect, (120, 80, 200))
+    for page_num in range(pages):
+        page = doc.new_page(width=595, height=842)
+        if figure is not None and page_num % 2 == 0:
+            page.insert_image(fitz.Rect(*figure_rect), pixmap=figure, keep_proportion=False)
+        table = table_rect if table_rect is not None and page_num % 2 == 0 else None
+        if table is not None:
+            tx0, ty0, tx1, ty1 = table
+            for row, cy in enumerate(range(int(ty0) + 10, int(ty1), 12)):
+                for col in range(4):
+                    cell = "Value" if row == 0 else f"{rng.random() * 100:.2f}"
+                    page.insert_text((tx0 + col * (tx1 - tx0) / 4, cy), cell, fontsize=8,
+                                     fontname=bold if row == 0 else regular)
+        page.insert_text((60, 40), f"Journal of Synthetic Studies {page_num + 1}", fontsize=8, fontname=regular)
+        y = 100
+        if page_num == 0:
+            page.insert_text((60, y), "A Synthetic Study of Layouts", fontsize=20, fontname=bold)
+            y += 40
+        for col in range(columns):
+            col_x = 60 + col * 510 // columns
+            cy = y
+            while cy < 760:
+                if table is not None and table[1] - 10 <= cy <= table[3] + 10 and col_x < table[2] and col_x + 510 // columns > table[0]:
+                    cy += 12
+                    continue
+                if rng.random() < 0.08:
+                    page.insert_text((col_x, cy), "Section Heading", fontsize=11, fontname=bold)
+                else:
+                    line = " ".join(rng.choice(WORDS) for _ in range(words_per_line))
+                    page.insert_text((col_x, cy), line, fontsize=9, fontname=regular)
+                cy += 12
+        page.insert_text((290, 810), str(page_num + 1), fontsize=8, fontname=regular)
+    content = doc.tobytes(no_new_id=True)  # No random /ID: same arguments, same bytes
+    doc.close()
+    return content
+
+def make_corpus(directory, pdfs=20, pages=8, columns=(1, 2, 3), font_families=tuple(FONT_FAMILIES), images=True, seed=0):
+    """
+    Writes `pdfs` deterministic PDFs to `directory`, cycling through the given
+    column counts and font families (images on every other document when
+    enabled). Returns the file paths; same arguments, same bytes.
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(pdfs):
+        path = os.path.join(directory, f"synthetic_{i:04d}.pdf")
+        with open(path, "wb") as f:
+            f.write(make_pdf(
+                pages, seed=seed + i, images=images and i % 2 == 0,
+                columns=columns[i % len(columns)], font_family=font_families[i % len(font_families)],
+            ))
+        paths.append(path)
+    return paths
+
+def synthetic_layout_frame(rows=100_000, pdfs=100, seed=0):
+    """
+    Random layout_features-like rows (pdf_id, page_number, geometry, font and
+    a rule-derived label), grouped by PDF and page like extracted data.
+    """
+    rng = np.random.default_rng(seed)
+    pdf_id = np.sort(rng.integers(1, pdfs + 1, rows))
+    page_number = rng.integers(0, 12, rows)
+    y0 = rng.uniform(20, 820, rows)
+    width = rng.uniform(20, 520, rows)
+    font_size = rng.choice([8.0, 9.0, 9.5, 10.0, 11.0, 12.0, 18.0], rows, p=[.1, .45, .2, .1, .08, .05, .02])
+    is_bold = rng.random(rows) < 0.12
+
+    label = np.select(
+        [y0 > 783, y0 < 67, font_size > 16, (font_size > 10) & is_bold & (width < 416)],
+        ["footer", "header", "title", "header"], default="body",
+    )
+    return pd.DataFrame({
+        "pdf_id": pdf_id, "page_number": page_number,
+        "font_size": font_size, "is_bold": is_bold,
+        "x0": rng.uniform(40, 300, rows).round(2), "y0": y0.round(2),
+        "width": width.round(2), "height": rng.uniform(8, 14, rows).round(2),
+        "label": label,
+    })
+
+class FixtureServer:
+    """
+    Serves `/oa?id=PMC<id>` (OA API XML) and `/pdf/<id>.pdf` from memory on
+    localhost. `latency` (seconds) is added to every response to mimic the network.
+    `esearch` ({term: [ids]}) also serves `/esearch` like NCBI's esearch.fcgi;
+    once `fail_after` esearch requests were served, the rest answer 500.
+    """
+
+    def __init__(self, pdfs, latency=0.0, esearch=None, fail_after=None):
+        self.pdfs = pdfs
+        self.latency = latency
+        self.esearch = esearch or {}
+        self.fail_after = fail_after
+        self.esearch_requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def oa_url(self):
+        return f"{self.base_url}/oa"
+
+    @property
+    def esearch_url(self):
+        return f"{self.base_url}/esearch"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body, content_type, headers=()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _esearch(self):
+                with server._lock:
+                    server.esearch_requests += 1
+                    failing = server.fail_after is not None and server.esearch_requests > server.fail_after
+                if failing:
+                    self._send(500, b"", "text/xml")
+                    return
+                query = parse_qs(urlparse(self.path).query)
+                ids = server.esearch.get(query["term"][0], [])
+                start, size = int(query.get("retstart", ["0"])[0]), int(query.get("retmax", ["20"])[0])
+                page = "".join(f"<Id>{i}</Id>" for i in ids[start:start + size])
+                body = f"<eSearchResult><Count>{len(ids)}</Count><IdList>{page}</IdList></eSearchResult>"
+                self._send(200, body.encode(), "text/xml")
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                if self.path.startswith("/esearch"):
+                    return self._esearch()
+                oa = re.match(r"/oa\?id=PMC(\w+)", self.path)
+                pdf = re.match(r"/pdf/(\w+)\.pdf", self.path)
+                if oa and oa.group(1) in server.pdfs:
+                    href = f"{server.base_url}/pdf/{oa.group(1)}.pdf"
+                    body = f'<OA><records><record><link format="pdf" href="{href}"/></record></records></OA>'
+                    self._send(200, body.encode(), "text/xml")
+                elif pdf and pdf.group(1) in server.pdfs:
+                    body = server.pdfs[pdf.group(1)]
+                    start = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+                    if start and int(start.group(1)) >= len(body):
+                        self._send(416, b"", "application/pdf")
+                    elif start:
+                        offset = int(start.group(1))
+                        content_range = ("Content-Range", f"bytes {offset}-{len(body) - 1}/{len(body)}")
+                        self._send(206, body[offset:], "application/pdf", [content_range])
+                    else:
+                        self._send(200, body, "application/pdf")
+                else:
+                    self._send(404, b"<OA><error/></OA>", "text/xml")
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
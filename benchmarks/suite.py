@@ -0,0 +1,236 @@
+"""
+End-to-end benchmark suite over a deterministic synthetic PDF corpus (no
+network). Times every stage of the pipeline:
+
+* extraction     pages/s and lines/s of `extract_pdf`
+* labeling       lines/s of the vectorized heuristic labeler
+* db_insert      rows/s of LayoutFeatureWriter into a fresh SQLite file
+* training       seconds and peak RSS of `train_layout_model` (own process)
+* prediction     rows/s of `predict_layout` (sklearn, whole corpus; compiled, page-sized batches)
+* tex            documents/s of `build_document` over every layout
+
+and writes the numbers as JSON. With --baseline, every metric is compared
+to a previous result file and the run exits 1 when one got worse by more
+than --threshold (relative). Timed stages report the best of --repeat runs.
+Run from the repo root:
+
+    python -m benchmarks.suite --out bench-results/base.json
+    python -m benchmarks.suite --out bench-results/new.json --baseline bench-results/base.json --threshold 0.15
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import numpy as np
+
+from benchmarks.fixtures import make_corpus
+
+def best_time(fn, repeat):
+    """Minimum wall time of `repeat` calls (least disturbed by other load) and the last result."""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def _status_kb(field):
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field))
+
+def child_train(model_path):
+    """Runs in a fresh process, so VmHWM is the training peak (imports included)."""
+    from src.models.trainer import train_layout_model
+    base = _status_kb("VmRSS:")
+    start = time.perf_counter()
+    train_layout_model(model_path=model_path, chunksize=50_000)
+    seconds = time.perf_counter() - start
+    print(json.dumps({"seconds": seconds, "peak_rss_mb": _status_kb("VmHWM:") / 1024, "base_rss_mb": base / 1024}))
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_suite(args, workdir):
+    """Returns {metric: {"value", "unit", "higher_is_better"}}."""
+    metrics = {}
+
+    def record(name, value, unit, higher_is_better=True):
+        metrics[name] = {"value": round(value, 4), "unit": unit, "higher_is_better": higher_is_better}
+        print(f"  {name:<32} {value:>12,.2f} {unit}")
+
+    from src.data.extraction import ExtractedLines, extract_pdf
+    from src.data.labeling import label_lines
+
+    paths = make_corpus(
+        os.path.join(workdir, "corpus"), args.pdfs, args.pages,
+        columns=tuple(args.columns), font_families=tuple(args.fonts), images=not args.no_images,
+    )
+    total_pages = args.pdfs * args.pages
+
+    # 1. Extraction (in-process: per-core throughput)
+    seconds, docs = best_time(lambda: [extract_pdf(path) for path in paths], args.repeat)
+    lines = ExtractedLines.concat(docs)
+    record("extraction.pages_per_s", total_pages / seconds, "pages/s")
+    record("extraction.lines_per_s", len(lines) / seconds, "lines/s")
+
+    # 2. Labeling (the corpus lines tiled to --label-lines, so the timing is not all call overhead)
+    rec = lines.records[~lines.records["is_image"]]
+    rec = np.tile(rec, -(-args.label_lines // len(rec)))
+    seconds, _ = best_time(lambda: label_lines(
+        rec["font_size"], rec["is_bold"], rec["x0"], rec["y0"], rec["width"], rec["page_width"], rec["page_height"],
+    ), args.repeat)
+    record("labeling.lines_per_s", len(rec) / seconds, "lines/s")
+
+    # 3. DB insert
+    from src.data.db_session import SessionLocal, init_db
+    from src.data.models_db import PDFMetadata, LayoutFeatures
+    from src.data.feature_writer import LayoutFeatureWriter
+
+    init_db()
+    db = SessionLocal()
+    pdfs = [PDFMetadata(pmid=str(i), processed=False) for i in range(len(docs))]
+    db.add_all(pdfs)
+    db.commit()
+    pdf_ids = [pdf.id for pdf in pdfs]
+
+    def insert():
+        db.query(LayoutFeatures).delete()
+        db.commit()
+        writer = LayoutFeatureWriter(db)
+        start = time.perf_counter()
+        for pdf_id, doc in zip(pdf_ids, docs):
+            writer.add_document(pdf_id, doc)
+        writer.flush()
+        return time.perf_counter() - start
+
+    seconds = min(insert() for _ in range(args.repeat))
+    record("db_insert.rows_per_s", len(lines) / seconds, "rows/s")
+    db.close()
+
+    # 4. Training (a fresh process per run, for a clean peak RSS)
+    model_path = os.path.join(workdir, "layout_model.joblib")
+    runs = []
+    for _ in range(args.repeat):
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.suite", "--child-train", model_path],
+            capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    record("training.seconds", min(r["seconds"] for r in runs), "s", higher_is_better=False)
+    record("training.peak_rss_mb", min(r["peak_rss_mb"] for r in runs), "MB", higher_is_better=False)
+
+    # 5. Prediction
+    import pandas as pd
+    from src.models.inference import AcademicEngine, COMPILED_MAX_ROWS
+
+    frame = pd.DataFrame({
+        name: values for name, values in lines.to_columns().items()
+        if name in ("page_number", "font_size", "is_bold", "x0", "y0", "width", "height")
+    })
+    frame["pdf_id"] = [pdf_id for pdf_id, doc in zip(pdf_ids, docs) for _ in range(len(doc))]
+
+    sklearn_engine = AcademicEngine(model_path, backend="sklearn")
+    sklearn_engine.load()
+    seconds, _ = best_time(lambda: sklearn_engine.predict_layout(frame), args.repeat)
+    record("prediction.sklearn_rows_per_s", len(frame) / seconds, "rows/s")
+
+    compiled_engine = AcademicEngine(model_path, backend="compiled")
+    compiled_engine.load()
+    batches = [frame.iloc[i:i + COMPILED_MAX_ROWS // 2] for i in range(0, len(frame), COMPILED_MAX_ROWS // 2)]
+    seconds, _ = best_time(lambda: [compiled_engine.predict_layout(b) for b in batches], args.repeat)
+    record("prediction.compiled_rows_per_s", len(frame) / seconds, "rows/s")
+
+    # 6. .tex generation
+    from src.models.inference import COMPONENT_TYPES, LAYOUTS, POSITIONS, build_document
+
+    requests = [(layout, c_type, pos) for layout in LAYOUTS for c_type in COMPONENT_TYPES for pos in POSITIONS]
+    requests *= max(1, args.tex_docs // len(requests))
+    seconds, _ = best_time(lambda: [build_document(sklearn_engine, *r) for r in requests], args.repeat)
+    record("tex.docs_per_s", len(requests) / seconds, "docs/s")
+
+    return metrics
+
+def compare(metrics, baseline, threshold):
+    """Prints current vs baseline per metric; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'metric':<32} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, current in metrics.items():
+        base = baseline.get("metrics", {}).get(name)
+        if base is None or not base["value"]:
+            print(f"{name:<32} {'-':>12} {current['value']:>12,.2f} {'new':>8}")
+            continue
+        change = (current["value"] - base["value"]) / base["value"]
+        worse = -change if current["higher_is_better"] else change
+        flag = ""
+        if worse > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<32} {base['value']:>12,.2f} {current['value']:>12,.2f} {change:>+8.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--out", default=None, help="JSON results file (default: bench-results/<commit>.json).")
+    parser.add_argument("--baseline", default=None, help="Earlier results file to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Allowed relative slowdown per metric.")
+    parser.add_argument("--pdfs", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--columns", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--fonts", nargs="+", default=["helvetica", "times", "courier"])
+    parser.add_argument("--no-images", action="store_true")
+    parser.add_argument("--label-lines", type=int, default=1_000_000)
+    parser.add_argument("--tex-docs", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child-train", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_train:
+        return child_train(args.child_train)
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    # Configuration is read at import time, so set it before importing src.*
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["OUTPUT_DIR"] = os.path.join(workdir, "output")
+
+    commit = git_commit()
+    print(f"Benchmark suite @ {commit or 'unknown commit'} ({args.pdfs} PDFs x {args.pages} pages)")
+    metrics = run_suite(args, workdir)
+
+    results = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "child_train")},
+        },
+        "metrics": metrics,
+    }
+    out = args.out or os.path.join("bench-results", f"{commit or 'results'}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("config") != results["meta"]["config"]:
+            print("Warning: baseline was recorded with a different configuration.")
+        regressions = compare(metrics, baseline, args.threshold)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} metric(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f"\nOK: no metric regressed by more than {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import os
 import logging
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
@@ -20,17 +20,26 @@ if not DATABASE_URL:
 # Create the engine
 engine = create_engine(DATABASE_URL)
 
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _enable_foreign_keys(dbapi_conn, _):
+        # SQLite ignores FOREIGN KEY clauses (ON DELETE CASCADE of layout_text) unless asked
+        dbapi_conn.execute("PRAGMA foreign_keys=ON")
+
 # Create the SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Define the Base class ONLY ONCE here
 Base = declarative_base()
 
-def init_db():
+def init_db(check_schema=True):
     """
     Initializes the database.
     It imports the models effectively registering them with the Base metadata,
-    and then creates the tables if they do not exist.
+    and then creates the tables if the database has none of them yet.
+    An existing database is never altered here (every worker calls this):
+    if it lacks tables or columns the code needs, this raises and points at
+    `python -m src.data.migrate`; other pending upgrades are only logged.
     """
     try:
         # Import models inside the function to avoid circular imports
@@ -38,7 +47,19 @@ def init_db():
         import src.data.models_db  # noqa: F401
         
         logger.info("Checking for database tables...")
-        Base.metadata.create_all(bind=engine)
+        if not set(inspect(engine).get_table_names()) & set(Base.metadata.tables):
+            Base.metadata.create_all(bind=engine)
+        elif check_schema:
+            from src.data.migrate import missing_schema, pending_changes
+            tables, columns, _ = missing_schema(engine)
+            if tables or columns:
+                raise RuntimeError(
+                    f"Database schema is out of date (missing {', '.join(tables + columns)}): "
+                    "run `python -m src.data.migrate` first."
+                )
+            changes = pending_changes(engine)
+            if changes:
+                logger.warning(f"Schema upgrade pending ({'; '.join(changes)}): run `python -m src.data.migrate`.")
         logger.info("Database initialized successfully. Tables are ready.")
     except Exception as e:
         logger.error(f"Error initializing database: {e}")
@@ -0,0 +1,236 @@
+import os
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import fitz
+import numpy as np
+from src import telemetry
+from src.data.labeling import label_lines
+
+# Pages handed to one worker task; small enough to balance a single large PDF
+PAGES_PER_TASK = int(os.getenv("EXTRACT_PAGES_PER_TASK", "32"))
+
+# Documents with more pages than this are streamed: extracted and written one page
+# range at a time instead of being held whole in memory (see `stream_extraction`)
+STREAM_PAGES = int(os.getenv("EXTRACT_STREAM_PAGES", "200"))
+
+# Recorded on every document written. Bump it whenever a change here changes the rows
+# extracted from a PDF; `python -m src.data.reextract` then re-parses older documents.
+EXTRACTOR_VERSION = 1
+
+# One record per image block / text line (texts are kept in a separate list)
+LINE_DTYPE = np.dtype([
+    ("page_number", np.int32), ("is_image", np.bool_), ("font_size", np.float64), ("is_bold", np.bool_),
+    ("x0", np.float64), ("y0", np.float64), ("width", np.float64), ("height", np.float64),
+    ("page_width", np.float64), ("page_height", np.float64), ("label", "U7"),
+])
+
+def sanitize_text(text):
+    """Removes NUL bytes which crash the database driver."""
+    if not text:
+        return ""
+    return text.replace('\x00', '')
+
+@lru_cache(maxsize=4096)
+def is_bold_font(font_name):
+    """A span counts as bold when its font name says so (a PDF uses few fonts)."""
+    return "bold" in font_name.lower()
+
+class ExtractedLines:
+    """
+    Layout rows of one document (or page range): a LINE_DTYPE array plus the
+    line texts (None for images). Much cheaper to build and to send between
+    processes than one dict per line. `metrics` carries the telemetry of the
+    worker process that extracted it (None when telemetry is off).
+    """
+    __slots__ = ("records", "texts", "pages", "metrics")
+
+    def __init__(self, records, texts, pages=0, metrics=None):
+        self.records = records
+        self.texts = texts
+        self.pages = pages
+        self.metrics = metrics
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def concat(cls, parts):
+        parts = list(parts)
+        if not parts:
+            return cls(np.empty(0, dtype=LINE_DTYPE), [])
+        for p in parts:
+            telemetry.merge(p.metrics)  # Worker metrics land in the process that assembles the document
+            p.metrics = None
+        return cls(
+            np.concatenate([p.records for p in parts]), [t for p in parts for t in p.texts],
+            sum(p.pages for p in parts),
+        )
+
+    def labels(self):
+        return self.records["label"].tolist()
+
+    def to_columns(self):
+        """Per-column value lists keyed by LayoutFeatures column (image rows get None text/font)."""
+        rec = self.records
+        is_image = rec["is_image"].tolist()
+        columns = {name: rec[name].tolist() for name in LINE_DTYPE.names}
+        columns["font_size"] = [None if img else v for img, v in zip(is_image, columns["font_size"])]
+        columns["is_bold"] = [None if img else v for img, v in zip(is_image, columns["is_bold"])]
+        columns["text_content"] = list(self.texts)
+        columns["is_italic"] = [False] * len(self)
+        return columns
+
+    def rows(self):
+        """The same dicts `extract_layout_rows` always yielded (text/font keys only on text lines)."""
+        columns = {name: self.records[name].tolist() for name in LINE_DTYPE.names}
+        for i, text in enumerate(self.texts):
+            row = dict(
+                page_number=columns["page_number"][i], page_width=columns["page_width"][i],
+                page_height=columns["page_height"][i], x0=columns["x0"][i], y0=columns["y0"][i],
+                width=columns["width"][i], height=columns["height"][i], label=columns["label"][i],
+            )
+            if columns["is_image"][i]:
+                row["is_image"] = True
+            else:
+                row.update(text_content=text, font_size=columns["font_size"][i], is_bold=columns["is_bold"][i])
+            yield row
+
+def extract_lines(doc, start=0, stop=None):
+    """
+    Extracts pages [start, stop) of an open fitz document at the LINE level.
+    Text lines are labeled one page at a time with the vectorized labeler.
+    """
+    records, texts = [], []
+    stop = doc.page_count if stop is None else stop
+
+    for page_num in range(start, stop):
+        page = doc[page_num]
+        _, _, page_w, page_h = page.rect
+        page_width, page_height = round(page_w, 2), round(page_h, 2)
+        text_index, line_attrs = [], []
+
+        # Most of a worker's time: the compact records only make the result cheaper to
+        # ship and buffer. Without TEXT_PRESERVE_IMAGES, locating images takes a second
+        # device pass per page and image rows lose their place among the text lines.
+        with telemetry.stage("parse"):
+            blocks = page.get_text("dict")["blocks"]
+
+        for b in blocks:
+            # IMAGE BLOCK
+            if b["type"] == 1:
+                bx0, by0, bx1, by1 = b["bbox"]
+                records.append((
+                    page_num, True, np.nan, False, round(bx0, 2), round(by0, 2),
+                    round(bx1 - bx0, 2), round(by1 - by0, 2), page_width, page_height, "image",
+                ))
+                texts.append(None)
+                continue
+
+            # TEXT BLOCK: aggregate the spans of each line
+            for l in b.get("lines", ()):
+                spans = l["spans"]
+                full_text = sanitize_text(" ".join([s["text"] for s in spans]).strip())
+                if not full_text:
+                    continue
+
+                avg_size = sum([s["size"] for s in spans]) / len(spans)
+                is_bold = sum([is_bold_font(s["font"]) for s in spans]) > (len(spans) / 2)
+                x0, y0, x1, y1 = l["bbox"]
+                width = x1 - x0
+
+                text_index.append(len(records))
+                # Whitespace-only lines are kept and labeled "garbage", like `heuristic_labeling`
+                line_attrs.append((avg_size, is_bold, x0, y0, width, not full_text.isspace()))
+                records.append((
+                    page_num, False, round(avg_size, 2), is_bold, round(x0, 2), round(y0, 2),
+                    round(width, 2), round(y1 - y0, 2), page_width, page_height, "",
+                ))
+                texts.append(full_text[:1000])  # Truncate if huge
+
+        # Heuristic Labeling (whole page at once, on unrounded values)
+        if line_attrs:
+            size, bold, x0, y0, width, has_text = zip(*line_attrs)
+            with telemetry.stage("label"):
+                labels = label_lines(size, bold, x0, y0, width, page_w, page_h, has_text=has_text).tolist()
+            for i, label in zip(text_index, labels):
+                records[i] = records[i][:-1] + (label,)
+
+    return ExtractedLines(np.array(records, dtype=LINE_DTYPE), texts, max(stop - start, 0))
+
+def extract_pages(path, start=0, stop=None):
+    """
+    Extracts pages [start, stop) of the PDF at `path`. Top-level (picklable)
+    so page ranges of one document can run in different worker processes.
+    Opened by filename so MuPDF reads pages from disk instead of a bytes copy.
+    """
+    with fitz.open(path) as doc:
+        return extract_lines(doc, start, stop)
+
+def _extract_task(path, start, stop):
+    """Pool task: `extract_pages` plus the worker's telemetry, merged back by `ExtractedLines.concat`."""
+    lines = extract_pages(path, start, stop)
+    lines.metrics = telemetry.drain()
+    return lines
+
+def page_count(path):
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+def submit_extraction(pool, path, pages_per_task=PAGES_PER_TASK):
+    """Submits one task per page range of `path`; returns the futures in page order."""
+    pages = page_count(path)
+    return [
+        pool.submit(_extract_task, path, start, min(start + pages_per_task, pages))
+        for start in range(0, max(pages, 1), pages_per_task)
+    ]
+
+def stream_extraction(path, pool=None, pages_per_task=PAGES_PER_TASK, window=2):
+    """
+    Yields the `ExtractedLines` of `path` one range of `pages_per_task` pages
+    at a time, in page order, so a caller that writes and drops each range
+    holds a single range in memory whatever the document size. Each range
+    reopens the document and MuPDF's object store is emptied after it, so the
+    pages, fonts and images parsed for earlier ranges are released (an open
+    document keeps every parsed page object); with a `pool`, at most
+    `window` ranges are extracted ahead of the consumer.
+    """
+    pages = page_count(path)
+    if pool is None:
+        for start in range(0, max(pages, 1), pages_per_task):
+            with telemetry.stage("extract"):
+                lines = extract_pages(path, start, min(start + pages_per_task, pages))
+            fitz.TOOLS.store_shrink(100)
+            yield lines
+        return
+
+    starts = iter(range(0, max(pages, 1), pages_per_task))
+    pending = []
+    try:
+        while True:
+            for start in starts:
+                pending.append(pool.submit(_extract_task, path, start, min(start + pages_per_task, pages)))
+                if len(pending) >= window:
+                    break
+            if not pending:
+                return
+            lines = pending.pop(0).result()
+            telemetry.merge(lines.metrics)
+            lines.metrics = None
+            yield lines
+    finally:
+        for future in pending:  # The consumer gave up (e.g. a failed write)
+            future.cancel()
+
+def extract_pdf(path, workers=None, pages_per_task=PAGES_PER_TASK):
+    """
+    Extracts a whole PDF, spreading its page ranges over `workers` processes
+    (in this process when `workers` is None/1 or the PDF fits in one range).
+    """
+    if not workers or workers <= 1:
+        return extract_pages(path)
+    with fitz.open(path) as doc:
+        if doc.page_count <= pages_per_task:
+            return extract_lines(doc)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = submit_extraction(pool, path, pages_per_task)
+        return ExtractedLines.concat(f.result() for f in futures)
@@ -0,0 +1,375 @@
+import os
+import io
+import csv
+import time
+import pickle
+import logging
+import tempfile
+from collections import Counter
+from itertools import compress
+from sqlalchemy import bindparam, delete, insert, select, text, update
+from src import telemetry
+from src.data.extraction import EXTRACTOR_VERSION
+from src.data.labeling import labeler_version
+from src.data.models_db import PDFMetadata, LayoutFeatures, LayoutText
+from src.data.work_queue import DONE, mark_failed
+
+logger = logging.getLogger(__name__)
+
+# Column order used for buffering, executemany and COPY (text_content goes to layout_text)
+FEATURE_COLUMNS = (
+    "pdf_id", "font_size", "is_bold", "is_italic",
+    "x0", "y0", "width", "height", "page_number", "page_width", "page_height", "is_image", "label",
+)
+_BUFFER_COLUMNS = FEATURE_COLUMNS + ("text_content",)
+
+# Values for columns an extracted row may omit (image rows carry no text/font)
+_DEFAULTS = {"text_content": None, "font_size": None, "is_bold": None, "is_italic": False, "is_image": False}
+
+DEFAULT_FLUSH_SIZE = int(os.getenv("FEATURE_FLUSH_SIZE", "5000"))
+
+def _append_rows(columns, pdf_id, rows):
+    """Appends one PDF's rows (row dicts or an `ExtractedLines`) to per-column lists."""
+    if hasattr(rows, "to_columns"):
+        extracted = rows.to_columns()
+        for name in _BUFFER_COLUMNS[1:]:
+            columns[name].extend(extracted[name])
+    else:
+        for row in rows:
+            for name in _BUFFER_COLUMNS[1:]:
+                columns[name].append(row.get(name, _DEFAULTS.get(name)))
+    columns["pdf_id"].extend([pdf_id] * len(rows))
+
+def _record_document(pages, lines):
+    """Per-PDF size metrics of a committed document (`pages` None when the rows did not say)."""
+    if pages is not None:
+        telemetry.observe("pdf_pages", pages, telemetry.COUNT_BUCKETS)
+    telemetry.observe("pdf_lines", lines, telemetry.COUNT_BUCKETS)
+    telemetry.inc("pdfs_total", result="done")
+
+def _spooled(chunks):
+    """
+    Runs `chunks` to the end into a temporary file and returns a generator
+    reading them back one at a time (memory stays at one chunk).
+    """
+    spool = tempfile.TemporaryFile()
+    try:
+        for chunk in chunks:
+            pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+
+    def replay():
+        with spool:
+            while True:
+                try:
+                    yield pickle.load(spool)
+                except EOFError:
+                    return
+    return replay()
+
+class LayoutFeatureWriter:
+    """
+    Buffers extracted line features as plain column lists (no ORM objects) and
+    flushes them in one executemany (or COPY on PostgreSQL) per `flush_size` rows.
+    Line texts are written to layout_text under the ids of their feature rows
+    (reserved from the id sequence on PostgreSQL, consecutive rowids on SQLite).
+
+    A PDF is only marked `processed` in the same transaction that inserts its
+    rows. Batches may span several PDFs: when one fails, its PDFs are retried
+    one per transaction, so only the PDF whose rows cannot be written fails
+    (released through `mark_failed` when leased, otherwise left unprocessed).
+    Per-PDF telemetry (`pdfs_total`, sizes) is recorded once a PDF is committed.
+
+    Rows a PDF already has (a re-extraction) are deleted in that same
+    transaction, so readers see either the old rows or the new ones. The
+    PDF's content hash and the extractor/labeler versions are recorded with them.
+
+    With a `worker_id` (leased work queue), only PDFs whose lease this worker
+    still holds are written; rows of PDFs re-leased to another worker after
+    an expiry are dropped instead of being stored twice.
+    """
+
+    def __init__(self, db, flush_size=None, use_copy=None, worker_id=None):
+        self.db = db
+        self.worker_id = worker_id
+        self.flush_size = flush_size or DEFAULT_FLUSH_SIZE
+        if use_copy is None:
+            use_copy = db.get_bind().dialect.name == "postgresql"
+        self.use_copy = use_copy
+
+        self._columns = {name: [] for name in _BUFFER_COLUMNS}
+        self._pending_pdfs = []
+        self._hashes = {}
+        self._pages = {}
+        self.rows_written = 0
+        self.flushes = 0
+        self.lost_leases = 0
+        self.failed_pdfs = []
+        self.flush_seconds = 0.0
+
+    def __len__(self):
+        return len(self._columns["pdf_id"])
+
+    def add_document(self, pdf_id, rows, content_sha256=None):
+        """
+        Buffers every row of one PDF; flushes once the buffer is full.
+        `rows` is a list of row dicts or an `ExtractedLines` (whole columns are appended);
+        `content_sha256` is the hash of the PDF bytes they were extracted from.
+        Returns False if that flush could not write some of its PDFs (see `flush`).
+        """
+        _append_rows(self._columns, pdf_id, rows)
+        self._pending_pdfs.append(pdf_id)
+        self._hashes[pdf_id] = content_sha256
+        self._pages[pdf_id] = getattr(rows, "pages", None)
+
+        if len(self) >= self.flush_size:
+            return self.flush()
+        return True
+
+    def write_document(self, pdf_id, chunks, content_sha256=None):
+        """
+        Streams one (large) PDF to the DB: each chunk of rows (an
+        `ExtractedLines` or a list of row dicts) is inserted as soon as it
+        arrives and then dropped, so only one chunk is held in memory. The
+        PDF's previous rows are replaced and it is marked processed in the
+        same transaction, committed after the last chunk: any failure, in the
+        DB or in the extraction producing `chunks`, rolls the whole document
+        back and is re-raised. Buffered documents are flushed first.
+        On SQLite the first insert holds the database-wide write lock until
+        commit, so `chunks` are spooled to a temporary file first and the
+        transaction only spans the inserts, not the extraction.
+        Returns False if the lease on the PDF moved to another worker; it is
+        checked again just before commit, once the write lock is held.
+        """
+        self.flush()
+        n_rows, pages, first_id, db_seconds = 0, 0, None, 0.0
+        try:
+            if self.worker_id is not None and not self._still_owned(pdf_id):
+                return False
+            if self.db.get_bind().dialect.name == "sqlite":
+                chunks = _spooled(chunks)
+
+            for chunk in chunks:
+                columns = {name: [] for name in _BUFFER_COLUMNS}
+                _append_rows(columns, pdf_id, chunk)
+                pages += getattr(chunk, "pages", 0)
+                del chunk
+                start = time.perf_counter()
+                ids = self._write_columns(columns)
+                db_seconds += time.perf_counter() - start
+                if first_id is None and ids:
+                    first_id = ids[0]
+                n_rows += len(ids)
+
+            start = time.perf_counter()
+            if self.worker_id is not None and not self._still_owned(pdf_id):
+                return False
+            replaced = self._finish([pdf_id], {pdf_id: content_sha256}, first_id)
+            self.db.commit()
+            db_seconds += time.perf_counter() - start
+        except Exception as e:
+            self.db.rollback()
+            telemetry.error("db_stream", e)
+            logger.error(f"Rolled back the {n_rows} rows streamed for PDF {pdf_id}: {e}")
+            raise
+
+        telemetry.observe("stage_seconds", db_seconds, stage="db_stream")
+        telemetry.inc("rows_written_total", n_rows)
+        if replaced:
+            telemetry.inc("rows_replaced_total", replaced)
+        _record_document(pages, n_rows)
+        self.flush_seconds += db_seconds
+        self.rows_written += n_rows
+        self.flushes += 1
+        return True
+
+    def flush(self):
+        """
+        Writes buffered rows and marks their PDFs processed (status done) in one
+        transaction. If that fails, every PDF is retried in its own transaction
+        and the ones that fail again are released for a later attempt.
+        Returns False if any PDF could not be written.
+        """
+        if not self._pending_pdfs:
+            return True
+
+        columns, pdf_ids, hashes, pages = self._columns, self._pending_pdfs, self._hashes, self._pages
+        self._columns = {name: [] for name in _BUFFER_COLUMNS}
+        self._pending_pdfs = []
+        self._hashes = {}
+        self._pages = {}
+
+        error = self._write_batch(columns, pdf_ids, hashes, pages)
+        if error is None:
+            return True
+        if len(pdf_ids) == 1:
+            self._release(pdf_ids[0], error)
+            return False
+
+        # Isolate the PDF(s) at fault: one transaction per PDF
+        logger.warning(f"Retrying the {len(pdf_ids)} PDFs of the failed flush one at a time.")
+        ok = True
+        for pdf_id in pdf_ids:
+            keep = [row_pdf == pdf_id for row_pdf in columns["pdf_id"]]
+            part = {name: list(compress(values, keep)) for name, values in columns.items()}
+            error = self._write_batch(part, [pdf_id], hashes, pages)
+            if error is not None:
+                self._release(pdf_id, error)
+                ok = False
+        return ok
+
+    def _write_batch(self, columns, pdf_ids, hashes, pages):
+        """One flush transaction; returns the exception it rolled back, or None once committed."""
+        n_rows = len(columns["pdf_id"])
+        start = time.perf_counter()
+        try:
+            if self.worker_id is not None:
+                columns, pdf_ids = self._owned(columns, pdf_ids)
+                n_rows = len(columns["pdf_id"])
+            ids = self._write_columns(columns)
+            replaced = self._finish(pdf_ids, hashes, min(ids, default=None))
+            self.db.commit()
+        except Exception as e:
+            # Rollback first to clean the session state
+            self.db.rollback()
+            telemetry.error("db_flush", e)
+            logger.error(f"Error flushing {n_rows} rows from {len(pdf_ids)} PDFs: {e}")
+            return e
+
+        elapsed = time.perf_counter() - start
+        telemetry.observe("stage_seconds", elapsed, stage="db_flush")
+        telemetry.inc("rows_written_total", n_rows)
+        if replaced:
+            telemetry.inc("rows_replaced_total", replaced)
+        lines = Counter(columns["pdf_id"])
+        for pdf_id in pdf_ids:
+            _record_document(pages.get(pdf_id), lines[pdf_id])
+        self.flush_seconds += elapsed
+        self.rows_written += n_rows
+        self.flushes += 1
+        return None
+
+    def _release(self, pdf_id, error):
+        """A PDF whose rows could not be written: back to the queue (retry/backoff) when leased."""
+        self.failed_pdfs.append(pdf_id)
+        telemetry.inc("pdfs_total", result="failed")
+        state = mark_failed(self.db, pdf_id, self.worker_id, error) if self.worker_id is not None else None
+        logger.error(f"Could not write the rows of PDF {pdf_id} ({state or 'left unprocessed'}): {error}")
+
+    def _write_columns(self, columns):
+        """Inserts buffered feature rows and their texts (no commit); returns the feature ids."""
+        if not columns["pdf_id"]:
+            return []
+        ids = self._insert_features({name: columns[name] for name in FEATURE_COLUMNS})
+        text_rows = [(i, t) for i, t in zip(ids, columns["text_content"]) if t is not None]
+        if text_rows:
+            self._insert_texts(text_rows)
+        return ids
+
+    def _finish(self, pdf_ids, hashes, first_new_id):
+        """
+        Replaces the previous rows of `pdf_ids` and marks them processed with
+        their content hash and extractor/labeler versions (no commit).
+        Returns the number of replaced rows.
+        """
+        replaced = self._delete_previous(pdf_ids, first_new_id)
+        if pdf_ids:
+            pdf_table = PDFMetadata.__table__
+            self.db.execute(
+                update(pdf_table).where(pdf_table.c.id == bindparam("pdf"))
+                .values(
+                    processed=True, status=DONE, lease_owner=None, lease_expires_at=None, last_error=None,
+                    content_sha256=bindparam("sha"), extractor_version=EXTRACTOR_VERSION,
+                    labeler_version=labeler_version(),
+                ),
+                [{"pdf": pdf_id, "sha": hashes.get(pdf_id)} for pdf_id in pdf_ids],
+            )
+        return replaced
+
+    def _still_owned(self, pdf_id):
+        """Whether `pdf_id` is still leased to this worker; rolls the transaction back if not."""
+        _, owned = self._owned({name: [] for name in _BUFFER_COLUMNS}, [pdf_id])
+        if not owned:
+            self.db.rollback()
+        return bool(owned)
+
+    def _owned(self, columns, pdf_ids):
+        """Keeps the buffered PDFs still leased to this worker (row-locked until commit on PostgreSQL)."""
+        pdf_table = PDFMetadata.__table__
+        owned = set(self.db.scalars(
+            select(pdf_table.c.id)
+            .where(pdf_table.c.id.in_(pdf_ids), pdf_table.c.lease_owner == self.worker_id)
+            .with_for_update()
+        ))
+        if len(owned) == len(pdf_ids):
+            return columns, pdf_ids
+
+        lost = [pdf_id for pdf_id in pdf_ids if pdf_id not in owned]
+        self.lost_leases += len(lost)
+        telemetry.inc("lost_leases_total", len(lost))
+        logger.warning(f"Dropping rows of {len(lost)} PDFs whose lease moved to another worker: {lost}")
+        keep = [pdf_id in owned for pdf_id in columns["pdf_id"]]
+        return {name: list(compress(values, keep)) for name, values in columns.items()}, sorted(owned)
+
+    def _delete_previous(self, pdf_ids, first_new_id=None):
+        """
+        Deletes the rows (and, by cascade, texts) the PDFs had before this
+        flush inserted ids >= `first_new_id`; returns the row count. Deleting
+        after inserting keeps ids increasing (SQLite reuses freed top rowids).
+        """
+        if not pdf_ids:
+            return 0
+        table = LayoutFeatures.__table__
+        stmt = delete(table).where(table.c.pdf_id.in_(pdf_ids))
+        if first_new_id is not None:
+            stmt = stmt.where(table.c.id < first_new_id)
+        return self.db.execute(stmt).rowcount
+
+    def _insert_features(self, columns):
+        """Inserts the buffered feature rows; returns their ids in buffer order."""
+        table = LayoutFeatures.__table__
+        n_rows = len(columns["pdf_id"])
+        dialect = self.db.get_bind().dialect.name
+        if dialect == "postgresql":
+            ids = self._reserve_ids(n_rows)
+            if self.use_copy:
+                self._copy(table.name, ("id",) + FEATURE_COLUMNS, zip(ids, *columns.values()))
+            else:
+                params = [dict(zip(("id",) + FEATURE_COLUMNS, values)) for values in zip(ids, *columns.values())]
+                self.db.execute(insert(table), params)
+            return ids
+
+        params = [dict(zip(FEATURE_COLUMNS, values)) for values in zip(*columns.values())]
+        if dialect == "sqlite":
+            # One executemany under the write lock: rowids are consecutive up to last_insert_rowid()
+            self.db.execute(insert(table), params)
+            last_id = self.db.execute(text("SELECT last_insert_rowid()")).scalar()
+            return list(range(last_id - n_rows + 1, last_id + 1))
+        result = self.db.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True), params)
+        return result.scalars().all()
+
+    def _insert_texts(self, text_rows):
+        if self.use_copy:
+            self._copy(LayoutText.__tablename__, ("feature_id", "text_content"), text_rows)
+        else:
+            params = [{"feature_id": i, "text_content": t} for i, t in text_rows]
+            self.db.execute(insert(LayoutText.__table__), params)
+
+    def _reserve_ids(self, n):
+        """Takes `n` ids from the layout_features id sequence (PostgreSQL), so COPY rows can be referenced."""
+        sql = text("SELECT nextval(pg_get_serial_sequence('layout_features', 'id')) FROM generate_series(1, :n)")
+        return self.db.execute(sql, {"n": n}).scalars().all()
+
+    def _copy(self, table_name, column_names, rows):
+        """Streams rows through psycopg2 COPY ... FROM STDIN (CSV)."""
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+
+        sql = f"COPY {table_name} ({', '.join(column_names)}) FROM STDIN WITH (FORMAT csv)"
+        dbapi_conn = self.db.connection().connection
+        with dbapi_conn.cursor() as cursor:
+            cursor.copy_expert(sql, buffer)
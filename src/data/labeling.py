@@ -0,0 +1,182 @@
+import hashlib
+import argparse
+import logging
+from dataclasses import astuple, dataclass, fields
+import numpy as np
+from sqlalchemy import select, update, bindparam, and_, or_
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class LabelingRules:
+    """Thresholds used by the heuristic labeler (fractions are of the page size)."""
+    footer_y: float = 0.93
+    header_y: float = 0.08
+    wide_width: float = 0.7
+    title_size: float = 16
+    header_size: float = 10
+
+DEFAULT_RULES = LabelingRules()
+
+# Bump whenever the labeling logic changes (threshold changes are tracked by `labeler_version`)
+LABELER_VERSION = 1
+
+def labeler_version(rules=DEFAULT_RULES):
+    """Version recorded with labels: LABELER_VERSION, plus a digest of non-default thresholds."""
+    if rules == DEFAULT_RULES:
+        return str(LABELER_VERSION)
+    digest = hashlib.sha256(repr(astuple(rules)).encode()).hexdigest()[:8]
+    return f"{LABELER_VERSION}+{digest}"
+
+def heuristic_labeling(text, size, is_bold, x0, y0, width, page_width, page_height, rules=DEFAULT_RULES):
+    """
+    Labels text segments based on rules (heuristics) to create training data.
+    """
+    text = text.strip()
+    if not text: return "garbage"
+
+    # Geometry-based rules
+    is_wide = width > (page_width * rules.wide_width)
+
+    # 1. Footer/Header (based on Y position)
+    if y0 > page_height * rules.footer_y: return "footer"
+    if y0 < page_height * rules.header_y: return "header"
+
+    # 2. Titles (Large, usually centered or short & bold)
+    if size > rules.title_size: return "title"
+
+    # 3. Headers (Bold, medium size, not a full paragraph width)
+    if size > rules.header_size and is_bold and not is_wide: return "header"
+
+    # 4. Body (Standard size, usually wide)
+    if size < 12 and is_wide: return "body"
+
+    return "body"
+
+def label_lines(size, is_bold, x0, y0, width, page_width, page_height, has_text=None, rules=DEFAULT_RULES):
+    """
+    Vectorized `heuristic_labeling` over many lines at once (a page or a whole
+    document). Inputs are array-likes (page dims may be scalars); returns an
+    array of labels identical to calling the per-line function on each row.
+    """
+    size = np.asarray(size, dtype=np.float64)
+    is_bold = np.asarray(is_bold, dtype=bool)
+    y0 = np.asarray(y0, dtype=np.float64)
+    width = np.asarray(width, dtype=np.float64)
+    page_width = np.asarray(page_width, dtype=np.float64)
+    page_height = np.asarray(page_height, dtype=np.float64)
+    has_text = np.ones(size.shape, dtype=bool) if has_text is None else np.asarray(has_text, dtype=bool)
+
+    is_wide = width > (page_width * rules.wide_width)
+
+    # Same precedence as the per-line function: first matching rule wins
+    conditions = [
+        ~has_text,
+        y0 > page_height * rules.footer_y,
+        y0 < page_height * rules.header_y,
+        size > rules.title_size,
+        (size > rules.header_size) & is_bold & ~is_wide,
+    ]
+    choices = ["garbage", "footer", "header", "title", "header"]
+    return np.select(conditions, choices, default="body")
+
+def relabel_layout_features(rules=DEFAULT_RULES, chunk_size=100_000, force=False):
+    """
+    Re-labels stored text lines with `rules` without re-parsing any PDF.
+    Only processed PDFs whose recorded labeler version is not that of `rules`
+    are visited (every processed PDF with `force`); the new version is
+    recorded once all their chunks are written, so an interrupted run resumes.
+    Works in id-ordered chunks and only updates rows whose label changed.
+    Rows extracted before page sizes were recorded are skipped, and their
+    PDFs keep their old labeler version (re-extracting them records sizes).
+    """
+    # Imported here so extraction (and the inference CLI) can label lines without a database
+    from src.data.db_session import SessionLocal, init_db
+    from src.data.models_db import LayoutFeatures, LayoutText, PDFMetadata
+    from src.data.migrate import has_inline_text
+
+    init_db()
+    if has_inline_text():
+        raise RuntimeError("Line texts are still in layout_features; run `python -m src.data.migrate` first.")
+    db = SessionLocal()
+    table, text_table, pdf_table = LayoutFeatures.__table__, LayoutText.__table__, PDFMetadata.__table__
+    version = labeler_version(rules)
+    stale = pdf_table.c.processed == True  # noqa: E712
+    if not force:
+        stale = and_(stale, or_(pdf_table.c.labeler_version.is_(None), pdf_table.c.labeler_version != version))
+    pdf_ids = db.scalars(select(pdf_table.c.id).where(stale)).all()
+    if not pdf_ids:
+        logger.info(f"Every processed PDF is labeled with labeler version {version}.")
+        db.close()
+        return 0
+    columns = [
+        table.c.id, table.c.pdf_id, text_table.c.text_content, table.c.font_size, table.c.is_bold,
+        table.c.x0, table.c.y0, table.c.width, table.c.page_width, table.c.page_height, table.c.label,
+    ]
+    stmt = update(table).where(table.c.id == bindparam("row_id")).values(label=bindparam("new_label"))
+
+    last_id, seen, changed, skipped, skipped_pdfs = 0, 0, 0, 0, set()
+    while True:
+        rows = db.execute(
+            select(*columns)
+            .outerjoin(text_table, text_table.c.feature_id == table.c.id)
+            .where(
+                table.c.id > last_id, or_(table.c.is_image == False, table.c.is_image.is_(None)),
+                table.c.pdf_id.in_(select(pdf_table.c.id).where(stale)),
+            )
+            .order_by(table.c.id)
+            .limit(chunk_size)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        known = [r for r in rows if r.page_width is not None and r.page_height is not None]
+        skipped += len(rows) - len(known)
+        skipped_pdfs.update(r.pdf_id for r in rows if r.page_width is None or r.page_height is None)
+        if known:
+            ids, _, texts, sizes, bolds, x0, y0, widths, page_w, page_h, old = zip(*known)
+            labels = label_lines(
+                np.array(sizes, dtype=np.float64), np.array(bolds, dtype=bool), x0, y0, widths, page_w, page_h,
+                has_text=[bool(t and t.strip()) for t in texts], rules=rules,
+            )
+            updates = [
+                {"row_id": row_id, "new_label": new}
+                for row_id, new, prev in zip(ids, labels.tolist(), old) if new != prev
+            ]
+            if updates:
+                db.execute(stmt, updates)
+                db.commit()
+            changed += len(updates)
+        seen += len(rows)
+        logger.info(f"Relabeled {seen} rows so far ({changed} changed).")
+
+    relabeled = [pdf_id for pdf_id in pdf_ids if pdf_id not in skipped_pdfs]
+    if relabeled:
+        db.execute(
+            update(pdf_table).where(pdf_table.c.id == bindparam("pdf")).values(labeler_version=version),
+            [{"pdf": pdf_id} for pdf_id in relabeled],
+        )
+        db.commit()
+    logger.info(f"Recorded labeler version {version} on {len(relabeled)} PDFs.")
+
+    if skipped:
+        logger.warning(
+            f"Skipped {skipped} rows without page size (extracted before it was recorded) in "
+            f"{len(skipped_pdfs)} PDFs; re-extract them to label them with version {version}."
+        )
+    db.close()
+    return changed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-label stored layout_features with new thresholds.")
+    for field in fields(LabelingRules):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=float, default=field.default)
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--force", action="store_true", help="Also visit PDFs already labeled with these rules.")
+    args = parser.parse_args()
+
+    rules = LabelingRules(**{field.name: getattr(args, field.name) for field in fields(LabelingRules)})
+    relabel_layout_features(rules, args.chunk_size, args.force)
@@ -0,0 +1,147 @@
+import time
+import argparse
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+from src.data.db_session import Base, engine
+import src.data.models_db  # noqa: F401 (registers the models with Base)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# layout_features columns narrowed by the schema revision (PostgreSQL; SQLite stores every REAL in 8 bytes)
+NARROW_TYPES = {
+    "font_size": "REAL", "x0": "REAL", "y0": "REAL", "width": "REAL", "height": "REAL",
+    "page_width": "REAL", "page_height": "REAL", "page_number": "SMALLINT",
+}
+
+def _layout_columns(bind):
+    inspector = inspect(bind)
+    if not inspector.has_table("layout_features"):
+        return {}
+    return {c["name"]: c["type"] for c in inspector.get_columns("layout_features")}
+
+def has_inline_text(bind=engine):
+    """True while line texts still live in layout_features (database not migrated)."""
+    return "text_content" in _layout_columns(bind)
+
+def missing_schema(bind=engine):
+    """Tables, columns ("table.column") and indexes of the models that an existing database lacks."""
+    inspector = inspect(bind)
+    tables, columns, indexes = [], [], []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            tables.append(table.name)
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        columns += [f"{table.name}.{c.name}" for c in table.columns if c.name not in existing]
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        indexes += [index.name for index in table.indexes if index.name not in existing_indexes]
+    return tables, columns, indexes
+
+def add_missing_schema(bind=engine):
+    """
+    Creates the missing tables, adds the missing (nullable) columns and builds
+    the missing indexes (CONCURRENTLY on PostgreSQL, so workers keep writing
+    meanwhile). Returns the steps that were applied.
+    """
+    tables, columns, indexes = missing_schema(bind)
+    Base.metadata.create_all(bind=bind, tables=[Base.metadata.tables[name] for name in tables])
+    with bind.begin() as conn:
+        for name in columns:
+            table_name, column_name = name.split(".")
+            column = Base.metadata.tables[table_name].columns[column_name]
+            conn.execute(text(
+                f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column.type.compile(dialect=bind.dialect)}"
+            ))
+            logger.info(f"Added column {name}")
+
+    all_indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for name in indexes:
+            sql = str(CreateIndex(all_indexes[name]).compile(dialect=bind.dialect))
+            if bind.dialect.name == "postgresql":
+                sql = sql.replace("INDEX", "INDEX CONCURRENTLY", 1)
+            start = time.perf_counter()
+            conn.execute(text(sql))
+            logger.info(f"Created index {name} in {time.perf_counter() - start:.1f}s")
+    return ([f"create table {name}" for name in tables] + [f"add column {name}" for name in columns]
+            + [f"create index {name}" for name in indexes])
+
+def layout_changes(bind=engine):
+    """layout_features revision steps (text move, narrower types) an existing database still needs."""
+    columns = _layout_columns(bind)
+    changes = []
+    if "text_content" in columns:
+        changes.append("move layout_features.text_content to layout_text")
+    if bind.dialect.name == "postgresql":
+        wide = [name for name, target in NARROW_TYPES.items()
+                if name in columns and columns[name].compile(dialect=bind.dialect) != target]
+        if wide:
+            changes.append(f"narrow {', '.join(wide)}")
+    return changes
+
+def pending_changes(bind=engine):
+    """Every upgrade step an existing database still needs (empty when up to date)."""
+    tables, columns, indexes = missing_schema(bind)
+    return ([f"create table {name}" for name in tables] + [f"add column {name}" for name in columns]
+            + [f"create index {name}" for name in indexes] + layout_changes(bind))
+
+def migrate_layout_schema(bind=engine):
+    """
+    The only place that alters an existing database (workers' `init_db` never
+    does). First creates missing tables, columns and indexes (`add_missing_schema`),
+    then upgrades layout_features in place, in one transaction (DDL is transactional
+    on both SQLite and PostgreSQL, so a failure leaves the old schema intact):
+    1. copies non-NULL text_content into layout_text, keyed by feature id,
+    2. drops text_content,
+    3. on PostgreSQL narrows floats to REAL and page_number to SMALLINT; the
+       drop and type changes share one ALTER TABLE, so the table is rewritten once.
+    Returns the steps that were applied.
+    """
+    if not set(inspect(bind).get_table_names()) & set(Base.metadata.tables):
+        Base.metadata.create_all(bind=bind)  # Empty database: nothing to upgrade
+        return []
+    added = add_missing_schema(bind)
+    changes = layout_changes(bind)
+    if not changes:
+        logger.info("layout_features is up to date.")
+        return added
+
+    columns = _layout_columns(bind)
+    start = time.perf_counter()
+    with bind.begin() as conn:
+        if "text_content" in columns:
+            moved = conn.execute(text(
+                "INSERT INTO layout_text (feature_id, text_content)"
+                " SELECT id, text_content FROM layout_features WHERE text_content IS NOT NULL"
+            )).rowcount
+            logger.info(f"Copied {moved} texts to layout_text.")
+
+        if bind.dialect.name == "postgresql":
+            clauses = [f"ALTER COLUMN {name} TYPE {target}" for name, target in NARROW_TYPES.items() if name in columns]
+            if "text_content" in columns:
+                clauses.insert(0, "DROP COLUMN text_content")
+            conn.execute(text(f"ALTER TABLE layout_features {', '.join(clauses)}"))
+        elif "text_content" in columns:
+            conn.execute(text("ALTER TABLE layout_features DROP COLUMN text_content"))  # SQLite >= 3.35
+
+    # Reclaim the space and refresh planner statistics (both outside a transaction)
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if bind.dialect.name == "sqlite":
+            conn.execute(text("VACUUM"))
+        conn.execute(text("ANALYZE"))
+
+    logger.info(f"Applied {changes} in {time.perf_counter() - start:.1f}s.")
+    return added + changes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade layout_features to the current schema.")
+    parser.add_argument("--check", action="store_true", help="Only list the pending changes.")
+    args = parser.parse_args()
+
+    if args.check:
+        print(pending_changes() or "Up to date.")
+    else:
+        migrate_layout_schema()
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, REAL, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.ext.associationproxy import association_proxy
 from sqlalchemy.orm import relationship
 from src.data.db_session import Base  # Importing Base from the central session file
 
@@ -13,6 +14,21 @@ class PDFMetadata(Base):
     title = Column(String)
     file_path = Column(String)
     processed = Column(Boolean, default=False)
+
+    # Work queue (see src/data/work_queue.py): pending -> in_progress (leased) -> done | failed
+    status = Column(String, default="pending", index=True)
+    lease_owner = Column(String)
+    lease_expires_at = Column(DateTime)
+    claim_token = Column(String)  # Set by the claim that leased the row, to read back exactly its rows
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime)
+    last_error = Column(String)
+
+    # Provenance of the stored rows (see src/data/reextract.py): the PDF bytes they were
+    # parsed from and the extractor/labeler versions that produced them (NULL: unknown)
+    content_sha256 = Column(String(64))
+    extractor_version = Column(Integer)
+    labeler_version = Column(String)
     
     # Relationship to features
     features = relationship("LayoutFeatures", back_populates="pdf", cascade="all, delete-orphan")
@@ -22,29 +38,51 @@ class LayoutFeatures(Base):
     Stores extracted layout features.
     CHANGED: Optimized to store Line-level data instead of Span-level data
     to reduce noise and text overlapping in reconstruction.
+    Geometry is stored as 4-byte REAL (values are rounded to 2 decimals) and
+    the line text lives in `layout_text`, so the scans training does stay narrow.
     """
     __tablename__ = "layout_features"
+    __table_args__ = (
+        # Training / snapshot stream order and per-document lookups
+        Index("ix_layout_features_doc_order", "pdf_id", "page_number", "y0", "id"),
+        Index("ix_layout_features_label", "label", "pdf_id"),
+    )
     
     id = Column(Integer, primary_key=True)
     pdf_id = Column(Integer, ForeignKey("pdf_metadata.id"))
     
-    text_content = Column(String)
-    font_size = Column(Float)
+    font_size = Column(REAL)
     
     # Style flags
     is_bold = Column(Boolean)
     is_italic = Column(Boolean, default=False)
     
     # Coordinates (Bbox)
-    x0 = Column(Float)
-    y0 = Column(Float)
-    width = Column(Float)  # Added: Crucial for LaTeX textblock width
-    height = Column(Float) # Added: Useful for density calculations
+    x0 = Column(REAL)
+    y0 = Column(REAL)
+    width = Column(REAL)  # Added: Crucial for LaTeX textblock width
+    height = Column(REAL) # Added: Useful for density calculations
     
-    page_number = Column(Integer)
+    page_number = Column(SmallInteger)
+    page_width = Column(REAL)  # Added: lets heuristics be re-run without re-parsing
+    page_height = Column(REAL)
     is_image = Column(Boolean, default=False)
     
     # The target label for training (title, header, body, footer, image)
     label = Column(String)
     
-    pdf = relationship("PDFMetadata", back_populates="features")
\ No newline at end of file
+    pdf = relationship("PDFMetadata", back_populates="features")
+
+    # Loaded on demand only (LayoutFeatures(text_content=...) still works)
+    text = relationship("LayoutText", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    text_content = association_proxy("text", "text_content", creator=lambda t: LayoutText(text_content=t))
+
+class LayoutText(Base):
+    """
+    Text of a layout line (NULL/absent for images). Split from layout_features
+    because training and relabeling read millions of rows but never the text.
+    """
+    __tablename__ = "layout_text"
+
+    feature_id = Column(Integer, ForeignKey("layout_features.id", ondelete="CASCADE"), primary_key=True)
+    text_content = Column(String)
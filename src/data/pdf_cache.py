@@ -0,0 +1,183 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+import requests
+from src import telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join("data", "cache"))
+DEFAULT_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(5 * 1024**3)))  # 5 GiB
+DEFAULT_OA_TTL = int(os.getenv("OA_CACHE_TTL", str(7 * 24 * 3600)))         # 7 days
+CHUNK_SIZE = 1024 * 1024
+# PDF readers accept the header anywhere in the first 1024 bytes
+PDF_MAGIC, PDF_HEADER_WINDOW = b"%PDF-", 1024
+
+def file_sha256(path):
+    """SHA-256 of a PDF file; free for cache objects, which are named by it."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+        return name
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def is_pdf(path):
+    """Whether the file at `path` starts like a PDF (not, say, an HTML error page)."""
+    with open(path, "rb") as f:
+        return PDF_MAGIC in f.read(PDF_HEADER_WINDOW)
+
+class PDFCache:
+    """
+    Local, content-addressed store for downloaded PDFs.
+
+    * OA API results are kept per PMCID for `oa_ttl` seconds.
+    * PDF bytes live in `objects/<sha[:2]>/<sha256>.pdf`, indexed by PMCID.
+    * Downloads stream to `partial/<pmcid>.part` and resume with HTTP Range.
+    * The store is capped at `max_bytes`, evicting least recently used PDFs.
+
+    The index is a small SQLite file shared by all threads of the process.
+    """
+
+    def __init__(self, root=None, max_bytes=None, oa_ttl=None):
+        self.root = root or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else DEFAULT_MAX_BYTES
+        self.oa_ttl = oa_ttl if oa_ttl is not None else DEFAULT_OA_TTL
+        os.makedirs(os.path.join(self.root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(self.root, "partial"), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(self.root, "index.sqlite"), timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS oa_links (pmcid TEXT PRIMARY KEY, url TEXT, fetched_at REAL);
+                CREATE TABLE IF NOT EXISTS objects (sha256 TEXT PRIMARY KEY, size INTEGER, last_access REAL);
+                CREATE TABLE IF NOT EXISTS pmcid_index (pmcid TEXT PRIMARY KEY, sha256 TEXT);
+            """)
+
+    def _object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], f"{sha256}.pdf")
+
+    # --- OA resolution -----------------------------------------------------
+
+    def get_url(self, pmcid):
+        """Returns the cached OA PDF link for `pmcid`, or None if missing/expired."""
+        with self._lock:
+            row = self._conn.execute("SELECT url, fetched_at FROM oa_links WHERE pmcid = ?", (pmcid,)).fetchone()
+        if row and time.time() - row[1] < self.oa_ttl:
+            return row[0]
+        return None
+
+    def put_url(self, pmcid, url):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO oa_links (pmcid, url, fetched_at) VALUES (?, ?, ?)",
+                (pmcid, url, time.time()),
+            )
+
+    # --- PDF objects -------------------------------------------------------
+
+    def lookup(self, pmcid):
+        """Returns the local path of the cached PDF for `pmcid` (and marks it used)."""
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT sha256 FROM pmcid_index WHERE pmcid = ?", (pmcid,)).fetchone()
+            if not row:
+                return None
+            path = self._object_path(row[0])
+            if not os.path.exists(path):
+                self._conn.execute("DELETE FROM pmcid_index WHERE pmcid = ?", (pmcid,))
+                return None
+            self._conn.execute("UPDATE objects SET last_access = ? WHERE sha256 = ?", (time.time(), row[0]))
+        return path
+
+    def cached_sha256(self, pmcid):
+        """SHA-256 of the cached PDF of `pmcid` (None if not cached); does not count as a use."""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM pmcid_index WHERE pmcid = ?", (pmcid,)).fetchone()
+        return row[0] if row and os.path.exists(self._object_path(row[0])) else None
+
+    def forget(self, pmcid):
+        """Drops the PMCID -> PDF mapping, so the next fetch downloads it again (the object may stay)."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM pmcid_index WHERE pmcid = ?", (pmcid,))
+
+    def download(self, pmcid, url, session=None):
+        """
+        Streams `url` to disk in chunks (resuming a previous partial download
+        with a Range request), stores it by SHA-256 and returns the local path.
+        Only complete PDFs are stored: a body shorter than its Content-Length
+        raises and is resumed next time, one that is not a PDF raises and is dropped.
+        """
+        http = session or requests
+        part_path = os.path.join(self.root, "partial", f"{pmcid}.part")
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset else {}
+
+        with http.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code == 416:
+                # Partial file is stale or already complete: start over
+                os.remove(part_path)
+                return self.download(pmcid, url, session)
+            response.raise_for_status()
+
+            mode = "ab" if response.status_code == 206 else "wb"
+            received = 0
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+                    received += len(chunk)
+            # requests decodes gzip/deflate bodies, whose Content-Length is the encoded size
+            expected = None if response.headers.get("Content-Encoding") else response.headers.get("Content-Length")
+        telemetry.inc("bytes_downloaded_total", received)
+
+        if expected is not None and received != int(expected):
+            raise IOError(f"Download of PMC{pmcid} truncated: {received} of {expected} bytes")
+        if not is_pdf(part_path):
+            os.remove(part_path)
+            raise ValueError(f"Download of PMC{pmcid} is not a PDF")
+
+        sha256 = file_sha256(part_path)
+        path = self._object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(part_path, path)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO objects (sha256, size, last_access) VALUES (?, ?, ?)",
+                (sha256, os.path.getsize(path), time.time()),
+            )
+            self._conn.execute("INSERT OR REPLACE INTO pmcid_index (pmcid, sha256) VALUES (?, ?)", (pmcid, sha256))
+        self.evict(keep=sha256)
+        return path
+
+    def evict(self, keep=None):
+        """Deletes least recently used PDFs until the store fits in `max_bytes`."""
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            for sha256, size in self._conn.execute(
+                "SELECT sha256, size FROM objects ORDER BY last_access"
+            ).fetchall():
+                if total <= self.max_bytes:
+                    break
+                if sha256 == keep:
+                    continue
+                try:
+                    os.remove(self._object_path(sha256))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+                self._conn.execute("DELETE FROM pmcid_index WHERE sha256 = ?", (sha256,))
+                total -= size
+                logger.info(f"Evicted cached PDF {sha256[:12]} ({size} bytes)")
+
+    def close(self):
+        self._conn.close()
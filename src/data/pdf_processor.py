@@ -1,26 +1,46 @@
-import fitz
+import os
+import argparse
+import threading
 import requests
 import logging
 from collections import Counter
+from sqlalchemy.exc import SQLAlchemyError
+from src import telemetry
 from src.data.db_session import SessionLocal, init_db
-from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.data.work_queue import (
+    CLAIM_BATCH_SIZE, claim_with_retry, default_worker_id, heartbeat, mark_failed, queue_counts, reset_failed,
+)
+from src.data.feature_writer import LayoutFeatureWriter
+from src.data.pdf_cache import PDFCache, file_sha256
+from src.data.labeling import heuristic_labeling  # noqa: F401 (re-exported)
+from src.data.extraction import STREAM_PAGES, page_count, stream_extraction
+from src.data.extraction import extract_lines, extract_pdf, sanitize_text  # noqa: F401 (re-exported)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-def sanitize_text(text):
-    """Removes NUL bytes which crash the database driver."""
-    if not text:
-        return ""
-    return text.replace('\x00', '')
+PMC_OA_API_URL = os.getenv("PMC_OA_API_URL", "https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi")
 
-def get_direct_pdf_url(pmcid):
+def get_http_session(pool_size=10):
+    """
+    Creates a requests.Session with a connection pool large enough to be
+    shared by `pool_size` concurrent download threads.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_direct_pdf_url(pmcid, session=None):
     """Retrieves the direct PDF download link from PMC OA API."""
-    api_url = f"https://www.ncbi.nlm.nih.gov/pmc/utils/oa/oa.fcgi?id=PMC{pmcid}"
+    http = session or requests
+    api_url = f"{PMC_OA_API_URL}?id=PMC{pmcid}"
     try:
         import xml.etree.ElementTree as ET
-        r = requests.get(api_url, timeout=15)
+        with telemetry.stage("oa_lookup"):
+            r = http.get(api_url, timeout=15)
         root = ET.fromstring(r.text)
         for link in root.findall(".//link"):
             if link.get("format") == "pdf":
@@ -29,133 +49,159 @@ def get_direct_pdf_url(pmcid):
         logger.warning(f"Failed to get URL for PMC{pmcid}: {e}")
     return None
 
-def heuristic_labeling(text, size, is_bold, x0, y0, width, page_width, page_height):
+def fetch_pdf(pmcid, cache, session=None, refresh=False):
     """
-    Labels text segments based on rules (heuristics) to create training data.
+    Returns a local path to the PDF of `pmcid`. The OA API and the download
+    are only hit on a cache miss, so a warm cache works fully offline.
+    `refresh` downloads it again; the cached copy stays mapped to `pmcid`
+    until the new one is complete and hashed, so a failed download keeps it.
     """
-    text = text.strip()
-    if not text: return "garbage"
-    
-    # Geometry-based rules
-    is_wide = width > (page_width * 0.7)
-    
-    # 1. Footer/Header (based on Y position)
-    if y0 > page_height * 0.93: return "footer"
-    if y0 < page_height * 0.08: return "header"
-    
-    # 2. Titles (Large, usually centered or short & bold)
-    if size > 16: return "title"
-    
-    # 3. Headers (Bold, medium size, not a full paragraph width)
-    if size > 10 and is_bold and not is_wide: return "header"
-    
-    # 4. Body (Standard size, usually wide)
-    if size < 12 and is_wide: return "body"
-    
-    return "body"
+    path = None if refresh else cache.lookup(pmcid)
+    if path:
+        telemetry.inc("pdf_cache_total", result="hit")
+        return path
+    telemetry.inc("pdf_cache_total", result="refresh" if refresh else "miss")
+
+    url = cache.get_url(pmcid)
+    if url is None:
+        url = get_direct_pdf_url(pmcid, session=session)
+        if not url:
+            return None
+        cache.put_url(pmcid, url)
 
-def process_and_label():
+    logger.info(f"Downloading PMC{pmcid}...")
+    with telemetry.stage("download"):
+        path = cache.download(pmcid, url, session=session)
+    telemetry.observe("pdf_bytes", os.path.getsize(path), telemetry.SIZE_BUCKETS)
+    return path
+
+def discard_unreadable(cache, pmcid, path, error):
+    """
+    Forgets the cached copy of a PDF that failed to open or extract, so its
+    retry downloads it again instead of failing on the same bytes.
+    Database errors say nothing about the file and keep it.
+    """
+    if path and not isinstance(error, SQLAlchemyError):
+        cache.forget(pmcid)
+        logger.info(f"Dropped the cached PDF of PMC{pmcid}; its retry downloads it again.")
+
+def stream_document(writer, pdf_id, chunks, content_sha256=None):
+    """
+    Writes one large PDF chunk by chunk in a single transaction
+    (`LayoutFeatureWriter.write_document`), keeping only its label counts.
+    Returns them, or None if nothing was written because the PDF's lease
+    moved to another worker. Raises (after the rollback) if extraction or
+    the write fails.
+    """
+    labels = Counter()
+
+    def counted():
+        for chunk in chunks:
+            labels.update(chunk.labels())
+            yield chunk
+
+    if not writer.write_document(pdf_id, counted(), content_sha256):
+        return None
+    return labels
+
+def extract_layout_rows(doc):
+    """
+    Extracts layout features at the LINE level from an open fitz document.
+    Yields one dict per image block / text line, keyed by LayoutFeatures columns
+    (without pdf_id, which is assigned by the caller).
+    """
+    yield from extract_lines(doc).rows()
+
+def process_and_label(flush_size=None, worker_id=None, batch_size=None, limit=None, stream_pages=STREAM_PAGES):
     """
     Downloads PDFs, extracts layout features at the LINE level, and saves to DB.
+    PDFs are leased from the work queue one batch at a time, so any number of
+    workers (processes or machines) can share the same database. PDFs with
+    more than `stream_pages` pages are extracted and written a page range at a time.
     """
     init_db() # Ensure tables exist
     db = SessionLocal()
-    
-    pdfs = db.query(PDFMetadata).filter(PDFMetadata.processed == False).all()
+    worker_id = worker_id or default_worker_id()
+    writer = LayoutFeatureWriter(db, flush_size=flush_size, worker_id=worker_id)
+    cache = PDFCache()
     layout_monitor = Counter()
-    
-    total_files = len(pdfs)
-    logger.info(f"Starting processing: {total_files} files queued.")
-
-    for index, pdf in enumerate(pdfs, 1):
-        url = get_direct_pdf_url(pdf.pmid)
-        current_pmid = pdf.pmid # Store locally to use in exception block safely
-        
-        if not url: 
-            logger.warning(f"[{index}/{total_files}] No URL for PMC{current_pmid}")
-            continue
-            
-        try:
-            logger.info(f"Downloading PMC{current_pmid}...")
-            response = requests.get(url, timeout=30)
-            doc = fitz.open(stream=response.content, filetype="pdf")
-            
-            new_features = []
-            
-            for page_num, page in enumerate(doc):
-                _, _, page_w, page_h = page.rect
-                blocks = page.get_text("dict")["blocks"]
-                
-                for b in blocks:
-                    # IMAGE BLOCK
-                    if b["type"] == 1:
-                        new_features.append(LayoutFeatures(
-                            pdf_id=pdf.id, is_image=True,
-                            x0=round(b["bbox"][0], 2), y0=round(b["bbox"][1], 2),
-                            width=round(b["bbox"][2]-b["bbox"][0], 2),
-                            height=round(b["bbox"][3]-b["bbox"][1], 2),
-                            page_number=page_num, label="image"
-                        ))
-                        layout_monitor.update(["image"])
+
+    logger.info(f"Worker {worker_id} starting. Queue: {queue_counts(db)}")
+    # Keeps leased and buffered, not yet flushed PDFs leased, on its own session
+    stop_heartbeat = threading.Event()
+    lease_keeper = threading.Thread(target=heartbeat, args=(SessionLocal, worker_id, stop_heartbeat), daemon=True)
+    lease_keeper.start()
+    index = 0
+    while limit is None or index < limit:
+        size = batch_size or CLAIM_BATCH_SIZE
+        batch = claim_with_retry(db, worker_id, size if limit is None else min(size, limit - index))
+        if not batch:
+            break
+
+        for pdf_id, current_pmid in batch:
+            index += 1
+            path = None
+            try:
+                path = fetch_pdf(current_pmid, cache)
+                if not path:
+                    raise LookupError("no PDF link in the OA API")
+                if page_count(path) > stream_pages:
+                    labels = stream_document(writer, pdf_id, stream_extraction(path), file_sha256(path))
+                    if labels is None:
+                        logger.warning(f"[{index}] Dropped PMC{current_pmid} (streamed): its lease moved to another worker")
                         continue
+                    layout_monitor.update(labels)
+                    logger.info(f"[{index}] Processed PMC{current_pmid} (streamed)")
+                    continue
+                with telemetry.stage("extract"):
+                    rows = extract_pdf(path)
+            except Exception as e:
+                telemetry.inc("pdfs_total", result="failed")
+                state = mark_failed(db, pdf_id, worker_id, e)
+                logger.error(f"[{index}] Error processing PMC{current_pmid} ({state}): {e}")
+                discard_unreadable(cache, current_pmid, path, e)
+                continue
 
-                    # TEXT BLOCK
-                    if "lines" in b:
-                        for l in b["lines"]:
-                            # --- AGGREGATE SPANS INTO A SINGLE LINE ---
-                            line_text_parts = []
-                            sizes = []
-                            bolds = []
-                            
-                            for s in l["spans"]:
-                                line_text_parts.append(s["text"])
-                                sizes.append(s["size"])
-                                bolds.append("bold" in s["font"].lower())
-                            
-                            full_text = " ".join(line_text_parts).strip()
-                            full_text = sanitize_text(full_text) # <--- FIX APPLIED HERE
-                            
-                            if not full_text: continue
-
-                            # Calculate Line Attributes
-                            avg_size = sum(sizes) / len(sizes)
-                            is_bold = sum(bolds) > (len(bolds) / 2)
-                            x0, y0, x1, y1 = l["bbox"]
-                            width = x1 - x0
-                            height = y1 - y0
-                            
-                            # Heuristic Labeling
-                            label = heuristic_labeling(full_text, avg_size, is_bold, x0, y0, width, page_w, page_h)
-
-                            new_features.append(LayoutFeatures(
-                                pdf_id=pdf.id,
-                                text_content=full_text[:1000], # Truncate if huge
-                                font_size=round(avg_size, 2),
-                                is_bold=is_bold,
-                                x0=round(x0, 2), y0=round(y0, 2),
-                                width=round(width, 2),
-                                height=round(height, 2),
-                                page_number=page_num, label=label
-                            ))
-                            layout_monitor.update([label])
-            
-            if new_features:
-                db.bulk_save_objects(new_features)
-
-            pdf.processed = True
-            db.commit()
-            logger.info(f"[{index}/{total_files}] Processed PMC{current_pmid}")
-            
-        except Exception as e:
-            # Rollback first to clean the session state
-            db.rollback()
-            logger.error(f"Error processing PMC{current_pmid}: {e}")
+            # Rows and the `processed` flag are committed together by the writer
+            layout_monitor.update(rows.labels())
+            if writer.add_document(pdf_id, rows, file_sha256(path)):
+                logger.info(f"[{index}] Extracted PMC{current_pmid} ({len(rows)} lines)")
+            else:
+                logger.warning(f"[{index}] Extracted PMC{current_pmid}, but a flush failed; failed PDFs: {writer.failed_pdfs}")
+
+    writer.flush()
+    stop_heartbeat.set()
+    lease_keeper.join()
+    logger.info(f"Wrote {writer.rows_written} rows in {writer.flushes} flushes ({writer.flush_seconds:.2f}s); "
+                f"{len(writer.failed_pdfs)} PDFs could not be written.")
+    report = telemetry.write_run("extract")
+    if report:
+        logger.info(f"Telemetry written to {report}")
 
     logger.info("\n--- Class Distribution ---")
     for cls, count in layout_monitor.most_common():
         logger.info(f"{cls}: {count}")
     
+    cache.close()
     db.close()
 
 if __name__ == "__main__":
-    process_and_label()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Sequential extraction worker over the leased work queue.")
+    parser.add_argument("--worker-id", default=None, help="Lease owner name (WORKER_ID, default host:pid).")
+    parser.add_argument("--batch-size", type=int, default=None, help="PDFs leased per claim (CLAIM_BATCH_SIZE).")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--flush-size", type=int, default=None, help="Rows per DB flush (FEATURE_FLUSH_SIZE).")
+    parser.add_argument("--stream-pages", type=int, default=STREAM_PAGES, help="Stream PDFs with more pages (EXTRACT_STREAM_PAGES).")
+    parser.add_argument("--retry-failed", action="store_true", help="Re-queue failed PDFs before starting.")
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    parser.add_argument("--profile", nargs="+", default=None, help="Stages to run under cProfile ('all' for every stage).")
+    args = parser.parse_args()
+
+    if args.telemetry or args.profile:
+        telemetry.enable(args.profile)
+
+    if args.retry_failed:
+        init_db()
+        with SessionLocal() as db:
+            logger.info(f"Re-queued {reset_failed(db)} failed PDFs.")
+    process_and_label(args.flush_size, args.worker_id, args.batch_size, args.limit, args.stream_pages)
\ No newline at end of file
@@ -0,0 +1,220 @@
+import os
+import queue
+import argparse
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from src import telemetry
+from src.data.db_session import SessionLocal, init_db
+from src.data.feature_writer import LayoutFeatureWriter
+from src.data.pdf_cache import PDFCache, file_sha256
+from src.data.pdf_processor import discard_unreadable, get_http_session, fetch_pdf, stream_document
+from src.data.extraction import PAGES_PER_TASK, STREAM_PAGES, ExtractedLines, page_count, stream_extraction, submit_extraction
+from src.data.work_queue import CLAIM_BATCH_SIZE, claim_with_retry, default_worker_id, heartbeat, mark_failed, queue_counts
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+# End-of-stream marker passed between stages
+_DONE = object()
+
+def _claim_stage(worker_id, todo, download_workers, batch_size, limit):
+    """
+    Stage 0 (thread): leases batches of pending PDFs to this worker and feeds
+    them to the downloaders. Blocks on `todo.put` when they fall behind, so
+    only about `queue_size` PDFs are leased ahead of the work actually done
+    (the `heartbeat` thread keeps their leases alive meanwhile). Failed claims
+    are retried with backoff; claiming stops once retries run out.
+    """
+    db = SessionLocal()  # Sessions are not shared between threads
+    claimed = 0
+    try:
+        while limit is None or claimed < limit:
+            batch = claim_with_retry(db, worker_id, batch_size if limit is None else min(batch_size, limit - claimed))
+            if not batch:
+                break
+            claimed += len(batch)
+            for item in batch:
+                todo.put(item)
+    except Exception as e:
+        logger.error(f"Error claiming work: {e}")
+    finally:
+        for _ in range(download_workers):
+            todo.put(_DONE)
+        db.close()
+
+def _download_stage(session, cache, todo, downloaded):
+    """
+    Stage 1 (threads): resolves the OA link and downloads the PDF into the cache.
+    Blocks on `downloaded.put` when extraction falls behind (backpressure).
+    """
+    while True:
+        item = todo.get()
+        if item is _DONE:
+            downloaded.put(_DONE)
+            return
+
+        pdf_id, pmid = item
+        try:
+            path = fetch_pdf(pmid, cache, session=session)
+            if not path:
+                raise LookupError("no PDF link in the OA API")
+        except Exception as e:
+            downloaded.put((pdf_id, pmid, None, e))
+            continue
+        downloaded.put((pdf_id, pmid, path, None))
+
+def _extract_stage(pool, downloaded, extracted, download_workers, pages_per_task, stream_pages):
+    """
+    Stage 2 (process pool): submits each downloaded PDF to PyMuPDF extraction,
+    one task per `pages_per_task` pages so large PDFs use several workers.
+    PDFs with more than `stream_pages` pages are passed on unsubmitted (no
+    futures): the writer streams them range by range.
+    Blocks on `extracted.put` when the writer falls behind (backpressure).
+    """
+    finished = 0
+    while finished < download_workers:
+        item = downloaded.get()
+        if item is _DONE:
+            finished += 1
+            continue
+
+        pdf_id, pmid, path, error = item
+        futures = None
+        if error is None:
+            try:
+                if page_count(path) <= stream_pages:
+                    futures = submit_extraction(pool, path, pages_per_task)
+            except Exception as e:
+                error = e
+        extracted.put((pdf_id, pmid, path, futures, error))
+    extracted.put(_DONE)
+
+def run_pipeline(download_workers=8, extract_workers=None, queue_size=16, limit=None, flush_size=None,
+                 pages_per_task=PAGES_PER_TASK, worker_id=None, batch_size=None, stream_pages=STREAM_PAGES):
+    """
+    Staged version of `process_and_label`: leased work-queue batches,
+    concurrent downloads, parallel PyMuPDF extraction and a single DB writer,
+    connected by bounded queues. Several pipelines (on any machines) can run
+    against one database. A PDF is marked processed only in the transaction
+    that stores its rows; PDFs with more than `stream_pages` pages are
+    written a page range at a time within that transaction.
+    """
+    init_db() # Ensure tables exist
+    db = SessionLocal()
+    worker_id = worker_id or default_worker_id()
+    writer = LayoutFeatureWriter(db, flush_size=flush_size, worker_id=worker_id)
+    extract_workers = extract_workers or os.cpu_count()
+
+    logger.info(
+        f"Starting pipeline {worker_id} (download={download_workers}, extract={extract_workers}, "
+        f"queue={queue_size}). Queue: {queue_counts(db)}"
+    )
+
+    todo = queue.Queue(maxsize=queue_size)
+    downloaded = queue.Queue(maxsize=queue_size)
+    extracted = queue.Queue(maxsize=queue_size)
+    session = get_http_session(pool_size=download_workers)
+    cache = PDFCache()
+    layout_monitor = Counter()
+    stop_heartbeat = threading.Event()
+    lease_keeper = threading.Thread(target=heartbeat, args=(SessionLocal, worker_id, stop_heartbeat), daemon=True)
+    lease_keeper.start()
+
+    with ProcessPoolExecutor(max_workers=extract_workers) as pool:
+        threads = [threading.Thread(
+            target=_claim_stage, args=(worker_id, todo, download_workers, batch_size or CLAIM_BATCH_SIZE, limit),
+            daemon=True,
+        )]
+        threads += [
+            threading.Thread(target=_download_stage, args=(session, cache, todo, downloaded), daemon=True)
+            for _ in range(download_workers)
+        ]
+        threads.append(threading.Thread(
+            target=_extract_stage, args=(pool, downloaded, extracted, download_workers, pages_per_task, stream_pages),
+            daemon=True,
+        ))
+        for t in threads:
+            t.start()
+
+        # Stage 3 (this thread): the single DB writer
+        index = 0
+        while True:
+            item = extracted.get()
+            if item is _DONE:
+                break
+
+            pdf_id, pmid, path, futures, error = item
+            index += 1
+            try:
+                if error is not None:
+                    raise error
+                content_sha256 = file_sha256(path)
+                if futures is None:
+                    chunks = stream_extraction(path, pool, pages_per_task, window=extract_workers)
+                    labels = stream_document(writer, pdf_id, chunks, content_sha256)
+                    if labels is None:
+                        logger.warning(f"[{index}] Dropped PMC{pmid} (streamed): its lease moved to another worker")
+                        continue
+                    layout_monitor.update(labels)
+                    logger.info(f"[{index}] Processed PMC{pmid} (streamed)")
+                    continue
+                rows = ExtractedLines.concat(f.result() for f in futures)
+            except Exception as e:
+                telemetry.inc("pdfs_total", result="failed")
+                state = mark_failed(db, pdf_id, worker_id, e)
+                logger.error(f"[{index}] Error processing PMC{pmid} ({state}): {e}")
+                discard_unreadable(cache, pmid, path, e)
+                continue
+
+            layout_monitor.update(rows.labels())
+            if writer.add_document(pdf_id, rows, content_sha256):
+                logger.info(f"[{index}] Extracted PMC{pmid} ({len(rows)} lines)")
+            else:
+                logger.warning(f"[{index}] Extracted PMC{pmid}, but a flush failed; failed PDFs: {writer.failed_pdfs}")
+
+        writer.flush()
+
+        for t in threads:
+            t.join()
+    stop_heartbeat.set()
+    lease_keeper.join()
+
+    session.close()
+    cache.close()
+    logger.info(f"Wrote {writer.rows_written} rows in {writer.flushes} flushes ({writer.flush_seconds:.2f}s); "
+                f"{len(writer.failed_pdfs)} PDFs could not be written.")
+    report = telemetry.write_run("pipeline")
+    if report:
+        logger.info(f"Telemetry written to {report}")
+
+    logger.info("\n--- Class Distribution ---")
+    for cls, count in layout_monitor.most_common():
+        logger.info(f"{cls}: {count}")
+
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent download/extract/write pipeline.")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--extract-workers", type=int, default=None, help="Defaults to the CPU count.")
+    parser.add_argument("--queue-size", type=int, default=16, help="Bound of each inter-stage queue.")
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--flush-size", type=int, default=None, help="Rows per DB flush (FEATURE_FLUSH_SIZE).")
+    parser.add_argument("--pages-per-task", type=int, default=PAGES_PER_TASK, help="Pages per extraction task.")
+    parser.add_argument("--stream-pages", type=int, default=STREAM_PAGES, help="Stream PDFs with more pages (EXTRACT_STREAM_PAGES).")
+    parser.add_argument("--worker-id", default=None, help="Lease owner name (WORKER_ID, default host:pid).")
+    parser.add_argument("--batch-size", type=int, default=None, help="PDFs leased per claim (CLAIM_BATCH_SIZE).")
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    parser.add_argument("--profile", nargs="+", default=None, help="Stages to run under cProfile ('all' for every stage).")
+    args = parser.parse_args()
+
+    if args.telemetry or args.profile:
+        telemetry.enable(args.profile)  # Before the process pool starts, so extraction workers inherit it
+
+    run_pipeline(
+        args.download_workers, args.extract_workers, args.queue_size, args.limit, args.flush_size,
+        args.pages_per_task, args.worker_id, args.batch_size, args.stream_pages,
+    )
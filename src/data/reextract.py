@@ -0,0 +1,154 @@
+import argparse
+import logging
+from dataclasses import fields
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import and_, bindparam, or_, select, update
+from src import telemetry
+from src.data.db_session import SessionLocal, init_db
+from src.data.extraction import EXTRACTOR_VERSION
+from src.data.labeling import DEFAULT_RULES, LabelingRules, labeler_version, relabel_layout_features
+from src.data.models_db import PDFMetadata
+from src.data.pdf_cache import PDFCache, file_sha256
+from src.data.pdf_processor import fetch_pdf, get_http_session
+from src.data.work_queue import PENDING
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+def outdated_extraction(db):
+    """Ids of processed PDFs parsed by another (or an unrecorded) extractor version."""
+    t = PDFMetadata.__table__
+    return db.scalars(
+        select(t.c.id)
+        .where(t.c.processed == True,  # noqa: E712
+               or_(t.c.extractor_version.is_(None), t.c.extractor_version != EXTRACTOR_VERSION))
+        .order_by(t.c.id)
+    ).all()
+
+def changed_content(db, cache, refresh=False, session=None, download_workers=8, exclude=()):
+    """
+    Ids of processed PDFs whose bytes differ from their recorded content hash.
+    Cached copies are compared for free (the cache is content-addressed);
+    with `refresh`, every PDF is downloaded again first, `download_workers`
+    at a time, replacing its cached copy only once the download completes.
+    PDFs that are not cached or fail to download count as unchanged.
+    """
+    t = PDFMetadata.__table__
+    exclude = set(exclude)
+    rows = [
+        row for row in db.execute(
+            select(t.c.id, t.c.pmid, t.c.content_sha256)
+            .where(t.c.processed == True, t.c.content_sha256.isnot(None))  # noqa: E712
+            .order_by(t.c.id)
+        ).all()
+        if row.id not in exclude
+    ]
+
+    def current(row):
+        if not refresh:
+            return cache.cached_sha256(row.pmid)
+        try:
+            path = fetch_pdf(row.pmid, cache, session=session, refresh=True)
+        except Exception as e:
+            logger.warning(f"Could not download PMC{row.pmid} again, keeping its rows: {e}")
+            return None
+        return file_sha256(path) if path else None
+
+    if refresh:
+        with ThreadPoolExecutor(max_workers=download_workers) as pool:
+            hashes = list(pool.map(current, rows))
+    else:
+        hashes = [current(row) for row in rows]
+    return [row.id for row, sha in zip(rows, hashes) if sha is not None and sha != row.content_sha256]
+
+def outdated_labels(db, rules=DEFAULT_RULES):
+    """Ids of processed PDFs labeled by another (or an unrecorded) labeler version than that of `rules`."""
+    t = PDFMetadata.__table__
+    version = labeler_version(rules)
+    return db.scalars(
+        select(t.c.id)
+        .where(t.c.processed == True,  # noqa: E712
+               or_(t.c.labeler_version.is_(None), t.c.labeler_version != version))
+        .order_by(t.c.id)
+    ).all()
+
+def requeue(db, pdf_ids):
+    """
+    Puts processed PDFs back in the work queue with a fresh attempt budget.
+    Their rows stay readable until a worker replaces them in one transaction.
+    """
+    if not pdf_ids:
+        return 0
+    t = PDFMetadata.__table__
+    db.execute(
+        update(t).where(and_(t.c.id == bindparam("pdf"), t.c.processed == True))  # noqa: E712
+        .values(processed=False, status=PENDING, attempts=0, next_attempt_at=None, last_error=None,
+                lease_owner=None, lease_expires_at=None),
+        [{"pdf": pdf_id} for pdf_id in pdf_ids],
+    )
+    db.commit()
+    return len(pdf_ids)
+
+def reextract(rules=DEFAULT_RULES, refresh=False, download_workers=8, dry_run=False):
+    """
+    Brings stored layout_features up to date with the current extractor,
+    the labeler `rules` and the PDF bytes, doing only the work each needs:
+    1. PDFs parsed by another extractor version, or whose bytes changed,
+       go back to the work queue; extraction workers re-parse them and
+       replace their rows atomically.
+    2. Every other processed PDF whose labels came from another labeler
+       version is re-labeled in place, without downloading or parsing.
+    Returns the number of PDFs in each case.
+    """
+    init_db()
+    db = SessionLocal()
+    cache = PDFCache()
+    session = get_http_session(pool_size=download_workers) if refresh else None
+    try:
+        extractor = outdated_extraction(db)
+        content = changed_content(db, cache, refresh, session, download_workers, exclude=extractor)
+        reparsed = set(extractor) | set(content)
+        labels = [pdf_id for pdf_id in outdated_labels(db, rules) if pdf_id not in reparsed]
+        report = {"extractor": len(extractor), "content": len(content), "labeler": len(labels)}
+        if not dry_run:
+            requeue(db, extractor + content)
+    finally:
+        if session is not None:
+            session.close()
+        cache.close()
+        db.close()
+
+    if not dry_run and report["labeler"]:
+        relabel_layout_features(rules)
+    for reason, count in report.items():
+        telemetry.inc("reextract_pdfs_total", count, reason=reason)
+    logger.info(
+        f"{'Would re-parse' if dry_run else 'Re-queued'} {report['extractor']} PDFs for extractor version "
+        f"{EXTRACTOR_VERSION} and {report['content']} with changed bytes; "
+        f"{'would re-label' if dry_run else 're-labeled'} {report['labeler']} PDFs for labeler version {labeler_version(rules)}."
+    )
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-parse or re-label only the PDFs whose bytes, extractor or labeler changed.")
+    parser.add_argument("--refresh", action="store_true", help="Download every processed PDF again to detect changed bytes.")
+    parser.add_argument("--download-workers", type=int, default=8)
+    parser.add_argument("--dry-run", action="store_true", help="Only count the PDFs that need work.")
+    parser.add_argument("--run", action="store_true", help="Run the extraction pipeline on the re-queued PDFs afterwards.")
+    for field in fields(LabelingRules):
+        parser.add_argument(f"--{field.name.replace('_', '-')}", type=float, default=field.default)
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    args = parser.parse_args()
+
+    if args.telemetry:
+        telemetry.enable()
+
+    rules = LabelingRules(**{field.name: getattr(args, field.name) for field in fields(LabelingRules)})
+    report = reextract(rules, args.refresh, args.download_workers, args.dry_run)
+    if args.run and not args.dry_run and (report["extractor"] or report["content"]):
+        from src.data.pipeline import run_pipeline
+        run_pipeline(args.download_workers)
+        # Workers label with the default rules; bring re-parsed PDFs to `rules` too
+        relabel_layout_features(rules)
+    telemetry.write_run("reextract")
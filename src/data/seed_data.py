@@ -1,6 +1,15 @@
+import os
+import json
+import time
+import queue
+import argparse
 import requests
 import logging
+import threading
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert, select
+from src import telemetry
 from src.data.db_session import SessionLocal, init_db
 from src.data.models_db import PDFMetadata
 
@@ -8,63 +17,219 @@ from src.data.models_db import PDFMetadata
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-def seed_massive_diverse_pdfs():
+ESEARCH_URL = os.getenv("ESEARCH_URL", "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi")
+NCBI_API_KEY = os.getenv("NCBI_API_KEY")
+# NCBI allows 3 requests/s per IP without an API key and 10/s with one
+NCBI_RATE_LIMIT = float(os.getenv("NCBI_RATE_LIMIT", "10" if NCBI_API_KEY else "3"))
+SEED_CHECKPOINT = os.getenv("SEED_CHECKPOINT", os.path.join("data", "seed_checkpoint.json"))
+
+TERMS = [
+    "physics", "law", "economics", "engineering", "history", "biology", "mathematics", "sociology",
+    "chemistry", "philosophy", "psychology", "archaeology", "astronomy", "linguistics", "geology",
+    "medicine", "architecture", "politics", "art", "music", "literature", "ecology", "robotics",
+    "nanotechnology", "genetics", "neuroscience", "anthropology", "theology", "agriculture",
+    "cryptography", "paleontology", "meteorology", "oceanography", "aeronautics",
+    "marketing", "journalism", "dentistry", "veterinary", "pharmacy", "nursing", "criminology",
+    "ethics", "pedagogy", "statistics", "metallurgy", "toxicology", "virology", "botany", "zoology",
+    "hydrology", "seismology", "optics", "acoustics", "thermodynamics", "microbiology", "immunology",
+    "pathology", "epidemiology", "dermatology", "radiology", "surgery", "oncology", "pediatrics",
+    "geriatrics", "psychiatry", "neurology", "cardiology", "endocrinology", "orthopedics",
+    "urology", "gynecology", "ophthalmology", "otolaryngology", "gastronomy", "fashion", "forestry",
+    "mining", "logistics", "management", "accounting", "banking", "insurance", "real estate",
+    "transportation", "telecommunications", "energy", "environment", "climatology", "urbanism",
+    "human rights", "international relations", "globalization", "cybersecurity", "blockchain",
+    "artificial intelligence", "data science", "quantum computing", "biotechnology", "space exploration"
+]
+
+# End-of-term marker passed from fetch threads to the writer
+_DONE = object()
+
+class RateLimiter:
+    """Spaces calls at least 1/`rate` seconds apart across all threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+def fetch_esearch_page(session, limiter, term, retstart, retmax, retries=3):
+    """One esearch page for `term`: returns (ids, total hit count). Retries 429/5xx with backoff."""
+    params = {"db": "pmc", "term": term, "retstart": retstart, "retmax": retmax}
+    if NCBI_API_KEY:
+        params["api_key"] = NCBI_API_KEY
+
+    for attempt in range(retries + 1):
+        limiter.wait()
+        with telemetry.stage("esearch"):
+            r = session.get(ESEARCH_URL, params=params, timeout=15)
+        telemetry.inc("esearch_requests_total", status=r.status_code)
+        if (r.status_code == 429 or r.status_code >= 500) and attempt < retries:
+            telemetry.inc("esearch_retries_total")
+            time.sleep(2 ** attempt)
+            continue
+        r.raise_for_status()
+        root = ET.fromstring(r.text)
+        error = root.findtext(".//ERROR")
+        if error:
+            raise RuntimeError(error)
+        return [id_elem.text for id_elem in root.findall(".//IdList/Id")], int(root.findtext("Count") or 0)
+
+def _term_worker(session, limiter, term, retstart, max_per_term, page_size, results):
+    """Pages through one term, handing every page to the writer with its next retstart."""
+    try:
+        while retstart < max_per_term:
+            ids, count = fetch_esearch_page(
+                session, limiter, term, retstart, min(page_size, max_per_term - retstart)
+            )
+            retstart += len(ids)
+            done = not ids or retstart >= min(count, max_per_term)
+            results.put((term, ids, retstart, done))
+            if done:
+                break
+    except Exception as e:
+        telemetry.error("esearch", e)
+        logger.error(f"Error searching {term} at retstart={retstart}: {e}")
+    finally:
+        results.put(_DONE)
+
+def load_checkpoint(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {}
+
+def save_checkpoint(path, checkpoint):
+    """Atomic write, so an interrupted run never leaves a truncated checkpoint."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+def _insert_ignoring_duplicates(dialect):
+    """INSERT ... ON CONFLICT (pmid) DO NOTHING for the dialects that have it, else None."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(PDFMetadata).on_conflict_do_nothing(index_elements=["pmid"])
+
+def insert_new_pmids(db, pmids):
+    """
+    Inserts the pmids not yet stored (one statement per batch); returns how
+    many were new. Conflicts are skipped by the database, so seeders racing
+    on the same ids never violate the unique pmid constraint.
+    """
+    pmids = list(dict.fromkeys(pmids))
+    if not pmids:
+        return 0
+    rows = [{"pmid": pmid, "processed": False} for pmid in pmids]
+    stmt = _insert_ignoring_duplicates(db.get_bind().dialect.name)
+    if stmt is not None:
+        # One multi-row VALUES statement, so rowcount is the number actually inserted
+        new_count = db.execute(stmt.values(rows)).rowcount
+    else:
+        existing = set(db.scalars(select(PDFMetadata.pmid).where(PDFMetadata.pmid.in_(pmids))))
+        new = [row for row in rows if row["pmid"] not in existing]
+        if new:
+            db.execute(insert(PDFMetadata), new)
+        new_count = len(new)
+    db.commit()
+    return new_count
+
+def seed_massive_diverse_pdfs(terms=None, workers=4, page_size=100, max_per_term=500,
+                              rate_limit=None, checkpoint_path=None, reset=False):
     """
     Searches PubMed Central (PMC) for diverse topics and seeds the database
     with PDF metadata (PMIDs) for later processing.
+
+    Terms are fetched concurrently (all requests share one NCBI rate limit)
+    and paginated with `retstart` up to `max_per_term` ids. A single writer
+    dedupes and inserts each page, then records the term's next `retstart`
+    in the checkpoint, so an interrupted run resumes where it stopped.
     """
     # 1. Initialize the database (Create tables if they don't exist)
     init_db()
 
-    terms = [
-        "physics", "law", "economics", "engineering", "history", "biology", "mathematics", "sociology", 
-        "chemistry", "philosophy", "psychology", "archaeology", "astronomy", "linguistics", "geology", 
-        "medicine", "architecture", "politics", "art", "music", "literature", "ecology", "robotics", 
-        "nanotechnology", "genetics", "neuroscience", "anthropology", "theology", "agriculture", 
-        "cryptography", "paleontology", "meteorology", "oceanography", "aeronautics", 
-        "marketing", "journalism", "dentistry", "veterinary", "pharmacy", "nursing", "criminology", 
-        "ethics", "pedagogy", "statistics", "metallurgy", "toxicology", "virology", "botany", "zoology",
-        "hydrology", "seismology", "optics", "acoustics", "thermodynamics", "microbiology", "immunology", 
-        "pathology", "epidemiology", "dermatology", "radiology", "surgery", "oncology", "pediatrics", 
-        "geriatrics", "psychiatry", "neurology", "cardiology", "endocrinology", "orthopedics", 
-        "urology", "gynecology", "ophthalmology", "otolaryngology", "gastronomy", "fashion", "forestry",
-        "mining", "logistics", "management", "accounting", "banking", "insurance", "real estate",
-        "transportation", "telecommunications", "energy", "environment", "climatology", "urbanism",
-        "human rights", "international relations", "globalization", "cybersecurity", "blockchain",
-        "artificial intelligence", "data science", "quantum computing", "biotechnology", "space exploration"
-    ]
-    
+    terms = terms or TERMS
+    checkpoint_path = checkpoint_path or SEED_CHECKPOINT
+    checkpoint = {} if reset else load_checkpoint(checkpoint_path)
+    todo = [t for t in terms if not checkpoint.get(t, {}).get("done")]
+    logger.info(f"Starting metadata collection for {len(todo)} of {len(terms)} areas")
+
     db = SessionLocal()
-    total_terms = len(terms)
-    logger.info(f"Starting metadata collection for {total_terms} areas")
-
-    for index, term in enumerate(terms, 1):
-        try:
-            # Fetch PMIDs from NCBI
-            api_url = f"https://eutils.ncbi.nlm.nih.gov/entrez/eutils/esearch.fcgi?db=pmc&term={term}&retmax=10"
-            r = requests.get(api_url, timeout=10)
-            root = ET.fromstring(r.text)
-            ids = [id_elem.text for id_elem in root.findall(".//Id")]
-            
-            new_count = 0
-            for pmid in ids:
-                # Check if already exists to avoid duplicates
-                exists = db.query(PDFMetadata).filter(PDFMetadata.pmid == pmid).first()
-                if not exists:
-                    db.add(PDFMetadata(pmid=pmid, processed=False))
-                    new_count += 1
-            
-            db.commit()
-            if new_count > 0:
-                logger.info(f"[{index}/{total_terms}] {term.capitalize()}: {new_count} new PDFs added.")
-                
-        except Exception as e:
-            logger.error(f"[{index}/{total_terms}] Error searching {term}: {e}")
-            db.rollback()
-            continue
-            
+    session = requests.Session()
+    limiter = RateLimiter(rate_limit if rate_limit is not None else NCBI_RATE_LIMIT)
+    results = queue.Queue()
+    added, pages, failed = 0, 0, set()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for term in todo:
+            start = checkpoint.get(term, {}).get("retstart", 0)
+            pool.submit(_term_worker, session, limiter, term, start, max_per_term, page_size, results)
+
+        # The writer (this thread) owns the DB session and the checkpoint
+        finished = 0
+        while finished < len(todo):
+            item = results.get()
+            if item is _DONE:
+                finished += 1
+                continue
+
+            term, ids, retstart, done = item
+            if term in failed:
+                continue  # Later pages would move the checkpoint past the lost one
+            try:
+                with telemetry.stage("seed_insert"):
+                    new_count = insert_new_pmids(db, ids)
+            except Exception as e:
+                logger.error(f"Error storing {term} ids: {e}")
+                db.rollback()
+                failed.add(term)
+                continue
+            telemetry.inc("pmids_added_total", new_count)
+            added += new_count
+            pages += 1
+            checkpoint[term] = {"retstart": retstart, "done": done}
+            save_checkpoint(checkpoint_path, checkpoint)
+            if done:
+                logger.info(f"{term.capitalize()}: completed at {retstart} ids.")
+
+    session.close()
     db.close()
-    logger.info("Database seeding completed.")
+    pending = [t for t in terms if not checkpoint.get(t, {}).get("done")]
+    logger.info(f"Database seeding completed: {added} new PDFs from {pages} pages; {len(pending)} terms pending.")
+    report = telemetry.write_run("seed")
+    if report:
+        logger.info(f"Telemetry written to {report}")
+    return added
 
 if __name__ == "__main__":
-    seed_massive_diverse_pdfs()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Seed pdf_metadata with PMC ids from esearch.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--page-size", type=int, default=100, help="esearch retmax per request.")
+    parser.add_argument("--max-per-term", type=int, default=500)
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests/s (NCBI_RATE_LIMIT).")
+    parser.add_argument("--checkpoint", default=None, help="Progress file (SEED_CHECKPOINT).")
+    parser.add_argument("--reset", action="store_true", help="Ignore the checkpoint and start over.")
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    parser.add_argument("--profile", nargs="+", default=None, help="Stages to run under cProfile ('all' for every stage).")
+    args = parser.parse_args()
+
+    if args.telemetry or args.profile:
+        telemetry.enable(args.profile)
+
+    seed_massive_diverse_pdfs(
+        workers=args.workers, page_size=args.page_size, max_per_term=args.max_per_term,
+        rate_limit=args.rate_limit, checkpoint_path=args.checkpoint, reset=args.reset,
+    )
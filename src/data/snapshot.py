@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+import argparse
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from sqlalchemy import bindparam, create_engine, text
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join("data", "snapshot"))
+MANIFEST = "manifest.json"
+
+# PDFs read per export query (pdf_id IN (...)); batches follow pdf_id order
+EXPORT_PDF_BATCH = 1000
+
+# Fixed so every record batch shares one dictionary (labels produced by src.data.labeling)
+LABEL_CATEGORIES = ["body", "footer", "garbage", "header", "image", "title"]
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("pdf_id", pa.int32()),
+    ("pmid", pa.string()),
+    ("page_number", pa.int16()),
+    ("font_size", pa.float32()),
+    ("is_bold", pa.bool_()),
+    ("x0", pa.float32()),
+    ("y0", pa.float32()),
+    ("width", pa.float32()),
+    ("height", pa.float32()),
+    ("page_width", pa.float32()),
+    ("page_height", pa.float32()),
+    ("is_image", pa.bool_()),
+    ("label", pa.dictionary(pa.int8(), pa.string())),
+])
+
+EXPORT_QUERY = text("""
+    SELECT f.id, f.pdf_id, m.pmid, f.page_number, f.font_size, f.is_bold, f.x0, f.y0,
+           f.width, f.height, f.page_width, f.page_height, f.is_image, f.label
+    FROM layout_features f JOIN pdf_metadata m ON m.id = f.pdf_id
+    WHERE f.pdf_id IN :pdf_ids
+    ORDER BY f.pdf_id, f.page_number, f.y0, f.id
+""").bindparams(bindparam("pdf_ids", expanding=True))
+
+# A PDF's rows and its `processed` flag are committed together, so a processed PDF is complete
+COMPLETED_QUERY = text("SELECT id FROM pdf_metadata WHERE processed = :done ORDER BY id")
+
+def _load_manifest(snapshot_dir):
+    path = os.path.join(snapshot_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"parts": []}
+    with open(path) as f:
+        return json.load(f)
+
+def _to_record_batch(df):
+    df = df.astype({"is_bold": "boolean", "is_image": "boolean"})
+    df["label"] = pd.Categorical(df["label"], categories=LABEL_CATEGORIES)
+    return pa.RecordBatch.from_pandas(df, schema=SCHEMA, preserve_index=False)
+
+def exported_pdf_ids(snapshot_dir):
+    """Set of pdf_ids already present in the snapshot (reads one column per part)."""
+    ids = set()
+    for part in _load_manifest(snapshot_dir)["parts"]:
+        for batch in _iter_batches(os.path.join(snapshot_dir, part["file"]), ["pdf_id"]):
+            ids.update(batch.column(0).to_numpy().tolist())
+    return ids
+
+def export_snapshot(engine, snapshot_dir=None, fmt="arrow", chunksize=200_000):
+    """
+    Appends one partition with every completed (processed) PDF not yet in the
+    snapshot. PDFs are selected by id, not by a layout_features id
+    watermark: ids are reserved before commit, so a PDF committed late may
+    hold ids below rows already exported and would be skipped for good.
+    Rows are stored with compact dtypes, ordered by (pdf_id, page_number, y0, id)
+    like the DB stream. A re-extracted PDF keeps the rows it was first exported with.
+    `fmt` is "arrow" (uncompressed Arrow IPC, memory-mappable) or "parquet".
+    """
+    snapshot_dir = snapshot_dir or DEFAULT_SNAPSHOT_DIR
+    os.makedirs(snapshot_dir, exist_ok=True)
+    manifest = _load_manifest(snapshot_dir)
+    already = exported_pdf_ids(snapshot_dir)
+
+    part_name = f"part-{len(manifest['parts']):05d}.{fmt}"
+    part_path = os.path.join(snapshot_dir, part_name)
+    rows, pdf_ids, writer = 0, set(), None
+
+    with engine.connect().execution_options(stream_results=True) as conn:
+        todo = [pdf_id for pdf_id in conn.execute(COMPLETED_QUERY, {"done": True}).scalars() if pdf_id not in already]
+        batches = (todo[i:i + EXPORT_PDF_BATCH] for i in range(0, len(todo), EXPORT_PDF_BATCH))
+        chunks = (
+            chunk for batch in batches
+            for chunk in pd.read_sql(EXPORT_QUERY, conn, params={"pdf_ids": batch}, chunksize=chunksize)
+        )
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            if writer is None:
+                writer = ipc.new_file(part_path, SCHEMA) if fmt == "arrow" else pq.ParquetWriter(part_path, SCHEMA)
+            batch = _to_record_batch(chunk)
+            if fmt == "arrow":
+                writer.write_batch(batch)
+            else:
+                writer.write_batch(batch, row_group_size=chunksize)
+            rows += len(chunk)
+            pdf_ids.update(chunk["pdf_id"].unique().tolist())
+
+    if writer is None:
+        logger.info("Snapshot is up to date; nothing to export.")
+        return None
+    writer.close()
+
+    manifest["parts"].append({"file": part_name, "rows": rows, "pdfs": len(pdf_ids)})
+    with open(os.path.join(snapshot_dir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=2)
+    logger.info(f"Exported {rows} rows from {len(pdf_ids)} new PDFs to {part_path}")
+    return part_path
+
+def _iter_batches(path, columns=None):
+    if path.endswith(".arrow"):
+        # Memory-mapped: batches reference the page cache, no copy or decode
+        reader = ipc.open_file(pa.memory_map(path, "r"))
+        for i in range(reader.num_record_batches):
+            batch = reader.get_batch(i)
+            yield batch.select(columns) if columns else batch
+    else:
+        yield from pq.ParquetFile(path, memory_map=True).iter_batches(columns=columns)
+
+def read_snapshot_chunks(snapshot_dir=None, columns=None, pdf_ids=None):
+    """
+    Yields snapshot record batches as DataFrames in stored order (each PDF's
+    rows contiguous). With `pdf_ids`, only the rows of those PDFs are returned.
+    """
+    snapshot_dir = snapshot_dir or DEFAULT_SNAPSHOT_DIR
+    wanted = None if pdf_ids is None else list(pdf_ids)
+    for part in _load_manifest(snapshot_dir)["parts"]:
+        path = os.path.join(snapshot_dir, part["file"])
+        read_columns = columns if wanted is None or not columns or "pdf_id" in columns else columns + ["pdf_id"]
+        for batch in _iter_batches(path, read_columns):
+            df = batch.to_pandas()
+            if wanted is not None:
+                df = df[df["pdf_id"].isin(wanted)]
+            if columns:
+                df = df[columns]
+            if not df.empty:
+                yield df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export layout_features to an Arrow/Parquet snapshot.")
+    parser.add_argument("--out", default=DEFAULT_SNAPSHOT_DIR)
+    parser.add_argument("--format", choices=["arrow", "parquet"], default="arrow")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    db_url = os.getenv("DATABASE_URL")
+    if not db_url:
+        raise ValueError("DATABASE_URL is missing.")
+    export_snapshot(create_engine(db_url), args.out, args.format, args.chunksize)
@@ -0,0 +1,190 @@
+import os
+import time
+import uuid
+import socket
+import logging
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, case, func, or_, select, update
+from src.data.models_db import PDFMetadata
+
+logger = logging.getLogger(__name__)
+
+# Work states of pdf_metadata.status (NULL on rows created before the column = pending)
+PENDING, IN_PROGRESS, DONE, FAILED = "pending", "in_progress", "done", "failed"
+
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "900"))
+MAX_ATTEMPTS = int(os.getenv("MAX_ATTEMPTS", "5"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("RETRY_BACKOFF_SECONDS", "60"))
+CLAIM_BATCH_SIZE = int(os.getenv("CLAIM_BATCH_SIZE", "16"))
+# Leases are extended this often by `heartbeat`, well within LEASE_SECONDS
+HEARTBEAT_SECONDS = float(os.getenv("HEARTBEAT_SECONDS", str(LEASE_SECONDS / 3)))
+# A failing claim is retried this many times, after 1, 2, 4... seconds (capped at a minute)
+CLAIM_RETRIES = int(os.getenv("CLAIM_RETRIES", "8"))
+
+def default_worker_id():
+    return os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+def utcnow():
+    """Naive UTC timestamp; workers on different machines are assumed NTP-synced."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def backoff_seconds(attempts):
+    """Delay before retry number `attempts` + 1: base * 2^(attempts - 1), capped at a day."""
+    return min(RETRY_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0), 86400.0)
+
+def requeue_expired(db, now=None):
+    """
+    Returns in_progress rows whose lease ran out (worker died or stalled) to
+    pending, or to failed once they used up MAX_ATTEMPTS. Returns the row count.
+    """
+    t = PDFMetadata.__table__
+    now = now or utcnow()
+    result = db.execute(
+        update(t)
+        .where(t.c.status == IN_PROGRESS, t.c.lease_expires_at < now)
+        .values(
+            status=case((t.c.attempts >= MAX_ATTEMPTS, FAILED), else_=PENDING),
+            lease_owner=None, lease_expires_at=None, last_error="lease expired",
+        )
+    )
+    db.commit()
+    if result.rowcount:
+        logger.warning(f"Re-queued {result.rowcount} PDFs with expired leases.")
+    return result.rowcount
+
+def claim_batch(db, worker_id, batch_size=None, lease_seconds=None):
+    """
+    Atomically leases up to `batch_size` pending PDFs to `worker_id` and returns
+    their (id, pmid). On PostgreSQL the candidates are picked with
+    FOR UPDATE SKIP LOCKED, so concurrent workers never wait on or receive
+    the same rows; on SQLite the single UPDATE runs under the database write
+    lock, which gives the same guarantee. Each claim stamps its rows with a
+    fresh token, so without RETURNING exactly those rows are read back, not
+    the ones this worker leased before and still has in flight.
+    """
+    t = PDFMetadata.__table__
+    now = utcnow()
+    token = uuid.uuid4().hex
+    requeue_expired(db, now)
+
+    candidates = (
+        select(t.c.id)
+        .where(
+            t.c.processed == False,  # noqa: E712
+            or_(t.c.status.is_(None), t.c.status == PENDING),
+            or_(t.c.next_attempt_at.is_(None), t.c.next_attempt_at <= now),
+        )
+        .order_by(t.c.id)
+        .limit(batch_size or CLAIM_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+    )
+    claim = (
+        update(t)
+        .where(t.c.id.in_(candidates))
+        .values(
+            status=IN_PROGRESS, lease_owner=worker_id, claim_token=token,
+            lease_expires_at=now + timedelta(seconds=lease_seconds or LEASE_SECONDS),
+            attempts=func.coalesce(t.c.attempts, 0) + 1,
+        )
+    )
+
+    if db.get_bind().dialect.update_returning:
+        claimed = db.execute(claim.returning(t.c.id, t.c.pmid)).all()
+    else:
+        # No RETURNING: re-read the rows this claim stamped
+        db.execute(claim)
+        claimed = db.execute(select(t.c.id, t.c.pmid).where(t.c.claim_token == token)).all()
+    db.commit()
+    return sorted((pdf_id, pmid) for pdf_id, pmid in claimed)
+
+def claim_with_retry(db, worker_id, batch_size=None, retries=None):
+    """
+    `claim_batch`, retried after a growing pause when it fails (a dropped
+    connection, a locked SQLite file) instead of ending the worker's claims.
+    Raises the last error once `retries` retries (CLAIM_RETRIES) failed.
+    """
+    retries = CLAIM_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return claim_batch(db, worker_id, batch_size)
+        except Exception as e:
+            db.rollback()
+            if attempt == retries:
+                raise
+            delay = min(2.0 ** attempt, 60.0)
+            logger.warning(f"Claim failed ({e}); retrying in {delay:.0f}s.")
+            time.sleep(delay)
+
+def heartbeat(session_factory, worker_id, stop, interval=None):
+    """
+    Thread target: extends `worker_id`'s leases every `interval` seconds
+    (HEARTBEAT_SECONDS) on its own session until `stop` (an Event) is set,
+    so PDFs stay leased however long they wait in queues or take to write.
+    """
+    db = session_factory()
+    try:
+        while not stop.wait(interval or HEARTBEAT_SECONDS):
+            try:
+                extend_leases(db, worker_id)
+            except Exception as e:
+                db.rollback()
+                logger.warning(f"Lease heartbeat failed, retrying in {interval or HEARTBEAT_SECONDS:.0f}s: {e}")
+    finally:
+        db.close()
+
+def extend_leases(db, worker_id, lease_seconds=None):
+    """Pushes back the expiry of every lease `worker_id` still holds (heartbeat)."""
+    t = PDFMetadata.__table__
+    result = db.execute(
+        update(t)
+        .where(t.c.status == IN_PROGRESS, t.c.lease_owner == worker_id)
+        .values(lease_expires_at=utcnow() + timedelta(seconds=lease_seconds or LEASE_SECONDS))
+    )
+    db.commit()
+    return result.rowcount
+
+def mark_failed(db, pdf_id, worker_id, error):
+    """
+    Releases a PDF this worker could not process: back to pending after an
+    exponential backoff, or failed for good once it reached MAX_ATTEMPTS.
+    A lease that already moved to another worker is left alone.
+    """
+    t = PDFMetadata.__table__
+    attempts = db.scalar(
+        select(t.c.attempts).where(t.c.id == pdf_id, t.c.lease_owner == worker_id, t.c.status == IN_PROGRESS)
+    )
+    if attempts is None:
+        return None
+
+    retry = attempts < MAX_ATTEMPTS
+    db.execute(
+        update(t)
+        .where(t.c.id == pdf_id, t.c.lease_owner == worker_id)
+        .values(
+            status=PENDING if retry else FAILED, lease_owner=None, lease_expires_at=None,
+            next_attempt_at=utcnow() + timedelta(seconds=backoff_seconds(attempts)) if retry else None,
+            last_error=str(error)[:500],
+        )
+    )
+    db.commit()
+    return PENDING if retry else FAILED
+
+def reset_failed(db):
+    """Puts every failed PDF back in the queue with a fresh attempt budget."""
+    t = PDFMetadata.__table__
+    result = db.execute(
+        update(t).where(t.c.status == FAILED)
+        .values(status=PENDING, attempts=0, next_attempt_at=None, last_error=None)
+    )
+    db.commit()
+    return result.rowcount
+
+def queue_counts(db):
+    """{status: count} over unprocessed and processed PDFs (legacy NULL counted as pending/done)."""
+    t = PDFMetadata.__table__
+    status = case(
+        (and_(t.c.status.is_(None), t.c.processed == True), DONE),  # noqa: E712
+        (t.c.status.is_(None), PENDING),
+        else_=t.c.status,
+    )
+    return dict(db.execute(select(status, func.count()).group_by(status)).all())
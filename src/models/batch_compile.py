@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from src.models.inference import (
+    AcademicEngine, OUTPUT_PATH, LAYOUTS, COMPONENT_TYPES, POSITIONS, build_document, unique_suffix,
+)
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+LATEX_ENGINE = os.getenv("LATEX_ENGINE", "pdflatex")
+COMPILE_TIMEOUT = float(os.getenv("COMPILE_TIMEOUT", "60"))
+COMPILE_RETRIES = int(os.getenv("COMPILE_RETRIES", "2"))
+
+# Rough peak RSS of one compile of these documents; lualatex loads far more
+ENGINE_MEMORY_MB = {"pdflatex": 120, "xelatex": 200, "lualatex": 350}
+# Left for this process (engine, pandas, sklearn model) when sizing the pool
+PARENT_MEMORY_MB = 300
+
+def _memory_limit_bytes():
+    """Container memory limit from cgroup v2/v1, or None when unlimited."""
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 2**60:
+            return int(value)
+    return None
+
+def default_workers(engine_name=LATEX_ENGINE):
+    """One worker per core, capped so every concurrent compile fits in the memory limit."""
+    workers = os.cpu_count() or 1
+    limit = _memory_limit_bytes()
+    if limit is not None:
+        per_job = int(os.getenv("LATEX_JOB_MEMORY_MB", ENGINE_MEMORY_MB.get(engine_name, 350)))
+        workers = min(workers, (limit // 1024**2 - PARENT_MEMORY_MB) // per_job)
+    return max(1, workers)
+
+def load_manifest(path):
+    """
+    Reads layout requests from a .json list or a .jsonl file. Each entry has
+    `layout` and optionally `type`, `pos` and a unique `name` for its files
+    (a plain file name: no path separators, not "..").
+    """
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            jobs = [json.loads(line) for line in f if line.strip()]
+        else:
+            jobs = json.load(f)
+
+    names = set()
+    for i, job in enumerate(jobs):
+        job.setdefault("type", "image")
+        job.setdefault("pos", "top")
+        if job.get("layout") not in LAYOUTS or job["type"] not in COMPONENT_TYPES or job["pos"] not in POSITIONS:
+            raise ValueError(f"Invalid manifest entry #{i}: {job}")
+        job.setdefault("name", f"{i:05d}_{job['layout']}_{job['pos']}_{job['type']}")
+        # The name becomes <out_dir>/<name>.tex/.pdf/.log: it must stay a plain file name
+        name = job["name"]
+        if not isinstance(name, str) or name in ("", ".", "..") or any(c in name for c in "/\\\0"):
+            raise ValueError(f"Invalid job name in manifest entry #{i}: {name!r} (no path separators or '..')")
+        if job["name"] in names:
+            raise ValueError(f"Duplicate job name in manifest: {job['name']}")
+        names.add(job["name"])
+    return jobs
+
+def compile_tex(tex_path, out_dir, engine_name=LATEX_ENGINE, timeout=COMPILE_TIMEOUT, retries=COMPILE_RETRIES):
+    """
+    Compiles one .tex in its own temporary directory (no shared aux files)
+    and moves the PDF next to it in `out_dir`. Timeouts and engine crashes
+    (killed by a signal, e.g. OOM) are retried; LaTeX errors are not, and
+    leave `<name>.log` in `out_dir`. Returns a result dict.
+    """
+    name = os.path.splitext(os.path.basename(tex_path))[0]
+    result = {"name": name, "ok": False, "attempts": 0, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+
+    for attempt in range(1, retries + 2):
+        if attempt > 1:
+            time.sleep(min(0.1 * 2 ** attempt, 2))
+        result["attempts"] = attempt
+        with tempfile.TemporaryDirectory(prefix=f"latex_{name}_") as workdir:
+            cmd = [
+                engine_name, "-interaction=nonstopmode", "-halt-on-error",
+                f"-output-directory={workdir}", "-jobname", name, os.path.abspath(tex_path),
+            ]
+            try:
+                proc = subprocess.run(cmd, cwd=workdir, capture_output=True, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                result["error"] = f"timeout after {timeout}s"
+                continue
+            except OSError as e:
+                result["error"] = str(e)
+                continue
+
+            pdf = os.path.join(workdir, f"{name}.pdf")
+            if proc.returncode == 0 and os.path.exists(pdf):
+                shutil.move(pdf, os.path.join(out_dir, f"{name}.pdf"))
+                result.update(ok=True, error=None)
+                break
+
+            log = os.path.join(workdir, f"{name}.log")
+            if os.path.exists(log):
+                shutil.copy(log, os.path.join(out_dir, f"{name}.log"))
+            result["error"] = f"{engine_name} exited with {proc.returncode}"
+            if proc.returncode > 0:
+                break  # A LaTeX error: the same input fails the same way
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+def fit_and_compile(tex_path, out_dir, engine_name, timeout, retries, cache):
+    """
+    Trims the .tex at `tex_path` until it typesets to one page (draft-mode
+    probes, cached by content hash), rewrites it, then compiles it as usual.
+    """
+    from src.models.fit_check import fit_to_one_page
+
+    name = os.path.splitext(os.path.basename(tex_path))[0]
+    try:
+        with open(tex_path, encoding="utf-8") as f:
+            fitted, report = fit_to_one_page(f.read(), engine_name, cache, timeout=timeout)
+    except (ValueError, OSError) as e:
+        return {"name": name, "ok": False, "attempts": 0, "seconds": 0.0, "error": f"fit: {e}"}
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(fitted)
+    result = compile_tex(tex_path, out_dir, engine_name, timeout, retries)
+    result["fit"] = report
+    return result
+
+def summarize(results, wall_seconds):
+    seconds = np.array([r["seconds"] for r in results if r["ok"]])
+    ok = int(sum(r["ok"] for r in results))
+    summary = {
+        "jobs": len(results),
+        "ok": ok,
+        "failed": len(results) - ok,
+        "retried": sum(r["attempts"] > 1 for r in results),
+        "wall_seconds": round(wall_seconds, 3),
+        "jobs_per_second": round(len(results) / wall_seconds, 3) if wall_seconds else None,
+        "compile_p50": round(float(np.percentile(seconds, 50)), 3) if len(seconds) else None,
+        "compile_p95": round(float(np.percentile(seconds, 95)), 3) if len(seconds) else None,
+        "failures": {r["name"]: r["error"] for r in results if not r["ok"]},
+    }
+    fits = [r["fit"] for r in results if "fit" in r]
+    if fits:
+        summary.update(
+            fit_compiles=sum(f["compiles"] for f in fits),
+            fit_cache_hits=sum(f["cache_hits"] for f in fits),
+            fit_max_compiles=max(f["compiles"] for f in fits),
+            fit_trimmed=sum(f["paragraphs"] < f["of"] for f in fits),
+        )
+    return summary
+
+def run_batch(manifest, out_dir=None, engine_name=LATEX_ENGINE, workers=None,
+              timeout=COMPILE_TIMEOUT, retries=COMPILE_RETRIES, tex_only=False, fit=False):
+    """
+    Generates every .tex in `manifest` and compiles them on a bounded pool.
+    Threads are enough here: each worker just waits on its own LaTeX process.
+    With `fit`, every document is first trimmed to one page (`src.models.fit_check`).
+    Writes `stats.json` to `out_dir` and returns the stats dict.
+    """
+    jobs = load_manifest(manifest)
+    out_dir = out_dir or os.path.join(OUTPUT_PATH, f"batch_{datetime.now().strftime('%Y%m%d')}_{unique_suffix()}")
+    os.makedirs(out_dir, exist_ok=True)
+
+    # 1. Generate all sources (fast, single process)
+    engine = AcademicEngine()
+    tex_paths = []
+    for job in jobs:
+        path = os.path.join(out_dir, f"{job['name']}.tex")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(build_document(engine, job["layout"], job["type"], job["pos"]))
+        tex_paths.append(path)
+    logger.info(f"Generated {len(tex_paths)} .tex files in {out_dir}")
+    if tex_only:
+        return {"jobs": len(tex_paths)}
+
+    if shutil.which(engine_name) is None:
+        raise RuntimeError(f"LaTeX engine '{engine_name}' not found in PATH.")
+
+    # 2. Compile across the pool
+    workers = workers or default_workers(engine_name)
+    logger.info(f"Compiling with {workers} {engine_name} workers...")
+    start = time.perf_counter()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if fit:
+            from src.models.fit_check import FitCache
+            cache = FitCache()  # Shared by all workers: identical candidates are typeset once
+            futures = [pool.submit(fit_and_compile, path, out_dir, engine_name, timeout, retries, cache)
+                       for path in tex_paths]
+        else:
+            futures = [pool.submit(compile_tex, path, out_dir, engine_name, timeout, retries) for path in tex_paths]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if not result["ok"]:
+                logger.warning(f"{result['name']}: {result['error']}")
+
+    # 3. Stats
+    stats = summarize(results, time.perf_counter() - start)
+    stats.update(engine=engine_name, workers=workers)
+    with open(os.path.join(out_dir, "stats.json"), "w") as f:
+        json.dump({"summary": stats, "results": sorted(results, key=lambda r: r["name"])}, f, indent=2)
+    logger.info(
+        f"{stats['ok']}/{stats['jobs']} compiled ({stats['failed']} failed, {stats['retried']} retried) "
+        f"in {stats['wall_seconds']}s ({stats['jobs_per_second']} jobs/s)"
+    )
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate and compile a manifest of layout requests.")
+    parser.add_argument("manifest", help=".json list or .jsonl of {layout, type, pos, name}")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--engine", choices=list(ENGINE_MEMORY_MB), default=LATEX_ENGINE)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--timeout", type=float, default=COMPILE_TIMEOUT)
+    parser.add_argument("--retries", type=int, default=COMPILE_RETRIES)
+    parser.add_argument("--tex-only", action="store_true", help="Only generate the .tex files.")
+    parser.add_argument("--fit", action="store_true", help="Trim each document until it typesets to one page.")
+    args = parser.parse_args()
+
+    stats = run_batch(
+        args.manifest, args.out, args.engine, args.workers, args.timeout, args.retries, args.tex_only, args.fit,
+    )
+    sys.exit(1 if stats.get("failed") else 0)
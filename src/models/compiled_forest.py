@@ -0,0 +1,180 @@
+import os
+import copy
+import numpy as np
+
+def compiled_path(model_path):
+    """Where the CompiledForest export of `model_path` lives (next to it)."""
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.compiled{ext or '.joblib'}"
+
+def _float32_floor(threshold):
+    """Thresholds rounded down to float32, so `x > threshold` is unchanged for float32 inputs."""
+    rounded = np.asarray(threshold).astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+def compact_sklearn(model, max_depth=None, float32=False):
+    """
+    A copy of a fitted sklearn forest that decides like `CompiledForest.compact`
+    with the same arguments: nodes at `max_depth` become leaves predicting
+    their class distribution, and `float32` rounds thresholds and leaf values
+    the same way. Exporting both lets either backend serve one model.
+    """
+    model = copy.deepcopy(model)
+    for estimator in model.estimators_:
+        tree_cls, args, state = estimator.tree_.__reduce__()
+        nodes, values = state["nodes"].copy(), state["values"].copy()
+        internal = nodes["left_child"] != -1
+
+        if max_depth is not None and max_depth < state["max_depth"]:
+            depth = np.zeros(len(nodes), dtype=np.int64)
+            for node in range(len(nodes)):  # Children are always numbered after their parent
+                if internal[node]:
+                    depth[[nodes["left_child"][node], nodes["right_child"][node]]] = depth[node] + 1
+            cut = internal & (depth >= max_depth)
+            nodes["left_child"][cut] = nodes["right_child"][cut] = -1
+            nodes["feature"][cut], nodes["threshold"][cut] = -2, -2.0
+            internal &= ~cut
+            state["max_depth"] = max_depth
+        if float32:
+            nodes["threshold"][internal] = _float32_floor(nodes["threshold"][internal])
+            values = values.astype(np.float32).astype(np.float64)
+
+        tree = tree_cls(*args)
+        tree.__setstate__({**state, "nodes": nodes, "values": values})
+        estimator.tree_ = tree
+    return model
+
+class CompiledForest:
+    """
+    A fitted RandomForestClassifier flattened into contiguous NumPy arrays.
+
+    All trees share one node table; leaves point to themselves, so every row
+    walks every tree in lock-step for `max_depth` vectorized steps with no
+    per-tree Python loop. Thresholds are compared exactly like sklearn
+    (inputs cast to float32, compared against float64 thresholds), so
+    probabilities match `predict_proba` up to float summation order.
+    Inputs must be NaN-free (`to_model_input` fills them). `compact` trades
+    depth and precision for size.
+
+    There is no per-call thread dispatch, so small batches are much faster
+    than sklearn; sklearn's compiled traversal wins again on large batches.
+    """
+
+    def __init__(self, left, right, feature, threshold, value, roots, classes, max_depth):
+        # children[2 * node] / children[2 * node + 1] are the left / right child
+        self.children = np.stack([left, right], axis=1).ravel()
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = max_depth
+
+    @classmethod
+    def from_sklearn(cls, model):
+        """Flattens the estimators of a fitted sklearn forest classifier."""
+        if getattr(model, "n_outputs_", 1) != 1:
+            raise ValueError("Only single-output forests can be compiled.")
+
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            nodes = np.arange(n_nodes) + offset
+            is_leaf = tree.children_left == -1
+
+            left.append(np.where(is_leaf, nodes, tree.children_left + offset))
+            right.append(np.where(is_leaf, nodes, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+
+            # Per-node class distribution, normalized like DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :].astype(np.float64)
+            normalizer = proba.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0] = 1.0
+            value.append(proba / normalizer)
+
+            roots.append(offset)
+            offset += n_nodes
+
+        return cls(
+            left=np.concatenate(left).astype(np.int32),
+            right=np.concatenate(right).astype(np.int32),
+            feature=np.concatenate(feature).astype(np.int32),
+            threshold=np.concatenate(threshold).astype(np.float64),
+            value=np.concatenate(value),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            max_depth=max(estimator.tree_.max_depth for estimator in model.estimators_),
+        )
+
+    def compact(self, max_depth=None, float32=False):
+        """
+        A smaller copy. `max_depth` turns every node at that depth into a
+        leaf predicting its class distribution and drops the nodes below.
+        `float32` stores thresholds and leaf values in 4 bytes: thresholds
+        are rounded down to the nearest float32, so `x > threshold` decides
+        exactly as before for float32 inputs; only the probabilities lose
+        precision.
+        """
+        children = self.children.reshape(-1, 2)
+        threshold, value = np.asarray(self.threshold), np.asarray(self.value)
+        depth = self.max_depth if max_depth is None else min(max_depth, self.max_depth)
+
+        # Nodes reachable within `depth` levels; the last level becomes leaves
+        keep = np.zeros(len(children), dtype=bool)
+        frontier = np.asarray(self.roots)
+        keep[frontier] = True
+        for _ in range(depth):
+            frontier = np.unique(children[frontier].ravel())
+            frontier = frontier[~keep[frontier]]
+            keep[frontier] = True
+        nodes = np.flatnonzero(keep)
+        new_id = np.cumsum(keep, dtype=np.int64) - 1
+
+        kept_children = children[nodes]
+        leaf = np.zeros(len(children), dtype=bool)
+        leaf[frontier] = True
+        leaf |= (children[:, 0] == np.arange(len(children)))
+        leaf = leaf[nodes]
+        left = np.where(leaf, new_id[nodes], new_id[kept_children[:, 0]])
+        right = np.where(leaf, new_id[nodes], new_id[kept_children[:, 1]])
+        threshold = np.where(leaf, 0.0, threshold[nodes])
+
+        if float32:
+            threshold, value = _float32_floor(threshold), value[nodes].astype(np.float32)
+        else:
+            value = value[nodes]
+
+        return CompiledForest(
+            left=left.astype(np.int32), right=right.astype(np.int32),
+            feature=np.where(leaf, 0, np.asarray(self.feature)[nodes]).astype(np.int32),
+            threshold=threshold, value=value,
+            roots=new_id[np.asarray(self.roots)].astype(np.int32),
+            classes=np.asarray(self.classes_), max_depth=depth,
+        )
+
+    def predict_proba(self, X, chunk_size=512):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X.shape
+        n_trees = len(self.roots)
+        out = np.empty((n_rows, self.value.shape[1]), dtype=np.float64)
+
+        for start in range(0, n_rows, chunk_size):
+            chunk = X[start:start + chunk_size].ravel()
+            m = min(chunk_size, n_rows - start)
+            row_offset = (np.arange(m, dtype=np.int64) * n_features)[:, None]
+            node = np.repeat(self.roots[None, :], m, axis=0)
+            for _ in range(self.max_depth):
+                x = np.take(chunk, np.take(self.feature, node) + row_offset)
+                go_right = x > np.take(self.threshold, node)
+                node = np.take(self.children, 2 * node + go_right)
+            out[start:start + m] = np.take(self.value, node, axis=0).sum(axis=1) / n_trees
+
+        return out
+
+    def predict(self, X):
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,176 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+# Columns read from layout_features to build the model inputs
+RAW_COLUMNS = ['pdf_id', 'page_number', 'font_size', 'is_bold', 'x0', 'y0', 'width', 'height']
+
+# Model inputs, in the order the classifier was trained on
+FEATURES = [
+    'font_size', 'rel_font_size', 'is_bold',
+    'x0', 'y0', 'width', 'dist_prev_y',
+    'center_dev', 'is_first_page', 'aspect_ratio'
+]
+
+# Order every streaming consumer relies on (id breaks y0 ties like a stable sort)
+STREAM_ORDER = ['pdf_id', 'page_number', 'y0', 'id']
+
+def _preprocess(df):
+    if 'pdf_id' not in df:
+        df['pdf_id'] = 0
+    if 'page_number' not in df:
+        df['page_number'] = 0
+    df['is_bold'] = df['is_bold'].fillna(False).astype(int)
+    df['font_size'] = df['font_size'].fillna(0)
+    if 'label' in df:
+        df['label'] = df['label'].fillna('body')
+    return df
+
+def _add_row_features(df):
+    # Center deviation (assuming standard ~600pt width for features)
+    df['center_dev'] = abs(300 - (df['x0'] + df['width']/2))
+
+    df['is_first_page'] = (df['page_number'] == 0).astype(int)
+
+    # NEW: Shape features
+    # Aspect ratio (avoid div by zero)
+    df['aspect_ratio'] = df['width'] / (df['height'] + 0.1)
+    return df
+
+def _z_score(font_size, mean, std):
+    """Relative font size (Z-score per PDF); 0 when the PDF has no spread."""
+    return ((font_size - mean) / (std + 0.001)).where(std > 0, 0.0)
+
+def engineer_features(df):
+    """
+    Preprocessing + feature engineering shared by training and inference.
+    Returns a new DataFrame sorted by (pdf_id, page_number, y0) that keeps the
+    original index, so predictions can be mapped back to the input rows.
+    """
+    df = _preprocess(df.copy())
+
+    # Sort for context calculation
+    df = df.sort_values(['pdf_id', 'page_number', 'y0'], kind='stable')
+
+    # Distance from previous line (context)
+    df['dist_prev_y'] = df.groupby(['pdf_id', 'page_number'])['y0'].diff().fillna(0)
+
+    grouped = df.groupby('pdf_id')['font_size']
+    df['rel_font_size'] = _z_score(df['font_size'], grouped.transform('mean'), grouped.transform('std'))
+
+    return _add_row_features(df)
+
+def to_model_input(df):
+    """Selects the model columns from an engineered frame (NaNs become 0)."""
+    return pd.DataFrame(df[FEATURES]).fillna(0)
+
+class FontSizeStats:
+    """
+    Running per-PDF font size mean/std (Welford, merged chunk by chunk with
+    Chan's parallel update), so Z-scores need no full-table DataFrame.
+    State is three numbers per PDF, independent of the number of lines.
+    """
+
+    def __init__(self):
+        self.n = {}
+        self.mean = {}
+        self.m2 = {}
+
+    def update(self, chunk):
+        font_size = chunk['font_size'].fillna(0)
+        grouped = font_size.groupby(chunk['pdf_id'])
+        count, mean = grouped.count(), grouped.mean()
+        m2 = grouped.var(ddof=0) * count
+
+        for pdf_id, n_b, mean_b, m2_b in zip(count.index, count, mean, m2):
+            n_a = self.n.get(pdf_id, 0)
+            if n_a == 0:
+                self.n[pdf_id], self.mean[pdf_id], self.m2[pdf_id] = n_b, mean_b, m2_b
+                continue
+            n = n_a + n_b
+            delta = mean_b - self.mean[pdf_id]
+            self.mean[pdf_id] += delta * n_b / n
+            self.m2[pdf_id] += m2_b + delta * delta * n_a * n_b / n
+            self.n[pdf_id] = n
+
+    def mean_std(self, pdf_ids):
+        """Mean and sample std (ddof=1, NaN for single-line PDFs) per row of `pdf_ids`."""
+        n = pdf_ids.map(self.n).astype(float)
+        mean = pdf_ids.map(self.mean).astype(float)
+        var = pdf_ids.map(self.m2).astype(float) / (n - 1)
+        return mean, np.sqrt(var.where(n > 1))
+
+def read_layout_chunks(engine, chunksize=100_000, columns=None, where=None, ordered=True):
+    """
+    Streams layout_features from the DB in STREAM_ORDER, `chunksize` rows at a
+    time (server-side cursor where supported). `where` is an optional SQL filter.
+    """
+    columns = columns or ['id'] + RAW_COLUMNS + ['label']
+    query = f"SELECT {', '.join(columns)} FROM layout_features"
+    if where:
+        query += f" WHERE {where}"
+    if ordered:
+        query += f" ORDER BY {', '.join(STREAM_ORDER)}"
+
+    with engine.connect().execution_options(stream_results=True) as conn:
+        for chunk in pd.read_sql(text(query), conn, chunksize=chunksize):
+            yield chunk
+
+def read_pdf_chunks(engine, pdf_ids, chunksize=100_000, columns=None, ordered=True, batch=1000):
+    """
+    `read_layout_chunks` restricted to the rows of `pdf_ids`, queried `batch`
+    PDFs at a time in pdf_id order (so STREAM_ORDER holds across queries).
+    """
+    pdf_ids = sorted(int(pdf_id) for pdf_id in pdf_ids)
+    for start in range(0, len(pdf_ids), batch):
+        where = f"pdf_id IN ({', '.join(map(str, pdf_ids[start:start + batch]))})"
+        yield from read_layout_chunks(engine, chunksize, columns, where=where, ordered=ordered)
+
+def stream_features(chunk_source, stats_source=None):
+    """
+    Bounded-memory equivalent of `engineer_features` over a whole table.
+    `chunk_source` is a callable returning a fresh iterator of raw chunks in
+    STREAM_ORDER. Pass 1 reads per-PDF font statistics from `stats_source`
+    (any order, only pdf_id/font_size needed; defaults to `chunk_source`),
+    pass 2 yields one engineered DataFrame per chunk of `chunk_source`.
+    """
+    stats = FontSizeStats()
+    for chunk in (stats_source or chunk_source)():
+        stats.update(chunk)
+
+    prev_key, prev_y0 = None, None
+    for chunk in chunk_source():
+        if chunk.empty:
+            continue
+        df = _preprocess(chunk)
+
+        # Distance from previous line, continuing across the chunk boundary
+        dist = df.groupby(['pdf_id', 'page_number'])['y0'].diff()
+        first_key = (df['pdf_id'].iat[0], df['page_number'].iat[0])
+        if prev_key == first_key:
+            dist.iat[0] = df['y0'].iat[0] - prev_y0
+        df['dist_prev_y'] = dist.fillna(0)
+        prev_key = (df['pdf_id'].iat[-1], df['page_number'].iat[-1])
+        prev_y0 = df['y0'].iat[-1]
+
+        mean, std = stats.mean_std(df['pdf_id'])
+        df['rel_font_size'] = _z_score(df['font_size'], mean, std)
+
+        yield _add_row_features(df)
+
+def load_features(engine, chunksize=100_000, where=None):
+    """
+    Streams and engineers the table chunk by chunk, keeping only what the
+    model needs (pdf_id, FEATURES, label), and returns it as one DataFrame.
+    """
+    return collect_features(stream_features(
+        lambda: read_layout_chunks(engine, chunksize, where=where),
+        lambda: read_layout_chunks(engine, chunksize, ['pdf_id', 'font_size'], where=where, ordered=False),
+    ))
+
+def collect_features(chunks):
+    """Concatenates engineered chunks, keeping only pdf_id, FEATURES and label."""
+    frames = [chunk[['pdf_id'] + FEATURES + ['label']] for chunk in chunks]
+    if not frames:
+        return pd.DataFrame(columns=['pdf_id'] + FEATURES + ['label'])
+    return pd.concat(frames, ignore_index=True)
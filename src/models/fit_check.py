@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+
+from src.models.batch_compile import LATEX_ENGINE, COMPILE_TIMEOUT
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+FIT_CACHE_DIR = os.getenv("FIT_CACHE_DIR", os.path.join("data", "fit_cache"))
+
+# Typeset without writing a PDF: the .log and .aux are all a probe needs
+DRAFT_FLAGS = {"pdflatex": ["-draftmode"], "lualatex": ["--draftmode"], "xelatex": ["-no-pdf"]}
+
+# Written to the .aux after the last page is shipped out: page count without a PDF
+PAGE_PROBE = (
+    r"\makeatletter\AtEndDocument{\clearpage\immediate\write\@mainaux"
+    r"{\string\fitcheckpages{\number\numexpr\value{page}-1\relax}}}\makeatother" "\n"
+)
+
+_LIPSUM = re.compile(r"\\lipsum\[(\d+)-(\d+)\]")
+_AUX_PAGES = re.compile(r"\\fitcheckpages\{(\d+)\}")
+_LOG_PAGES = re.compile(r"Output written on .*?\((\d+) pages?", re.S)
+_OVERFULL = re.compile(r"^Overfull \\([hv])box \((\d+(?:\.\d+)?)pt too", re.M)
+
+class FitCache:
+    """
+    Probe results keyed by the SHA-256 of engine + source, kept in memory and
+    as one small JSON file per hash under `directory` (None: memory only), so
+    a candidate already typeset by any run is never compiled again.
+    """
+
+    def __init__(self, directory=FIT_CACHE_DIR):
+        self.directory = directory
+        self._memory = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(tex, engine_name):
+        return hashlib.sha256(f"{engine_name}\0{tex}".encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            result = self._memory.get(key)
+        if result is None and self.directory and os.path.exists(self._path(key)):
+            with open(self._path(key)) as f:
+                result = json.load(f)
+            with self._lock:
+                self._memory[key] = result
+        with self._lock:
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._memory[key] = result
+        if self.directory:
+            tmp = f"{self._path(key)}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(result, f)
+            os.replace(tmp, self._path(key))
+
+def parse_probe(log_text, aux_text=""):
+    """Page count and overfull boxes from a compile's .aux/.log (pages None if unknown)."""
+    match = _AUX_PAGES.search(aux_text) or _LOG_PAGES.search(log_text)
+    overfull = [(kind, float(pt)) for kind, pt in _OVERFULL.findall(log_text)]
+    errors = [line[2:].strip() for line in log_text.splitlines() if line.startswith("! ")]
+    return {
+        "pages": int(match.group(1)) if match else None,
+        "overfull_hbox": sum(kind == "h" for kind, _ in overfull),
+        "overfull_vbox": sum(kind == "v" for kind, _ in overfull),
+        "max_overfull_pt": max((pt for _, pt in overfull), default=0.0),
+        "error": errors[0] if errors else None,
+    }
+
+def probe_compile(tex, engine_name=LATEX_ENGINE, timeout=COMPILE_TIMEOUT):
+    """
+    Typesets `tex` once in draft, nonstop mode in a throwaway directory and
+    returns `parse_probe` of its .aux/.log.
+    """
+    source = tex.replace(r"\begin{document}", PAGE_PROBE + r"\begin{document}", 1)
+    with tempfile.TemporaryDirectory(prefix="fitcheck_") as workdir:
+        with open(os.path.join(workdir, "probe.tex"), "w", encoding="utf-8") as f:
+            f.write(source)
+        cmd = [engine_name, *DRAFT_FLAGS.get(engine_name, []), "-interaction=nonstopmode", "-halt-on-error", "probe.tex"]
+        try:
+            proc = subprocess.run(cmd, cwd=workdir, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {"pages": None, "overfull_hbox": 0, "overfull_vbox": 0, "max_overfull_pt": 0.0,
+                    "error": f"timeout after {timeout}s"}
+
+        texts = []
+        for name in ("probe.log", "probe.aux"):
+            path = os.path.join(workdir, name)
+            if os.path.exists(path):
+                with open(path, encoding="latin-1") as f:  # TeX logs are not always valid UTF-8
+                    texts.append(f.read())
+            else:
+                texts.append("")
+    result = parse_probe(*texts)
+    if proc.returncode != 0 and result["error"] is None:
+        result["error"] = f"{engine_name} exited with {proc.returncode}"
+    return result
+
+def trim_paragraphs(tex, keep):
+    """
+    `tex` with only the first `keep` lipsum paragraphs, removed from the end
+    so the component stays where the template put it.
+    """
+    budget = [keep]
+
+    def shorten(match):
+        start, stop = int(match.group(1)), int(match.group(2))
+        count = min(stop - start + 1, budget[0])
+        budget[0] -= count
+        return f"\\lipsum[{start}-{start + count - 1}]" if count else ""
+
+    return _LIPSUM.sub(shorten, tex)
+
+def count_paragraphs(tex):
+    return sum(int(stop) - int(start) + 1 for start, stop in _LIPSUM.findall(tex))
+
+def fit_to_one_page(tex, engine_name=LATEX_ENGINE, cache=None, probe=None, timeout=COMPILE_TIMEOUT):
+    """
+    Returns (tex, report) where the tex typesets to exactly one page. The
+    full document is probed first; if it overflows, the largest number of
+    lipsum paragraphs that still fits is binary-searched, so a document
+    with n paragraphs costs at most 1 + ceil(log2(n + 1)) probes. Probes go
+    through `cache` (content hash), so repeated candidates cost nothing.
+    `probe(tex) -> dict` replaces the LaTeX compile (same keys as `parse_probe`).
+    Raises ValueError if even the component alone does not fit or a probe fails.
+    """
+    probe = probe or (lambda source: probe_compile(source, engine_name, timeout))
+    report = {"compiles": 0, "cache_hits": 0, "paragraphs": None, "of": count_paragraphs(tex)}
+
+    def fits(keep):
+        source = trim_paragraphs(tex, keep)
+        key = FitCache.key(source, engine_name)
+        result = cache.get(key) if cache is not None else None
+        if result is None:
+            result = probe(source)
+            report["compiles"] += 1
+            if cache is not None and result["pages"] is not None:
+                cache.put(key, result)
+        else:
+            report["cache_hits"] += 1
+        if result["pages"] is None:
+            raise ValueError(f"Fit check compile failed: {result['error']}")
+        return result["pages"] <= 1, result
+
+    total = report["of"]
+    ok, result = fits(total)
+    if ok:
+        report.update(paragraphs=total, **result)
+        return tex, report
+
+    # Largest `keep` in [0, total) that fits (fewer paragraphs never add pages)
+    lo, hi, best = 0, total - 1, None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        ok, result = fits(mid)
+        if ok:
+            best = (mid, result)
+            lo = mid + 1
+        else:
+            hi = mid - 1
+    if best is None:
+        raise ValueError("The component alone does not fit on one page.")
+
+    report.update(paragraphs=best[0], **best[1])
+    return trim_paragraphs(tex, best[0]), report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Trim a generated .tex until it typesets to one page.")
+    parser.add_argument("tex", help="Generated .tex file (rewritten in place unless --out).")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--engine", choices=list(DRAFT_FLAGS), default=LATEX_ENGINE)
+    parser.add_argument("--cache-dir", default=FIT_CACHE_DIR, help="Probe result cache (FIT_CACHE_DIR).")
+    args = parser.parse_args()
+
+    if shutil.which(args.engine) is None:
+        raise SystemExit(f"LaTeX engine '{args.engine}' not found in PATH.")
+    with open(args.tex, encoding="utf-8") as f:
+        fitted, report = fit_to_one_page(f.read(), args.engine, FitCache(args.cache_dir))
+    with open(args.out or args.tex, "w", encoding="utf-8") as f:
+        f.write(fitted)
+    logger.info(f"Kept {report['paragraphs']}/{report['of']} paragraphs after {report['compiles']} compiles "
+                f"({report['cache_hits']} cached); overfull boxes: {report['overfull_hbox']}h/{report['overfull_vbox']}v")
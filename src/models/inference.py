@@ -1,28 +1,200 @@
-import joblib
 import argparse
 import os
+import sys
+import uuid
 from datetime import datetime
-import os
+
+# numpy/pandas/joblib and the model are imported/loaded on first prediction:
+# generating a template page needs none of them.
 
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 BASE_SRC = os.path.dirname(CURRENT_DIR) # Pasta 'src'
-OUTPUT_PATH = os.path.join(BASE_SRC, "output")
+OUTPUT_PATH = os.getenv("OUTPUT_DIR", os.path.join(BASE_SRC, "output"))
+
+# Allow `python src/models/inference.py` to import the shared `src.*` modules
+PROJECT_ROOT = os.path.dirname(BASE_SRC)
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
 
-os.makedirs(OUTPUT_PATH, exist_ok=True)
+from src import telemetry  # noqa: E402 (stdlib only, no startup cost)
 
 DEFAULT_MODEL = os.path.join(CURRENT_DIR, "export", "layout_model.joblib")
 
+# Batches above this many rows go to sklearn even with the compiled backend
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "512"))
+
+LAYOUTS = ["full", "top", "bottom", "middle", "left", "right"]
+COMPONENT_TYPES = ["image", "table"]
+POSITIONS = ["top", "middle", "bottom"]
+
 class AcademicEngine:
-    def __init__(self, model_path=None):
+    def __init__(self, model_path=None, backend=None):
         if model_path is None:
             model_path = os.getenv("MODEL_PATH", DEFAULT_MODEL)
-        
-        if os.path.exists(model_path):
-            self.model = joblib.load(model_path)
-            print(f"✅ Modelo carregado com sucesso de: {model_path}")
+        self.model_path = model_path
+
+        # "sklearn" (default) or "compiled" (flattened NumPy trees for small
+        # batches, sklearn above COMPILED_MAX_ROWS or if compilation fails)
+        self.backend = backend or os.getenv("MODEL_BACKEND", "sklearn")
+        self._model = None
+        self._compiled = None
+        self._warned = False
+
+    @property
+    def model(self):
+        """
+        The sklearn forest, loaded on first access (None if the file is missing).
+        Not shared between processes even with `mmap_mode='r'`: sklearn's
+        `Tree.__setstate__` copies the node arrays into its own buffers, so
+        every process holds its own trees. Workers that need one shared copy
+        should use `compiled` (the memory-mapped CompiledForest export), with
+        COMPILED_MAX_ROWS raised so large batches do not load this forest.
+        """
+        if self._model is None:
+            if os.path.exists(self.model_path):
+                import joblib
+                with telemetry.stage("model_load"):
+                    self._model = joblib.load(self.model_path, mmap_mode="r")
+                print(f"✅ Modelo carregado com sucesso de: {self.model_path}")
+            elif not self._warned:
+                self._warned = True
+                print(f"⚠️ Aviso: Modelo não encontrado em {self.model_path}. Lógica padrão ativa.")
+        return self._model
+
+    @property
+    def compiled(self):
+        """
+        CompiledForest for the compiled backend. Memory-mapped from the
+        trainer's `.compiled.joblib` export when it is up to date (processes
+        share its pages), otherwise compiled from the sklearn model.
+        """
+        if self._compiled is None and self.backend == "compiled":
+            from src.models.compiled_forest import CompiledForest, compiled_path
+            path = compiled_path(self.model_path)
+            try:
+                if (os.path.exists(path) and os.path.exists(self.model_path)
+                        and os.path.getmtime(path) >= os.path.getmtime(self.model_path)):
+                    import joblib
+                    self._compiled = joblib.load(path, mmap_mode="r")
+                elif self.model is not None:
+                    self._compiled = CompiledForest.from_sklearn(self.model)
+            except Exception as e:
+                print(f"⚠️ Aviso: Backend compilado indisponível ({e}). Usando sklearn.")
+                self.backend = "sklearn"
+        return self._compiled
+
+    def load(self):
+        """Loads everything predictions need now instead of on the first call."""
+        self.compiled
+        return self.model is not None
+
+    def predict_layout(self, features_df):
+        """
+        Predicts the structural role of every line in `features_df`
+        (layout_features columns; pdf_id/page_number optional).
+        Returns a frame aligned with the input rows holding `label`,
+        `confidence` and one `proba_<class>` column per class.
+        """
+        import numpy as np
+        import pandas as pd
+        from src.models.features import engineer_features, to_model_input
+
+        compiled = self.compiled
+        if compiled is None and self.model is None:
+            raise RuntimeError("No layout model loaded.")
+
+        df = features_df.reset_index(drop=True)
+        if df.empty:
+            return pd.DataFrame(columns=["label", "confidence"])
+
+        engineered = engineer_features(df)
+        X = to_model_input(engineered)
+        if compiled is not None and len(X) <= COMPILED_MAX_ROWS:
+            with telemetry.stage("predict", backend="compiled"):
+                predicted = compiled.predict_proba(X.to_numpy())
         else:
-            print(f"⚠️ Aviso: Modelo não encontrado em {model_path}. Lógica padrão ativa.")
+            with telemetry.stage("predict", backend="sklearn"):
+                predicted = self.model.predict_proba(X)
+        telemetry.inc("predicted_rows_total", len(X))
+
+        classes = np.asarray((compiled if compiled is not None else self.model).classes_)
+        proba = np.empty((len(df), len(classes)))
+        proba[engineered.index.to_numpy()] = predicted
+
+        best = proba.argmax(axis=1)
+        result = pd.DataFrame({
+            "label": classes.take(best),
+            "confidence": proba[np.arange(len(df)), best],
+        }, index=features_df.index)
+        for i, cls in enumerate(classes):
+            result[f"proba_{cls}"] = proba[:, i]
+        return result
+
+    def predict_layout_batch(self, frames):
+        """
+        Predicts many pages/documents with a single model call.
+        `frames` is a list of DataFrames (one per page or document); returns a
+        list of result frames in the same order, as `predict_layout` would.
+        """
+        import numpy as np
+        import pandas as pd
+
+        frames = list(frames)
+        if not frames:
+            return []
+
+        batch = pd.concat(
+            [f.assign(_frame=i) for i, f in enumerate(frames)], ignore_index=True
+        )
+        # Keep documents from different frames apart even if their pdf_ids collide
+        doc_keys = batch[["_frame", "pdf_id"]] if "pdf_id" in batch else batch[["_frame"]]
+        batch["pdf_id"] = pd.MultiIndex.from_frame(doc_keys.fillna(-1)).factorize()[0]
+
+        predictions = self.predict_layout(batch.drop(columns="_frame"))
+        bounds = np.cumsum([0] + [len(f) for f in frames])
+        return [
+            predictions.iloc[start:end].set_axis(frame.index)
+            for frame, start, end in zip(frames, bounds[:-1], bounds[1:])
+        ]
+
+    def choose_layout(self, source, c_type=None):
+        """
+        Picks the template closest to a source document without compiling
+        anything: the model labels the lines of the page holding the largest
+        component (a figure, or a table found from the line geometry), and
+        its size/position and the text around it are scored against the
+        precomputed layout index (`src.models.layout_index`).
+        `source` is a PDF path, an `ExtractedLines` or a DataFrame of
+        layout_features columns. `c_type` restricts the component to one
+        type; by default it is inferred ("image" if the source has none).
+        Returns a LayoutChoice (layout, pos, c_type, distance).
+        """
+        import numpy as np
+        import pandas as pd
+        from src.models.layout_index import component_page, describe_source, rank_layouts
+
+        if isinstance(source, (str, os.PathLike)):
+            from src.data.extraction import extract_pdf
+            source = extract_pdf(source)
+        frame = pd.DataFrame(source.records) if hasattr(source, "records") else source
+
+        with telemetry.stage("choose_layout"):
+            page = component_page(frame, c_type)
+            if page is None:
+                return rank_layouts(None, c_type or "image")[0]
+            if "page_number" in frame:
+                frame = frame[frame["page_number"] == page]
+
+            # Only the component's page is labeled, so selection stays in milliseconds
+            labels = np.full(len(frame), "body", dtype=object)
+            text_rows = ~frame["is_image"].fillna(False).to_numpy(bool) if "is_image" in frame else np.ones(len(frame), bool)
+            if self.model is not None and text_rows.any():
+                labels[text_rows] = self.predict_layout(frame[text_rows])["label"].to_numpy()
+            elif "label" in frame:
+                labels[text_rows] = frame["label"].to_numpy()[text_rows]
+            labels[~text_rows] = "image"
+            return rank_layouts(describe_source(frame, labels, c_type), c_type or "image")[0]
 
     def _get_header(self):
         return r"""\documentclass[10pt, a4paper]{article}
@@ -96,34 +268,54 @@ Limit & 1 Page & Active \\ \bottomrule
         else: 
             return f"\\lipsum[1-5]\n\\begin{{wrapfigure}}[{lines}]{{{side}}}{{0.48\\textwidth}}\n{comp}\n\\end{{wrapfigure}}\n\\lipsum[11-12]"
 
+def build_document(engine, layout, c_type="image", pos="top"):
+    """Complete .tex source for one layout request."""
+    if layout in ["left", "right"]:
+        side = "l" if layout == "left" else "r"
+        content = engine.layout_side(side, pos, c_type)
+    else:
+        mapping = {
+            "full": engine.layout_full, "top": engine.layout_top,
+            "bottom": engine.layout_bottom, "middle": engine.layout_middle
+        }
+        content = mapping[layout](c_type)
+
+    return engine._get_header() + content + engine._get_footer()
+
+def unique_suffix():
+    """Timestamp plus a random tag, so files generated in the same second never collide."""
+    return f"{datetime.now().strftime('%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("layout", choices=["full", "top", "bottom", "middle", "left", "right"])
-    parser.add_argument("type", choices=["image", "table"], nargs="?", default="image")
-    parser.add_argument("--pos", choices=["top", "middle", "bottom"], default="top")
+    parser.add_argument("layout", choices=LAYOUTS + ["auto"])
+    parser.add_argument("type", choices=COMPONENT_TYPES, nargs="?", default=None,
+                        help="Component type (default: image; with auto, inferred from the source's largest figure or table).")
+    parser.add_argument("--pos", choices=POSITIONS, default="top")
+    parser.add_argument("--source", default=None, help="PDF whose layout `auto` reproduces.")
     
     args = parser.parse_args()
     engine = AcademicEngine()
     
-    if args.layout in ["left", "right"]:
-        side = "l" if args.layout == "left" else "r"
-        content = engine.layout_side(side, args.pos, args.type)
-    else:
-        mapping = {
-            "full": engine.layout_full, "top": engine.layout_top,
-            "bottom": engine.layout_bottom, "middle": engine.layout_middle
-        }
-        content = mapping[args.layout](args.type)
+    if args.layout == "auto":
+        if not args.source:
+            parser.error("the auto layout needs --source PDF")
+        choice = engine.choose_layout(args.source, args.type)
+        args.layout, args.pos, args.type = choice.layout, choice.pos, choice.c_type
+        print(f"🔎 Layout escolhido: {choice.layout} ({choice.pos}, {choice.c_type}), distância {choice.distance}")
+    args.type = args.type or "image"
 
-    final_tex = engine._get_header() + content + engine._get_footer()
+    with telemetry.stage("generate_tex", layout=args.layout):
+        final_tex = build_document(engine, args.layout, args.type, args.pos)
     
-    ts = datetime.now().strftime("%H%M%S")
-    filename = os.path.join(OUTPUT_PATH, f"FINAL_{args.layout}_{args.pos}_{ts}.tex")
+    os.makedirs(OUTPUT_PATH, exist_ok=True)
+    filename = os.path.join(OUTPUT_PATH, f"FINAL_{args.layout}_{args.pos}_{unique_suffix()}.tex")
     
     with open(filename, "w", encoding="utf-8") as f:
         f.write(final_tex)
     
     print(f"✅ Gerado (Página Única Real): {filename}")
+    telemetry.write_run("inference")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,287 @@
+import re
+import argparse
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+
+import numpy as np
+
+from src.data.labeling import DEFAULT_RULES
+from src.models.inference import AcademicEngine, COMPONENT_TYPES, POSITIONS
+
+# Text block of the template header: A4 with 2cm side/top and 2.5cm bottom
+# margins, plus \enlargethispage{2cm} (in pt, 1cm = 28.4528pt)
+TEXT_WIDTH_PT = 17.0 * 28.4528
+TEXT_HEIGHT_PT = (29.7 - 2.0 - 2.5 + 2.0) * 28.4528
+BASELINE_PT = 12.0  # \baselineskip of the 10pt article class
+
+# Heights of `_generate_component` blocks with their captions, estimated from the markup
+COMPONENT_HEIGHT_PT = {"image": 110.0, "table": 85.0}
+
+# `layout_full` fills the page with 8 lipsum paragraphs: one paragraph is 1/8 of the text block
+PARAGRAPH_AREA = TEXT_WIDTH_PT * TEXT_HEIGHT_PT / 8
+
+# Relative weight of each source/template difference in a candidate's distance
+SCORE_WEIGHTS = {"comp_width": 2.0, "comp_height": 1.0, "comp_x": 1.0, "comp_y": 1.5, "text_share": 1.0}
+# Per unit of estimated page overflow beyond the tolerance of the area estimate
+OVERFLOW_PENALTY = 4.0
+FILL_TOLERANCE = 0.05
+
+# Images smaller than this fraction of the page are logos/icons, not the component
+MIN_COMPONENT_AREA = 0.01
+
+# Table regions (`table_regions`): text lines within ROW_TOLERANCE_PT of one baseline form
+# a visual row; a fragment is a cell when it covers less than TABLE_MAX_FILL of the spacing
+# to its neighbour (text columns fill theirs); TABLE_MIN_ROWS rows of TABLE_MIN_CELLS cells,
+# at most TABLE_MAX_GAP_PT apart, make a table
+ROW_TOLERANCE_PT = 2.0
+TABLE_MAX_FILL = 0.5
+TABLE_MIN_CELLS = 3
+TABLE_MIN_ROWS = 3
+TABLE_MAX_GAP_PT = 20.0
+
+_LIPSUM = re.compile(r"\\lipsum\[(\d+)-(\d+)\]")
+_WRAP = re.compile(r"\\begin\{wrapfigure\}\[(\d+)\]\{([lr])\}\{([\d.]+)\\textwidth\}")
+_COMPONENT = re.compile(r"\\begin\{(?:wrapfigure|tcolorbox|center)\}")
+
+@dataclass(frozen=True)
+class LayoutSpec:
+    """
+    Space one template uses on the page. Component fields are fractions of
+    the text block (0 for `full`, which has no component); `fill` is the
+    estimated fraction of the page taken by text and component (>1 overflows).
+    """
+    layout: str
+    pos: str
+    c_type: str
+    comp_width: float
+    comp_height: float
+    comp_x: float
+    comp_y: float
+    text_share: float
+    paragraphs: int
+    fill: float
+
+@dataclass(frozen=True)
+class LayoutChoice:
+    layout: str
+    pos: str
+    c_type: str
+    distance: float
+
+def _paragraphs(tex):
+    return sum(int(stop) - int(start) + 1 for start, stop in _LIPSUM.findall(tex))
+
+def _template_spec(layout, pos, c_type, content):
+    """Reads the template geometry from its markup: lipsum ranges, wrapfigure size and component position."""
+    paragraphs = _paragraphs(content)
+    text_area = paragraphs * PARAGRAPH_AREA
+    match = _COMPONENT.search(content)
+    if match is None:
+        return LayoutSpec(layout, pos, c_type, 0.0, 0.0, 0.0, 0.0, 1.0, paragraphs,
+                          text_area / (TEXT_WIDTH_PT * TEXT_HEIGHT_PT))
+
+    wrap = _WRAP.search(content)
+    if wrap:
+        height_pt = int(wrap.group(1)) * BASELINE_PT
+        width = float(wrap.group(3))
+        x = width / 2 if wrap.group(2) == "l" else 1 - width / 2
+    else:
+        height_pt = COMPONENT_HEIGHT_PT[c_type]
+        width, x = 1.0, 0.5
+
+    before = content[:match.start()]
+    if r"\vspace{\fill}" in before:
+        top_pt = TEXT_HEIGHT_PT - height_pt  # Pushed to the bottom of the page
+    else:
+        top_pt = _paragraphs(before) * PARAGRAPH_AREA / TEXT_WIDTH_PT
+    y = min(top_pt + height_pt / 2, TEXT_HEIGHT_PT - height_pt / 2) / TEXT_HEIGHT_PT
+
+    comp_area = width * TEXT_WIDTH_PT * height_pt
+    return LayoutSpec(
+        layout, pos, c_type, width, height_pt / TEXT_HEIGHT_PT, x, y,
+        text_area / (text_area + comp_area), paragraphs,
+        (text_area + comp_area) / (TEXT_WIDTH_PT * TEXT_HEIGHT_PT),
+    )
+
+@lru_cache(maxsize=1)
+def layout_index():
+    """
+    One LayoutSpec per distinct template (`pos` only changes left/right),
+    computed once from the same methods that generate the .tex.
+    """
+    engine = AcademicEngine()
+    specs = [_template_spec("full", "top", "image", engine.layout_full("image"))]
+    for c_type in COMPONENT_TYPES:
+        for layout, method in [("top", engine.layout_top), ("bottom", engine.layout_bottom),
+                               ("middle", engine.layout_middle)]:
+            specs.append(_template_spec(layout, "top", c_type, method(c_type)))
+        for layout, side in [("left", "l"), ("right", "r")]:
+            for pos in POSITIONS:
+                specs.append(_template_spec(layout, pos, c_type, engine.layout_side(side, pos, c_type)))
+    return tuple(specs)
+
+@lru_cache(maxsize=len(COMPONENT_TYPES))
+def _index_matrix(c_type):
+    """Candidates with a `c_type` component and their features as one array, for vectorized scoring."""
+    specs = [s for s in layout_index() if s.c_type == c_type and s.layout != "full"]
+    matrix = np.array([[getattr(s, name) for name in SCORE_WEIGHTS] for s in specs])
+    fill = np.array([s.fill for s in specs])
+    return specs, matrix, fill
+
+def _is_image(frame):
+    if "is_image" not in frame:
+        return np.zeros(len(frame), bool)
+    return frame["is_image"].fillna(False).to_numpy(bool)
+
+def _geometry(frame):
+    x0 = frame["x0"].to_numpy(float)
+    y0 = frame["y0"].to_numpy(float)
+    width = frame["width"].to_numpy(float)
+    height = frame["height"].to_numpy(float)
+    page = frame["page_number"].to_numpy() if "page_number" in frame else np.zeros(len(frame), int)
+    return x0, y0, width, height, page
+
+def _cells(row, x0, width):
+    """The fragments of a visual row (indices, any order) narrow enough to be table cells, left to right."""
+    row = row[np.argsort(x0[row], kind="stable")]
+    pitch = np.diff(x0[row])
+    if not len(pitch):
+        return row[:0]
+    # Spacing to the next fragment (to the previous one for the last)
+    pitch = np.maximum(np.append(pitch, pitch[-1]), 1.0)
+    return row[width[row] < TABLE_MAX_FILL * pitch]
+
+def table_regions(frame):
+    """
+    Boxes (page, x0, y0, width, height) of table-like regions among the text
+    lines of `frame`: at least TABLE_MIN_ROWS visual rows, each with at least
+    TABLE_MIN_CELLS cell-sized fragments, stacked at most TABLE_MAX_GAP_PT
+    apart over overlapping columns. Running text, whose lines fill their
+    columns, never qualifies.
+    """
+    x0, y0, width, height, page = _geometry(frame)
+    order = np.lexsort((x0, y0, page))
+    order = order[~_is_image(frame)[order]]
+
+    regions, current = [], None  # current: [page, left, top, right, bottom, rows]
+    start = 0
+    for i in range(1, len(order) + 1):
+        first = order[start]
+        if i < len(order) and page[order[i]] == page[first] and y0[order[i]] - y0[first] <= ROW_TOLERANCE_PT:
+            continue
+        cells = _cells(order[start:i], x0, width)
+        start = i
+        if len(cells) < TABLE_MIN_CELLS:
+            continue
+        box = [page[first], x0[cells].min(), y0[cells].min(), (x0 + width)[cells].max(), (y0 + height)[cells].max()]
+        if (current is not None and current[0] == box[0] and box[2] - current[4] <= TABLE_MAX_GAP_PT
+                and box[1] < current[3] and box[3] > current[1]):
+            current[1:5] = min(current[1], box[1]), current[2], max(current[3], box[3]), max(current[4], box[4])
+            current[5] += 1
+            continue
+        if current is not None and current[5] >= TABLE_MIN_ROWS:
+            regions.append(current)
+        current = box + [1]
+    if current is not None and current[5] >= TABLE_MIN_ROWS:
+        regions.append(current)
+    return [(p, left, top, right - left, bottom - top) for p, left, top, right, bottom, _ in regions]
+
+def components(frame, labels=None, c_type=None):
+    """
+    Candidate components of `frame` as (c_type, page, x0, y0, width, height):
+    image blocks (rows with is_image, or labeled "image") and `table_regions`.
+    `c_type` keeps only that kind.
+    """
+    found = []
+    if c_type in (None, "image"):
+        is_image = _is_image(frame)
+        if labels is not None:
+            is_image = is_image | (np.asarray(labels, dtype=object) == "image")
+        x0, y0, width, height, page = _geometry(frame)
+        found += [("image", page[i], x0[i], y0[i], width[i], height[i]) for i in np.flatnonzero(is_image)]
+    if c_type in (None, "table"):
+        found += [("table", *region) for region in table_regions(frame)]
+    return found
+
+def _largest(found):
+    return max(found, key=lambda c: c[4] * c[5]) if found else None
+
+def component_page(frame, c_type=None):
+    """Page number of the largest component (figure or table, or only `c_type`) in `frame` (None without any)."""
+    best = _largest(components(frame, c_type=c_type))
+    return None if best is None else best[1]
+
+def describe_source(frame, labels, c_type=None):
+    """
+    Geometry of the dominant component of a document: its largest image
+    block or table region (only `c_type` if given), relative to the text
+    block of its page, plus its "c_type"; None if it has neither.
+    `frame` holds layout_features columns; `labels` the label of every row.
+    """
+    labels = np.asarray(labels, dtype=object)
+    best = _largest(components(frame, labels, c_type))
+    if best is None:
+        return None
+    kind, comp_page, cx, cy, cw, ch = best
+
+    x0, y0, width, height, page = _geometry(frame)
+    page_w = frame["page_width"].fillna(595.0).to_numpy(float) if "page_width" in frame else np.full(len(frame), 595.0)
+    page_h = frame["page_height"].fillna(842.0).to_numpy(float) if "page_height" in frame else np.full(len(frame), 842.0)
+    ref = int(np.flatnonzero(page == comp_page)[0])
+    if cw * ch < MIN_COMPONENT_AREA * page_w[ref] * page_h[ref]:
+        return None
+
+    # Text block of that page: the extent of its text lines outside the running header/footer
+    # bands of the labeling rules and the component itself (the page itself if it has none)
+    is_image = _is_image(frame) | (labels == "image")
+    inside = (x0 >= cx - ROW_TOLERANCE_PT) & (x0 + width <= cx + cw + ROW_TOLERANCE_PT) \
+        & (y0 >= cy - ROW_TOLERANCE_PT) & (y0 + height <= cy + ch + ROW_TOLERANCE_PT)
+    in_margin = (y0 < page_h * DEFAULT_RULES.header_y) | (y0 > page_h * DEFAULT_RULES.footer_y)
+    on_page = (page == comp_page) & ~is_image & ~inside & ~in_margin & (labels != "footer")
+    if on_page.any():
+        left, top = x0[on_page].min(), y0[on_page].min()
+        right, bottom = (x0 + width)[on_page].max(), (y0 + height)[on_page].max()
+    else:
+        left, top, right, bottom = 0.0, 0.0, page_w[ref], page_h[ref]
+    left, top = min(left, cx), min(top, cy)
+    right, bottom = max(right, cx + cw), max(bottom, cy + ch)
+    block_w, block_h = max(right - left, 1.0), max(bottom - top, 1.0)
+
+    body = on_page & (labels == "body")
+    text_area = float((width * height)[body].sum())
+    return {
+        "c_type": kind,
+        "comp_width": min(cw / block_w, 1.0),
+        "comp_height": min(ch / block_h, 1.0),
+        "comp_x": (cx + cw / 2 - left) / block_w,
+        "comp_y": (cy + ch / 2 - top) / block_h,
+        "text_share": text_area / (text_area + cw * ch),
+    }
+
+def rank_layouts(source, c_type="image"):
+    """
+    Candidates for a `describe_source` result, nearest first, as LayoutChoice,
+    among the templates of the source's component type (`c_type` without one).
+    Distance is the weighted L1 gap to each template in the index plus a
+    penalty for templates estimated to overflow the page.
+    """
+    if source is None:
+        return [LayoutChoice("full", "top", c_type, 0.0)]
+    c_type = source.get("c_type", c_type)
+    specs, matrix, fill = _index_matrix(c_type)
+    target = np.array([source[name] for name in SCORE_WEIGHTS])
+    distance = np.abs(matrix - target) @ np.array(list(SCORE_WEIGHTS.values()))
+    distance += OVERFLOW_PENALTY * np.maximum(fill - 1.0 - FILL_TOLERANCE, 0.0)
+    return [
+        LayoutChoice(specs[i].layout, specs[i].pos, c_type, round(float(distance[i]), 4))
+        for i in np.argsort(distance, kind="stable")
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Print the precomputed layout index.")
+    parser.parse_args()
+    header = ["layout", "pos", "c_type", "comp_width", "comp_height", "comp_x", "comp_y", "text_share", "paragraphs", "fill"]
+    print(" ".join(f"{h:>11}" for h in header))
+    for spec in layout_index():
+        values = asdict(spec)
+        print(" ".join(f"{values[h]:>11.3f}" if isinstance(values[h], float) else f"{values[h]:>11}" for h in header))
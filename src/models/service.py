@@ -0,0 +1,271 @@
+import os
+import json
+import time
+import queue
+import logging
+import argparse
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+from src import telemetry
+from src.models.inference import AcademicEngine, LAYOUTS, COMPONENT_TYPES, POSITIONS, build_document
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+logger = logging.getLogger(__name__)
+
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8000"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "4096"))
+LATENCY_WINDOW = 10_000  # Latest requests kept per endpoint for percentiles
+
+# Line fields a /predict row must carry (pdf_id and page_number are optional)
+REQUIRED_FIELDS = ['font_size', 'is_bold', 'x0', 'y0', 'width', 'height']
+
+class MicroBatcher:
+    """
+    Collects concurrent prediction requests and runs them as one
+    `predict_layout_batch` call. A batch closes when `max_wait` seconds
+    have passed since its first request or it holds `max_rows` rows.
+    """
+
+    def __init__(self, engine, max_wait=BATCH_MAX_WAIT_MS / 1000, max_rows=BATCH_MAX_ROWS):
+        self.engine = engine
+        self.max_wait = max_wait
+        self.max_rows = max_rows
+        self.batches = 0
+        self.batched_requests = 0
+        self._queue = queue.Queue()
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def submit(self, frame):
+        """Queues one DataFrame of lines; returns a Future of its prediction frame."""
+        future = Future()
+        self._queue.put((frame, future))
+        return future
+
+    def _run(self):
+        while True:
+            pending = [self._queue.get()]
+            rows = len(pending[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_rows:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(item)
+                rows += len(item[0])
+
+            frames, futures = zip(*pending)
+            try:
+                results = self.engine.predict_layout_batch(frames)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            self.batches += 1
+            self.batched_requests += len(pending)
+
+class LatencyStats:
+    """Thread-safe request counts and latency percentiles per endpoint."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._latencies = {}
+        self._counts = {}
+        self._window = window
+
+    def record(self, endpoint, seconds):
+        with self._lock:
+            self._latencies.setdefault(endpoint, deque(maxlen=self._window)).append(seconds)
+            self._counts[endpoint] = self._counts.get(endpoint, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            snapshot = {k: np.array(v) for k, v in self._latencies.items()}
+            counts = dict(self._counts)
+        return {
+            endpoint: {
+                "count": counts[endpoint],
+                "p50_ms": round(float(np.percentile(values, 50)) * 1000, 3),
+                "p90_ms": round(float(np.percentile(values, 90)) * 1000, 3),
+                "p99_ms": round(float(np.percentile(values, 99)) * 1000, 3),
+                "max_ms": round(float(values.max()) * 1000, 3),
+            }
+            for endpoint, values in snapshot.items()
+        }
+
+class LayoutRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health    -> {"status": "ok", "model_loaded": bool}
+    GET  /metrics   -> latency percentiles per endpoint and batching counters
+    GET  /metrics/prometheus -> pipeline telemetry (TELEMETRY=1) in the Prometheus text format
+    POST /predict   {"rows": [{font_size, is_bold, x0, y0, width, height, ...}]}
+                    -> {"label": [...], "confidence": [...]}
+    POST /generate  {"layout", "type", "pos"} -> {"tex": "..."}
+                    {"layout": "auto", "rows": [...]} -> {"tex", "layout", "pos", "type", "distance"}
+    """
+    protocol_version = "HTTP/1.1"  # Keep-alive, so load tests measure the service, not TCP setup
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        start = time.perf_counter()
+        if self.path == "/health":
+            self._send(200, {"status": "ok", "model_loaded": self.server.engine.model is not None})
+            self.server.stats.record(self.path, time.perf_counter() - start)
+        elif self.path == "/metrics":
+            batcher = self.server.batcher
+            self._send(200, {
+                "latency": self.server.stats.summary(),
+                "batches": batcher.batches,
+                "batched_requests": batcher.batched_requests,
+                "uptime_seconds": round(time.monotonic() - self.server.started_at, 3),
+            })
+        elif self.path == "/metrics/prometheus":
+            body = telemetry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        try:
+            payload = self._read_json()
+        except ValueError as e:
+            self._send(400, {"error": f"Invalid JSON: {e}"})
+            return
+        if not isinstance(payload, dict):
+            self._send(400, {"error": "Body must be a JSON object."})
+            return
+
+        if self.path == "/predict":
+            self._predict(payload)
+        elif self.path == "/generate":
+            self._generate(payload)
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+        self.server.stats.record(self.path, time.perf_counter() - start)
+
+    def _predict(self, payload):
+        if self.server.engine.model is None:
+            self._send(503, {"error": "No layout model loaded."})
+            return
+        rows = payload.get("rows")
+        if not isinstance(rows, list) or not rows:
+            self._send(400, {"error": "'rows' must be a non-empty list of line objects."})
+            return
+        # Validate here so one bad request cannot fail the whole batch it joins
+        try:
+            frame = pd.DataFrame(rows)
+            frame[REQUIRED_FIELDS] = frame[REQUIRED_FIELDS].apply(pd.to_numeric)
+        except (KeyError, ValueError, TypeError) as e:
+            self._send(400, {"error": f"Bad rows: {e}"})
+            return
+        try:
+            result = self.server.batcher.submit(frame).result()
+        except Exception as e:
+            logger.error(f"Prediction failed: {e}")
+            self._send(500, {"error": "Prediction failed."})
+            return
+        self._send(200, {"label": result["label"].tolist(), "confidence": result["confidence"].round(6).tolist()})
+
+    def _generate(self, payload):
+        layout = payload.get("layout")
+        c_type = payload.get("type")
+        pos = payload.get("pos", "top")
+        choice = None
+        if layout == "auto":
+            # Template and component type chosen from the source page's lines (layout_features rows,
+            # images with is_image); a "type" restricts the component to that type
+            rows = payload.get("rows")
+            if not isinstance(rows, list) or not rows or c_type not in (None, *COMPONENT_TYPES):
+                self._send(400, {"error": "'auto' needs 'rows': a non-empty list of line/image objects."})
+                return
+            try:
+                choice = self.server.engine.choose_layout(pd.DataFrame(rows), c_type)
+            except (KeyError, ValueError, TypeError) as e:
+                self._send(400, {"error": f"Bad rows: {e}"})
+                return
+            except Exception as e:
+                logger.error(f"Layout selection failed: {e}")
+                self._send(500, {"error": "Layout selection failed."})
+                return
+            layout, pos, c_type = choice.layout, choice.pos, choice.c_type
+        else:
+            c_type = c_type or "image"
+            if layout not in LAYOUTS or c_type not in COMPONENT_TYPES or pos not in POSITIONS:
+                self._send(400, {"error": f"Invalid layout request: {payload}"})
+                return
+        try:
+            tex = build_document(self.server.engine, layout, c_type, pos)
+        except Exception as e:
+            logger.error(f"Generation failed: {e}")
+            self._send(500, {"error": "Generation failed."})
+            return
+        if choice is None:
+            self._send(200, {"tex": tex})
+        else:
+            self._send(200, {"tex": tex, "layout": layout, "pos": pos, "type": c_type, "distance": choice.distance})
+
+def create_server(host=SERVICE_HOST, port=SERVICE_PORT, max_wait_ms=BATCH_MAX_WAIT_MS, max_rows=BATCH_MAX_ROWS):
+    """Builds the HTTP server with a warm engine and its micro-batcher attached."""
+    server = ThreadingHTTPServer((host, port), LayoutRequestHandler)
+    server.daemon_threads = True
+    server.started_at = time.monotonic()
+    server.engine = AcademicEngine()
+    server.engine.load()  # Warm: pay the model load before the first request, not during it
+    server.batcher = MicroBatcher(server.engine, max_wait_ms / 1000, max_rows)
+    server.stats = LatencyStats()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve layout generation and prediction over HTTP.")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--max-wait-ms", type=float, default=BATCH_MAX_WAIT_MS)
+    parser.add_argument("--max-rows", type=int, default=BATCH_MAX_ROWS)
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    args = parser.parse_args()
+
+    if args.telemetry:
+        telemetry.enable()
+
+    server = create_server(args.host, args.port, args.max_wait_ms, args.max_rows)
+    logger.info(f"Serving on http://{args.host}:{args.port} (batch window {args.max_wait_ms} ms)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
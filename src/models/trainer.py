@@ -1,32 +1,166 @@
 import pandas as pd
 import joblib
 import os
+import json
 import logging
+import argparse
 import numpy as np
-from sqlalchemy import create_engine
+from collections import Counter
+from datetime import datetime, timezone
+from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
+from sklearn.utils.class_weight import compute_class_weight
+from src import telemetry
+from src.models.compiled_forest import CompiledForest, compact_sklearn, compiled_path
+from src.models.features import FEATURES, collect_features, read_layout_chunks, read_pdf_chunks, stream_features
+from src.data.snapshot import exported_pdf_ids, read_snapshot_chunks
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 logger = logging.getLogger(__name__)
 
-def train_layout_model():
+OUTPUT_DIR = 'src/models/export'
+MODEL_PATH = os.path.join(OUTPUT_DIR, 'layout_model.joblib')
+META_PATH = os.path.join(OUTPUT_DIR, 'layout_model.meta.json')
+ANCHORS_PATH = os.path.join(OUTPUT_DIR, 'layout_model.anchors.joblib')
+# {pdf_id: rows version} of every PDF the saved incremental model has seen (train or holdout)
+COVERED_PATH = os.path.join(OUTPUT_DIR, 'layout_model.pdfs.json')
+
+HOLDOUT_FRACTION = 0.2
+ANCHORS_PER_CLASS = 50
+
+# Forest of the full training; `src.models.tuning` searches around it
+DEFAULT_PARAMS = {
+    'n_estimators': 200,
+    'max_depth': 15,
+    'min_samples_leaf': 4,
+    'class_weight': 'balanced',
+    'random_state': 42,
+    'n_jobs': -1,  # Use all cores
+}
+
+def is_holdout(pdf_ids, fraction=HOLDOUT_FRACTION):
+    """
+    Stable PDF-level split (Knuth multiplicative hash of pdf_id): a PDF lands
+    on the same side in every run, however the table grows.
+    """
+    h = (np.asarray(pdf_ids, dtype=np.uint64) * np.uint64(2654435761)) % np.uint64(2**32)
+    return h < np.uint64(fraction * 2**32)
+
+def export_model(model, path=MODEL_PATH, compact=None):
+    """
+    Dumps the forest plus its CompiledForest arrays, uncompressed (inference
+    memory-maps the latter, so processes share them), written last so they
+    are never older than it.
+    `compact` ({'max_depth': ..., 'float32': ...}) applies to both exports, so
+    inference labels rows the same whichever backend a batch is routed to.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    compiled = CompiledForest.from_sklearn(model)
+    if compact:
+        compiled = compiled.compact(**compact)
+        model = compact_sklearn(model, **compact)
+    joblib.dump(model, path, compress=0)
+    joblib.dump(compiled, compiled_path(path), compress=0)
+
+def load_params(path):
+    """(params, compact) from a tuning selection file (`src.models.tuning`), over DEFAULT_PARAMS."""
+    with open(path) as f:
+        selected = json.load(f)
+    return {**DEFAULT_PARAMS, **selected.get('params', {})}, selected.get('compact') or None
+
+def _create_engine():
     load_dotenv()
     db_url = os.getenv("DATABASE_URL")
     if not db_url:
         logger.error("DATABASE_URL is missing.")
-        return
+        return None
+    return create_engine(db_url)
+
+def _feature_sources(chunksize, engine=None, snapshot=None, pdf_ids=None):
+    """(chunk_source, stats_source) for `stream_features`, from the DB or a snapshot (only `pdf_ids` if given)."""
+    if snapshot:
+        return (
+            lambda: read_snapshot_chunks(snapshot, pdf_ids=pdf_ids),
+            lambda: read_snapshot_chunks(snapshot, ['pdf_id', 'font_size'], pdf_ids=pdf_ids),
+        )
+    if pdf_ids is not None:
+        return (
+            lambda: read_pdf_chunks(engine, pdf_ids, chunksize),
+            lambda: read_pdf_chunks(engine, pdf_ids, chunksize, ['pdf_id', 'font_size'], ordered=False),
+        )
+    return (
+        lambda: read_layout_chunks(engine, chunksize),
+        lambda: read_layout_chunks(engine, chunksize, ['pdf_id', 'font_size'], ordered=False),
+    )
+
+def completed_pdfs(engine=None, snapshot=None):
+    """
+    {pdf_id: rows version} of the PDFs available for training. In the DB these
+    are processed PDFs (rows and flag commit together), versioned by content
+    hash and extractor/labeler versions, so re-extracted or re-labeled PDFs
+    count as new; snapshot rows never change.
+    """
+    if snapshot:
+        return {int(pdf_id): "snapshot" for pdf_id in exported_pdf_ids(snapshot)}
+    query = text(
+        "SELECT id, content_sha256, extractor_version, labeler_version FROM pdf_metadata WHERE processed = :done"
+    )
+    with engine.connect() as conn:
+        rows = conn.execute(query, {"done": True}).all()
+    return {pdf_id: f"{sha}:{extractor}:{labeler}" for pdf_id, sha, extractor, labeler in rows}
 
-    engine = create_engine(db_url)
+def class_weights(engine=None, snapshot=None, pdf_ids=None, batch=1000):
+    """
+    'balanced' class weights as a fixed {label: weight}, from the label counts
+    of the training (non-holdout) rows of `pdf_ids`. Warm-started fits need it:
+    'balanced' would weight each chunk's trees by that chunk's own balance.
+    """
+    counts = Counter()
+    if snapshot:
+        for chunk in read_snapshot_chunks(snapshot, ['pdf_id', 'label'], pdf_ids=pdf_ids):
+            chunk = chunk[chunk['label'].notna() & ~is_holdout(chunk['pdf_id'])]
+            counts.update(chunk['label'].astype(str).value_counts().to_dict())
+    else:
+        pdf_ids = sorted(int(pdf_id) for pdf_id in pdf_ids)
+        with engine.connect() as conn:
+            for start in range(0, len(pdf_ids), batch):
+                query = text(
+                    "SELECT pdf_id, label, COUNT(*) FROM layout_features "
+                    f"WHERE pdf_id IN ({', '.join(map(str, pdf_ids[start:start + batch]))}) AND label IS NOT NULL "
+                    "GROUP BY pdf_id, label"
+                )
+                rows = conn.execute(query).all()
+                for (_, label, n), held_out in zip(rows, is_holdout([r[0] for r in rows])):
+                    if not held_out:
+                        counts[label] += n
+    if not counts:
+        return {}
+    classes = np.array(sorted(counts))
+    weights = compute_class_weight('balanced', classes=classes, y=classes,
+                                   sample_weight=[counts[c] for c in classes])
+    return {str(c): float(w) for c, w in zip(classes, weights)}
+
+def _forget_incremental():
+    """Drops the incremental trainer's sidecar files (they describe a model that is being replaced)."""
+    for path in (META_PATH, COVERED_PATH, ANCHORS_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+def train_layout_model(snapshot=None, chunksize=200_000, model_path=MODEL_PATH, params=None, compact=None):
+    engine = None
+    if not snapshot:
+        engine = _create_engine()
+        if engine is None:
+            return
     
-    # 1. Load Data including new dimensions (width, height)
-    logger.info("Loading data from database...")
-    query = "SELECT pdf_id, page_number, font_size, is_bold, x0, y0, width, height, label FROM layout_features"
+    # 1-3. Stream data from the database (or a snapshot), engineering features chunk by chunk
+    logger.info(f"Loading data from {'snapshot ' + snapshot if snapshot else 'database'}...")
     try:
-        df = pd.read_sql(query, engine)
+        with telemetry.stage("load_features"):
+            df = collect_features(stream_features(*_feature_sources(chunksize, engine, snapshot=snapshot)))
     except Exception as e:
         logger.error(f"Database error: {e}")
         return
@@ -35,73 +169,194 @@ def train_layout_model():
         logger.error("No data found. Please run seed_data.py and then pdf_processor.py.")
         return
 
-    # 2. Preprocessing
-    df['is_bold'] = df['is_bold'].fillna(False).astype(int)
-    df['font_size'] = df['font_size'].fillna(0)
-    df['label'] = df['label'].fillna('body')
-    
-    # Sort for context calculation
-    df = df.sort_values(['pdf_id', 'page_number', 'y0']).reset_index(drop=True)
-
-    # 3. Feature Engineering
-    # Distance from previous line (context)
-    df['dist_prev_y'] = df.groupby(['pdf_id', 'page_number'])['y0'].diff().fillna(0)
-    
-    # Center deviation (assuming standard ~600pt width for features)
-    df['center_dev'] = abs(300 - (df['x0'] + df['width']/2))
-    
-    df['is_first_page'] = (df['page_number'] == 0).astype(int)
-    
-    # Relative font size (Z-score per PDF)
-    df['rel_font_size'] = df.groupby('pdf_id')['font_size'].transform(
-        lambda x: (x - x.mean()) / (x.std() + 0.001) if x.std() > 0 else 0
-    )
-
-    # NEW: Shape features
-    # Aspect ratio (avoid div by zero)
-    df['aspect_ratio'] = df['width'] / (df['height'] + 0.1) 
-
-    features = [
-        'font_size', 'rel_font_size', 'is_bold', 
-        'x0', 'y0', 'width', 'dist_prev_y', 
-        'center_dev', 'is_first_page', 'aspect_ratio'
-    ]
-    
     # Clean data for training
-    df = df.dropna(subset=features + ['label'])
+    df = df.dropna(subset=FEATURES + ['label'])
     
-    X = df[features]
+    X = df[FEATURES]
     y = df['label']
 
-    logger.info(f"Training with {len(X)} samples. Features: {features}")
+    logger.info(f"Training with {len(X)} samples. Features: {FEATURES}")
 
-    # 4. Train/Test Split
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    # 4. Train/Test Split by PDF (pages of one PDF never straddle it), the
+    # same hash-based holdout as the incremental trainer
+    holdout = is_holdout(df['pdf_id'])
+    if holdout.all():
+        logger.error("Every PDF falls in the holdout split; extract more PDFs before training.")
+        return
+    X_train, X_test, y_train, y_test = X[~holdout], X[holdout], y[~holdout], y[holdout]
 
     # 5. Model Initialization
-    model = RandomForestClassifier(
-        n_estimators=200, 
-        max_depth=15,
-        min_samples_leaf=4,
-        class_weight='balanced',
-        random_state=42,
-        n_jobs=-1 # Use all cores
-    )
+    model = RandomForestClassifier(**(params or DEFAULT_PARAMS))
     
-    model.fit(X_train, y_train)
+    with telemetry.stage("fit"):
+        model.fit(X_train, y_train)
+    telemetry.inc("training_rows_total", len(X_train))
 
     # 6. Evaluation
-    y_pred = model.predict(X_test)
-    logger.info("\n--- Model Performance ---")
-    logger.info(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
-    print(classification_report(y_test, y_pred))
-
-    # 7. Export
-    output_dir = 'src/models/export'
-    os.makedirs(output_dir, exist_ok=True)
-    output_path = os.path.join(output_dir, 'layout_model.joblib')
-    joblib.dump(model, output_path)
-    logger.info(f"Model saved to {output_path}")
+    if X_test.empty:
+        logger.warning("No PDF falls in the holdout split; skipping evaluation.")
+    else:
+        with telemetry.stage("evaluate"):
+            y_pred = model.predict(X_test)
+        logger.info("\n--- Model Performance (holdout PDFs) ---")
+        logger.info(f"Accuracy: {accuracy_score(y_test, y_pred):.4f}")
+        print(classification_report(y_test, y_pred, zero_division=0))
+
+    # 7. Export (a model replaced here can no longer be extended with --since-last)
+    with telemetry.stage("export"):
+        if os.path.abspath(model_path) == os.path.abspath(MODEL_PATH):
+            _forget_incremental()
+        export_model(model, model_path, compact)
+    logger.info(f"Model saved to {model_path}")
+    telemetry.write_run("train")
+
+def _update_anchors(anchors, X, y, per_class=ANCHORS_PER_CLASS):
+    """Keeps up to `per_class` training rows of every label seen so far."""
+    for label in y.unique():
+        rows = X[y == label].head(per_class)
+        kept = anchors.get(label)
+        anchors[label] = rows if kept is None else pd.concat([kept, rows]).tail(per_class)
+
+def train_incremental(chunksize=200_000, trees_per_chunk=20, since_last=False, snapshot=None):
+    """
+    Out-of-core training: streams engineered chunks from the DB and grows the
+    forest with `warm_start`, adding `trees_per_chunk` trees fitted on each
+    chunk, so peak memory is bounded by the chunk size.
+
+    Every fit also sees a few anchor rows per label, so all chunks share the
+    same class set (warm_start requires it), and classes are weighted by
+    `class_weights` computed once over every PDF trained on (kept in the
+    model, so `since_last` runs reuse them). PDFs in the hash-based holdout
+    are never trained on. With `since_last`, the saved model is extended
+    using only the PDFs completed (or re-extracted / re-labeled) since it was
+    trained, tracked per PDF in COVERED_PATH rather than by a feature id
+    watermark (ids are reserved before commit, so late commits hold lower ids).
+    `snapshot` reads a Parquet/Arrow snapshot directory instead of the DB.
+    """
+    engine = None
+    if not snapshot:
+        engine = _create_engine()
+        if engine is None:
+            return
+    pdfs = completed_pdfs(engine, snapshot)
+    if not pdfs:
+        logger.error("No data found. Please run seed_data.py and then pdf_processor.py.")
+        return
+
+    meta = {}
+    if os.path.exists(META_PATH):
+        with open(META_PATH) as f:
+            meta = json.load(f)
+
+    model, anchors, covered = None, {}, {}
+    if since_last:
+        if not (meta and os.path.exists(MODEL_PATH) and os.path.exists(COVERED_PATH)):
+            logger.error("No previous model version found; run a full incremental training first.")
+            return
+        model = joblib.load(MODEL_PATH)
+        # Only extend what this trainer built: the full trainer's forest (maybe compacted) is not it
+        if meta.get("trainer") != "incremental" or model.n_estimators != meta.get("n_estimators"):
+            logger.error(f"{MODEL_PATH} was not written by the incremental trainer; run a full incremental training first.")
+            return
+        model.warm_start = True
+        if os.path.exists(ANCHORS_PATH):
+            anchors = joblib.load(ANCHORS_PATH)
+        with open(COVERED_PATH) as f:
+            covered = {int(pdf_id): version for pdf_id, version in json.load(f).items()}
+        pdfs = {pdf_id: version for pdf_id, version in pdfs.items() if covered.get(pdf_id) != version}
+        if not pdfs:
+            logger.info("No PDFs completed since the last model version.")
+            return
+
+    # The PDF set is fixed here, so every pass below reads the same rows
+    sources = _feature_sources(chunksize, engine, snapshot, sorted(pdfs))
+    chunks = stream_features(*sources)
+
+    trained_rows = 0
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=FEATURES + ['label'])
+        train = chunk[~is_holdout(chunk['pdf_id'])]
+        if train.empty:
+            continue
+
+        X, y = train[FEATURES], train['label']
+        _update_anchors(anchors, X, y)
+        if model is not None and not set(y).issubset(model.classes_):
+            logger.error(f"New labels {set(y) - set(model.classes_)} appeared; run a full training instead.")
+            return
+
+        # Anchor rows keep the class set identical across warm-started fits
+        X_fit = pd.concat([X] + list(anchors.values()))
+        y_fit = pd.concat([y] + [pd.Series(label, index=a.index) for label, a in anchors.items()])
+
+        if model is None:
+            weights = class_weights(engine, snapshot, pdfs)
+            model = RandomForestClassifier(**{**DEFAULT_PARAMS, 'n_estimators': 0, 'warm_start': True,
+                                              'class_weight': weights})
+        model.n_estimators += trees_per_chunk
+        with telemetry.stage("fit"):
+            model.fit(X_fit, y_fit)
+        telemetry.inc("training_rows_total", len(train))
+        trained_rows += len(train)
+        logger.info(f"Chunk of {len(train)} rows -> {model.n_estimators} trees")
+
+    if model is None or not trained_rows:
+        logger.error("No training rows outside the holdout split.")
+        return
+
+    # Evaluation on the persistent holdout, accumulated as (true, pred) counts
+    pairs = Counter()
+    for chunk in stream_features(*sources):
+        chunk = chunk.dropna(subset=FEATURES + ['label'])
+        test = chunk[is_holdout(chunk['pdf_id'])]
+        if not test.empty:
+            with telemetry.stage("evaluate"):
+                pairs.update(zip(test['label'], model.predict(test[FEATURES])))
+
+    if pairs:
+        (y_true, y_pred), weights = zip(*pairs.keys()), list(pairs.values())
+        logger.info("\n--- Model Performance (holdout) ---")
+        logger.info(f"Accuracy: {accuracy_score(y_true, y_pred, sample_weight=weights):.4f}")
+        print(classification_report(y_true, y_pred, sample_weight=weights, zero_division=0))
+
+    # Export model + version metadata (covered PDFs for the next --since-last run)
+    covered.update(pdfs)
+    with telemetry.stage("export"):
+        export_model(model, MODEL_PATH)
+        joblib.dump(anchors, ANCHORS_PATH)
+        with open(COVERED_PATH, "w") as f:
+            json.dump({str(pdf_id): version for pdf_id, version in covered.items()}, f)
+    meta = {
+        "trainer": "incremental",
+        "version": meta.get("version", 0) + 1,
+        "pdfs": len(covered),
+        "n_estimators": model.n_estimators,
+        "classes": [str(c) for c in model.classes_],
+        "trained_rows": trained_rows + (meta.get("trained_rows", 0) if since_last else 0),
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(META_PATH, "w") as f:
+        json.dump(meta, f, indent=2)
+    logger.info(f"Model v{meta['version']} saved to {MODEL_PATH} ({model.n_estimators} trees)")
+    telemetry.write_run("train")
 
 if __name__ == "__main__":
-    train_layout_model()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the layout classifier.")
+    parser.add_argument("--incremental", action="store_true", help="Stream chunks and grow the forest (bounded memory).")
+    parser.add_argument("--since-last", action="store_true", help="Extend the saved model with PDFs added since it was trained.")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--trees-per-chunk", type=int, default=20)
+    parser.add_argument("--snapshot", default=None, help="Read a snapshot directory (src.data.snapshot) instead of the DB.")
+    parser.add_argument("--params", default=None, help="Forest parameters and compaction from `src.models.tuning` (selected.json).")
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    parser.add_argument("--profile", nargs="+", default=None, help="Stages to run under cProfile ('all' for every stage).")
+    args = parser.parse_args()
+
+    if args.telemetry or args.profile:
+        telemetry.enable(args.profile)
+
+    if args.incremental or args.since_last:
+        train_incremental(args.chunksize, args.trees_per_chunk, args.since_last, args.snapshot)
+    else:
+        params, compact = load_params(args.params) if args.params else (None, None)
+        train_layout_model(args.snapshot, args.chunksize, params=params, compact=compact)
\ No newline at end of file
@@ -0,0 +1,321 @@
+import os
+import copy
+import json
+import time
+import logging
+import argparse
+import itertools
+import tempfile
+
+import numpy as np
+import joblib
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import GroupKFold
+
+from src import telemetry
+from src.models.compiled_forest import CompiledForest, compiled_path
+from src.models.features import FEATURES, collect_features, stream_features
+from src.models.trainer import DEFAULT_PARAMS, _create_engine, _feature_sources
+
+# Setup logging
+logging.basicConfig(level=logging.INFO, format="%(message)s")
+logger = logging.getLogger(__name__)
+
+TUNING_DIR = os.getenv("TUNING_DIR", os.path.join("data", "tuning"))
+
+DEFAULT_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [8, 12, 15],
+    "min_samples_leaf": [1, 4, 16],
+}
+
+# Accuracy (fraction) a smaller or faster choice may give up against the best one
+DEFAULT_TOLERANCE = 0.005
+
+# Latency probe: one page worth of lines, median of LATENCY_REPEATS calls
+LATENCY_BATCH = 64
+LATENCY_REPEATS = 50
+
+# Compaction variants tried on the selected candidate
+TREE_FRACTIONS = [0.5, 0.25]
+DEPTH_CUTS = [2, 4, 6]
+CCP_ALPHAS = [1e-5, 1e-4, 1e-3]
+
+def candidates(grid):
+    """Every combination of the `grid` values, as RandomForestClassifier keyword dicts."""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+def grouped_folds(pdf_ids, n_splits):
+    """(train, test) index pairs with all rows of a PDF on the same side of every fold."""
+    return list(GroupKFold(n_splits=n_splits).split(np.zeros(len(pdf_ids)), groups=pdf_ids))
+
+def _forest(params, n_jobs):
+    return RandomForestClassifier(**{**DEFAULT_PARAMS, **params, "n_jobs": n_jobs})
+
+def _fit_fold(X, y, train, test, params, dump_path=None):
+    """One cross-validation fit, single-threaded: the search runs many of them at once."""
+    model = _forest(params, n_jobs=1)
+    start = time.perf_counter()
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - start
+    pred = model.predict(X[test])
+    if dump_path:
+        joblib.dump(model, dump_path, compress=0)
+    return {
+        "accuracy": accuracy_score(y[test], pred),
+        "macro_f1": f1_score(y[test], pred, average="macro", zero_division=0),
+        "fit_seconds": fit_seconds,
+    }
+
+def _latency_ms(predict, batch, repeats=LATENCY_REPEATS):
+    predict(batch)  # Warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        predict(batch)
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+def _size_mb(obj, path):
+    joblib.dump(obj, path, compress=0)
+    return os.path.getsize(path) / 1e6
+
+def measure_footprint(path, batch):
+    """
+    Size on disk, load time and page-batch latency of a `.joblib` forest,
+    for sklearn and for its CompiledForest export.
+    """
+    start = time.perf_counter()
+    model = joblib.load(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    model.n_jobs = 1  # Thread dispatch only slows page-sized batches
+
+    compiled = CompiledForest.from_sklearn(model)
+    compiled_size = _size_mb(compiled, compiled_path(path))
+    start = time.perf_counter()
+    joblib.load(compiled_path(path), mmap_mode="r")
+    compiled_load_ms = (time.perf_counter() - start) * 1000
+
+    predict_ms = _latency_ms(model.predict_proba, batch)
+    compiled_ms = _latency_ms(compiled.predict_proba, batch)
+    return {
+        "size_mb": round(os.path.getsize(path) / 1e6, 3),
+        "compiled_size_mb": round(compiled_size, 3),
+        "load_ms": round(load_ms, 2),
+        "compiled_load_ms": round(compiled_load_ms, 2),
+        "predict_ms": round(predict_ms, 3),
+        "compiled_ms": round(compiled_ms, 3),
+        "latency_ms": round(min(predict_ms, compiled_ms), 3),
+        "backend": "compiled" if compiled_ms < predict_ms else "sklearn",
+    }
+
+def pareto_front(results, objectives=(("accuracy", 1), ("latency_ms", -1), ("size_mb", -1))):
+    """
+    Indices of the results no other result dominates: at least as good on
+    every (key, sign) objective (sign 1: higher is better) and better on one.
+    """
+    scores = np.array([[sign * r[key] for key, sign in objectives] for r in results])
+    front = []
+    for i, score in enumerate(scores):
+        dominated = np.any(np.all(scores >= score, axis=1) & np.any(scores > score, axis=1))
+        if not dominated:
+            front.append(i)
+    return front
+
+def select(results, front, tolerance=DEFAULT_TOLERANCE):
+    """Fastest (then smallest) point of the front within `tolerance` of the best accuracy."""
+    best = max(results[i]["accuracy"] for i in front)
+    eligible = [i for i in front if results[i]["accuracy"] >= best - tolerance]
+    return min(eligible, key=lambda i: (results[i]["latency_ms"], results[i]["size_mb"]))
+
+def compaction_report(model_path, params, X, y, train, test, workdir, tolerance=DEFAULT_TOLERANCE):
+    """
+    Accuracy cost of each compaction option on the fold a candidate's model
+    was fitted on, tried in turn on top of the options already accepted: a
+    prefix of the trees, float32 thresholds and truncated depth
+    (CompiledForest), then cost-complexity pruning (refit with `ccp_alpha`).
+    An option is accepted while the total loss stays within `tolerance`.
+    Returns (variants, params, compact): forest parameters and the
+    `CompiledForest.compact` config of everything accepted.
+    """
+    model = joblib.load(model_path)
+    model.n_jobs = 1
+    X_test, y_test = X[test], y[test]
+    batch = X_test[:LATENCY_BATCH]
+    base = accuracy_score(y_test, model.predict(X_test))
+    path = os.path.join(workdir, "variant.joblib")
+    variants = []
+
+    def accepted(option, backend, predictor):
+        accuracy = accuracy_score(y_test, predictor.predict(X_test))
+        variants.append({
+            "option": option, "backend": backend, "accuracy": round(accuracy, 5),
+            "delta": round(accuracy - base, 5), "size_mb": round(_size_mb(predictor, path), 3),
+            "latency_ms": round(_latency_ms(predictor.predict_proba, batch), 3),
+        })
+        return accuracy >= base - tolerance
+
+    accepted("none", "sklearn", model)
+    tuned, compact = dict(params), {}
+
+    # Fewer trees: the first n of the fitted forest (each tree is an independent bootstrap)
+    for fraction in TREE_FRACTIONS:
+        n = max(1, int(model.n_estimators * fraction))
+        smaller = copy.copy(model)
+        smaller.estimators_, smaller.n_estimators = model.estimators_[:n], n
+        if not accepted(f"n_estimators={n}", "sklearn", smaller):
+            break
+        tuned["n_estimators"] = n
+    kept = copy.copy(model)
+    kept.estimators_ = model.estimators_[:tuned.get("n_estimators", model.n_estimators)]
+
+    # 4-byte thresholds/values and shallower trees, on the compiled export
+    compiled = CompiledForest.from_sklearn(kept)
+    accepted("compiled", "compiled", compiled)
+    if accepted("float32", "compiled", compiled.compact(float32=True)):
+        compact["float32"] = True
+    for cut in DEPTH_CUTS:
+        depth = compiled.max_depth - cut
+        if depth < 1 or not accepted(f"max_depth={depth}", "compiled", compiled.compact(**{**compact, "max_depth": depth})):
+            break
+        compact["max_depth"] = depth
+
+    # Cost-complexity pruning needs a refit
+    for alpha in CCP_ALPHAS:
+        pruned = _forest({**tuned, "ccp_alpha": alpha}, n_jobs=-1).fit(X[train], y[train])
+        if not accepted(f"ccp_alpha={alpha:g}", "compiled", CompiledForest.from_sklearn(pruned).compact(**compact)):
+            break
+        tuned["ccp_alpha"] = alpha
+    return variants, tuned, compact
+
+def search(df, grid=DEFAULT_GRID, n_splits=3, n_jobs=-1, tolerance=DEFAULT_TOLERANCE, compaction=True):
+    """
+    Grouped-by-pdf_id cross-validated search over `grid`: every
+    (candidate, fold) fit runs in its own process, then each candidate's
+    first-fold model is measured alone (size on disk, load time, page-batch
+    latency). Returns a dict with every candidate, the Pareto front
+    (accuracy vs latency vs size), the selected candidate and, with
+    `compaction`, the compaction report and selection for it.
+    """
+    X = df[FEATURES].to_numpy(np.float32)
+    classes, y = np.unique(df["label"].to_numpy(str), return_inverse=True)
+    folds = grouped_folds(df["pdf_id"].to_numpy(), n_splits)
+    grid_candidates = candidates(grid)
+    logger.info(f"{len(grid_candidates)} candidates x {n_splits} folds on {len(X)} rows "
+                f"from {df['pdf_id'].nunique()} PDFs")
+
+    with tempfile.TemporaryDirectory(prefix="tuning_") as workdir:
+        model_paths = [os.path.join(workdir, f"candidate_{i}.joblib") for i in range(len(grid_candidates))]
+        tasks = [(i, f) for i in range(len(grid_candidates)) for f in range(n_splits)]
+        with telemetry.stage("cv"):
+            scores = Parallel(n_jobs=n_jobs)(
+                delayed(_fit_fold)(X, y, *folds[f], grid_candidates[i], model_paths[i] if f == 0 else None)
+                for i, f in tasks
+            )
+
+        results = []
+        batch = X[folds[0][1][:LATENCY_BATCH]]
+        for i, params in enumerate(grid_candidates):
+            fold_scores = [score for (c, _), score in zip(tasks, scores) if c == i]
+            accuracy = [s["accuracy"] for s in fold_scores]
+            with telemetry.stage("measure"):
+                footprint = measure_footprint(model_paths[i], batch)
+            results.append({
+                "params": params,
+                "accuracy": round(float(np.mean(accuracy)), 5),
+                "accuracy_std": round(float(np.std(accuracy)), 5),
+                "macro_f1": round(float(np.mean([s["macro_f1"] for s in fold_scores])), 5),
+                "fit_seconds": round(float(np.mean([s["fit_seconds"] for s in fold_scores])), 3),
+                **footprint,
+            })
+            logger.info(f"{params} accuracy {results[-1]['accuracy']:.4f} size {footprint['size_mb']:.1f} MB "
+                        f"latency {footprint['latency_ms']:.2f} ms ({footprint['backend']})")
+
+        front = pareto_front(results)
+        selected = select(results, front, tolerance)
+        report = {
+            "rows": len(X), "pdfs": int(df["pdf_id"].nunique()), "folds": n_splits,
+            "classes": classes.tolist(), "candidates": results,
+            "pareto": front, "selected": selected,
+            "params": grid_candidates[selected], "compact": {},
+        }
+        if compaction:
+            with telemetry.stage("compaction"):
+                variants, params, compact = compaction_report(
+                    model_paths[selected], grid_candidates[selected], X, y, *folds[0], workdir, tolerance,
+                )
+            report.update(compaction=variants, params=params, compact=compact)
+    return report
+
+def export(report, out_dir=TUNING_DIR):
+    """Writes tuning.json (everything), pareto.json (the front) and selected.json (for `trainer --params`)."""
+    os.makedirs(out_dir, exist_ok=True)
+    files = {
+        "tuning.json": report,
+        "pareto.json": [report["candidates"][i] for i in report["pareto"]],
+        "selected.json": {"params": report["params"], "compact": report["compact"]},
+    }
+    for name, content in files.items():
+        with open(os.path.join(out_dir, name), "w") as f:
+            json.dump(content, f, indent=2)
+    return out_dir
+
+def load_features(snapshot=None, chunksize=200_000, max_pdfs=None):
+    """Engineered training rows from the DB or a snapshot, optionally a random sample of `max_pdfs` PDFs."""
+    engine = None
+    if not snapshot:
+        engine = _create_engine()
+        if engine is None:
+            return None
+    df = collect_features(stream_features(*_feature_sources(chunksize, engine, snapshot=snapshot)))
+    df = df.dropna(subset=FEATURES + ["label"])
+    if max_pdfs and df["pdf_id"].nunique() > max_pdfs:
+        keep = np.random.default_rng(42).choice(df["pdf_id"].unique(), max_pdfs, replace=False)
+        df = df[df["pdf_id"].isin(keep)]
+    return df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grouped cross-validated search and compaction for the layout model.")
+    parser.add_argument("--snapshot", default=None, help="Read a snapshot directory (src.data.snapshot) instead of the DB.")
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--max-pdfs", type=int, default=None, help="Tune on a random sample of this many PDFs.")
+    parser.add_argument("--folds", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=-1, help="Parallel fits (default: all cores).")
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=DEFAULT_GRID["n_estimators"])
+    parser.add_argument("--max-depth", type=int, nargs="+", default=DEFAULT_GRID["max_depth"])
+    parser.add_argument("--min-samples-leaf", type=int, nargs="+", default=DEFAULT_GRID["min_samples_leaf"])
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Accuracy a faster candidate or a compaction option may lose.")
+    parser.add_argument("--no-compaction", action="store_true")
+    parser.add_argument("--out", default=TUNING_DIR, help="Output directory (TUNING_DIR).")
+    parser.add_argument("--telemetry", action="store_true", help="Collect stage metrics (TELEMETRY=1).")
+    args = parser.parse_args()
+
+    if args.telemetry:
+        telemetry.enable()
+
+    df = load_features(args.snapshot, args.chunksize, args.max_pdfs)
+    if df is None or df.empty:
+        raise SystemExit("No data found. Please run seed_data.py and then pdf_processor.py.")
+    if df["pdf_id"].nunique() < args.folds:
+        raise SystemExit(f"Grouped {args.folds}-fold CV needs at least {args.folds} PDFs.")
+
+    grid = {"n_estimators": args.n_estimators, "max_depth": args.max_depth, "min_samples_leaf": args.min_samples_leaf}
+    report = search(df, grid, args.folds, args.jobs, args.tolerance, not args.no_compaction)
+    export(report, args.out)
+
+    logger.info("\n--- Pareto front (accuracy / latency / size) ---")
+    for i in report["pareto"]:
+        r = report["candidates"][i]
+        mark = "*" if i == report["selected"] else " "
+        logger.info(f"{mark} {r['params']} accuracy {r['accuracy']:.4f}±{r['accuracy_std']:.4f} "
+                    f"size {r['size_mb']:.1f} MB load {r['load_ms']:.0f} ms latency {r['latency_ms']:.2f} ms")
+    for v in report.get("compaction", []):
+        logger.info(f"  {v['option']:<40} {v['backend']:<9} accuracy {v['accuracy']:.4f} ({v['delta']:+.4f}) "
+                    f"size {v['size_mb']:.2f} MB latency {v['latency_ms']:.2f} ms")
+    logger.info(f"Selection written to {os.path.join(args.out, 'selected.json')}; "
+                f"train it with `python -m src.models.trainer --params {os.path.join(args.out, 'selected.json')}`")
+    telemetry.write_run("tune")
@@ -0,0 +1,231 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Off unless TELEMETRY=1: every call below then returns after one flag check
+ENABLED = os.getenv("TELEMETRY", "0") == "1"
+TELEMETRY_DIR = os.getenv("TELEMETRY_DIR", os.path.join("data", "telemetry"))
+# Comma-separated stage names to run under cProfile ("all" for every stage)
+PROFILE_STAGES = {s.strip() for s in os.getenv("TELEMETRY_PROFILE", "").split(",") if s.strip()}
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 50000)
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KiB .. 1 GiB
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum, min, max]
+_buckets = {}     # name -> bucket bounds
+_profiles = {}    # stage -> cProfile.Profile
+_profiling = threading.local()
+_started = time.time()
+
+def _reset():
+    """Forked workers start empty, so what they `drain()` back is only their own work."""
+    global _lock, _profiling
+    _lock = threading.Lock()
+    _profiling = threading.local()
+    _counters.clear()
+    _histograms.clear()
+    _profiles.clear()
+
+os.register_at_fork(after_in_child=_reset)
+
+def enabled():
+    return ENABLED
+
+def enable(profile=None):
+    """Turns collection on in this process and in worker processes started after it."""
+    global ENABLED
+    ENABLED = True
+    os.environ["TELEMETRY"] = "1"
+    if profile:
+        PROFILE_STAGES.update(profile)
+        os.environ["TELEMETRY_PROFILE"] = ",".join(sorted(PROFILE_STAGES))
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, value=1, **labels):
+    """Adds `value` to the counter `name` (with `labels`)."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Records one observation in the histogram `name` (bounds fixed by its first call)."""
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        bounds = _buckets.setdefault(name, tuple(buckets))
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = [0] * (len(bounds) + 1) + [0.0, value, value]
+        i = next((i for i, bound in enumerate(bounds) if value <= bound), len(bounds))
+        h[i] += 1
+        h[-3] += value
+        h[-2] = min(h[-2], value)
+        h[-1] = max(h[-1], value)
+
+def error(stage, exc):
+    """Counts an error by stage and exception type."""
+    inc("errors_total", stage=stage, type=type(exc).__name__)
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+def stage(name, **labels):
+    """
+    Context manager timing a pipeline stage into the `stage_seconds`
+    histogram (errors raised inside are counted too). Stages listed in
+    TELEMETRY_PROFILE also run under cProfile, accumulated per stage.
+    """
+    if not ENABLED:
+        return _NULL_STAGE
+    return _timed_stage(name, labels)
+
+@contextmanager
+def _timed_stage(name, labels):
+    profiler = None
+    if (name in PROFILE_STAGES or "all" in PROFILE_STAGES) and not getattr(_profiling, "active", False):
+        import cProfile
+        with _lock:
+            profiler = _profiles.setdefault(name, cProfile.Profile())
+        _profiling.active = True
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        error(name, e)
+        raise
+    finally:
+        observe("stage_seconds", time.perf_counter() - start, stage=name, **labels)
+        if profiler is not None:
+            profiler.disable()
+            _profiling.active = False
+
+def drain():
+    """
+    Returns and clears this process's counters and histograms (None when
+    disabled), so a worker process can ship them back with its result.
+    """
+    if not ENABLED:
+        return None
+    with _lock:
+        state = {"counters": dict(_counters), "histograms": dict(_histograms), "buckets": dict(_buckets)}
+        _counters.clear()
+        _histograms.clear()
+    return state
+
+def merge(state):
+    """Adds a `drain()` result from another process into this one."""
+    if not ENABLED or not state:
+        return
+    with _lock:
+        for key, value in state["counters"].items():
+            _counters[key] = _counters.get(key, 0) + value
+        for name, bounds in state["buckets"].items():
+            _buckets.setdefault(name, bounds)
+        for key, other in state["histograms"].items():
+            h = _histograms.get(key)
+            if h is None:
+                _histograms[key] = list(other)
+                continue
+            for i in range(len(other) - 3):
+                h[i] += other[i]
+            h[-3] += other[-3]
+            h[-2] = min(h[-2], other[-2])
+            h[-1] = max(h[-1], other[-1])
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def prometheus_text(prefix="latexia_"):
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(_histograms.items())
+        buckets = dict(_buckets)
+
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {prefix}{name} counter")
+        lines.append(f"{prefix}{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), h in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {prefix}{name} histogram")
+        cumulative = 0
+        for bound, count in zip(buckets[name] + ("+Inf",), h[:-3]):
+            cumulative += count
+            lines.append(f"{prefix}{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{prefix}{name}_sum{_format_labels(labels)} {h[-3]}")
+        lines.append(f"{prefix}{name}_count{_format_labels(labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    """Per-series totals: counters as numbers, histograms as count/sum/mean/min/max."""
+    def series(name, labels):
+        return name + _format_labels(labels)
+
+    with _lock:
+        result = {
+            "started_at": datetime.fromtimestamp(_started, timezone.utc).isoformat(),
+            "wall_seconds": round(time.time() - _started, 3),
+            "counters": {series(n, l): v for (n, l), v in sorted(_counters.items())},
+            "histograms": {},
+        }
+        for (name, labels), h in sorted(_histograms.items()):
+            count = sum(h[:-3])
+            result["histograms"][series(name, labels)] = {
+                "count": count, "sum": round(h[-3], 6), "mean": round(h[-3] / count, 6),
+                "min": round(h[-2], 6), "max": round(h[-1], 6),
+            }
+    return result
+
+def write_run(run_name, directory=None):
+    """
+    Writes `<run_name>.prom` (latest run, for a node_exporter textfile
+    collector), `<run_name>-<UTC timestamp>.json` (per-run summary) and one
+    `.prof` file per profiled stage. Returns the JSON path (None when disabled).
+    """
+    if not ENABLED:
+        return None
+    directory = directory or TELEMETRY_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+    prom_path = os.path.join(directory, f"{run_name}.prom")
+    with open(f"{prom_path}.tmp", "w") as f:
+        f.write(prometheus_text())
+    os.replace(f"{prom_path}.tmp", prom_path)  # Collectors never read a half-written file
+
+    json_path = os.path.join(directory, f"{run_name}-{stamp}.json")
+    with open(json_path, "w") as f:
+        json.dump(summary(), f, indent=2)
+
+    with _lock:
+        profiles = dict(_profiles)
+    for stage_name, profiler in profiles.items():
+        profiler.dump_stats(os.path.join(directory, f"{run_name}-{stamp}.{stage_name}.prof"))
+    return json_path
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+import pytest
+
+# src.data.db_session reads DATABASE_URL at import time; tests never need a server
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='tests_'), 'test.db')}")
+
+@pytest.fixture
+def db():
+    """A session on the test database, emptied after the test."""
+    from src.data.db_session import Base, SessionLocal, init_db
+    init_db(check_schema=False)
+    session = SessionLocal()
+    yield session
+    session.rollback()
+    for table in reversed(Base.metadata.sorted_tables):
+        session.execute(table.delete())
+    session.commit()
+    session.close()
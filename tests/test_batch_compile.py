@@ -0,0 +1,19 @@
+import json
+
+import pytest
+
+from src.models.batch_compile import load_manifest
+
+def manifest(tmp_path, jobs):
+    path = tmp_path / "jobs.jsonl"
+    path.write_text("".join(json.dumps(job) + "\n" for job in jobs))
+    return str(path)
+
+@pytest.mark.parametrize("name", ["../../x", "sub/x", "/tmp/x", "..\\x", "..", "", 7])
+def test_names_that_leave_the_output_directory_are_rejected(tmp_path, name):
+    with pytest.raises(ValueError, match="Invalid job name"):
+        load_manifest(manifest(tmp_path, [{"layout": "top", "name": name}]))
+
+def test_plain_names_and_defaults_are_kept(tmp_path):
+    jobs = load_manifest(manifest(tmp_path, [{"layout": "top", "name": "fig..v2"}, {"layout": "left"}]))
+    assert [job["name"] for job in jobs] == ["fig..v2", "00001_left_top_image"]
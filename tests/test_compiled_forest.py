@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.models.compiled_forest import CompiledForest, compact_sklearn
+from src.models.features import engineer_features, to_model_input
+from src.models import inference
+from src.models.trainer import export_model
+
+@pytest.fixture(scope="module")
+def frame():
+    return synthetic_layout_frame(4_000, pdfs=8)
+
+@pytest.fixture(scope="module")
+def model(frame):
+    engineered = engineer_features(frame)
+    model = RandomForestClassifier(n_estimators=10, max_depth=12, random_state=0)
+    return model.fit(to_model_input(engineered), engineered["label"])
+
+@pytest.mark.parametrize("compact", [{"max_depth": 4}, {"float32": True}, {"max_depth": 6, "float32": True}])
+def test_compacted_sklearn_matches_compacted_compiled(frame, model, compact):
+    X = to_model_input(engineer_features(frame))
+    expected = CompiledForest.from_sklearn(model).compact(**compact).predict_proba(X.to_numpy())
+    actual = compact_sklearn(model, **compact).predict_proba(X)
+    assert np.abs(expected - actual).max() <= 1e-6
+    assert (expected.argmax(axis=1) == actual.argmax(axis=1)).all()
+
+def test_labels_do_not_depend_on_batch_size(frame, model, tmp_path, monkeypatch):
+    """Batches above COMPILED_MAX_ROWS go to sklearn; both must serve the compacted model."""
+    path = str(tmp_path / "layout_model.joblib")
+    export_model(model, path, compact={"max_depth": 3, "float32": True})
+    engine = inference.AcademicEngine(path, backend="compiled")
+
+    predictions = {}
+    for max_rows in (len(frame), 0):  # Everything compiled, then everything sklearn
+        monkeypatch.setattr(inference, "COMPILED_MAX_ROWS", max_rows)
+        predictions[max_rows] = engine.predict_layout(frame)
+    compiled, sklearn = predictions[len(frame)], predictions[0]
+    assert (compiled["label"] == sklearn["label"]).all()
+    assert np.abs(compiled["confidence"] - sklearn["confidence"]).max() <= 1e-6
@@ -0,0 +1,80 @@
+import numpy as np
+from sqlalchemy import func, select, update
+
+from src.data.db_session import SessionLocal
+from src.data.extraction import LINE_DTYPE, ExtractedLines
+from src.data.feature_writer import LayoutFeatureWriter
+from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.data.pdf_processor import stream_document
+from src.data.work_queue import DONE, PENDING, claim_batch
+
+class RejectingWriter(LayoutFeatureWriter):
+    """Fails any transaction that carries the text 'BAD' (a row the driver rejects)."""
+
+    def _insert_texts(self, text_rows):
+        if any(text == "BAD" for _, text in text_rows):
+            raise ValueError("rejected row")
+        super()._insert_texts(text_rows)
+
+def rows(text, n=3):
+    return [{"text_content": text, "page_number": 0, "label": "body"} for _ in range(n)]
+
+def lines(n=3):
+    """A page range of `n` extracted text lines, as `stream_extraction` yields them."""
+    records = np.zeros(n, dtype=LINE_DTYPE)
+    records["label"] = "body"
+    return ExtractedLines(records, ["line"] * n, pages=1)
+
+def leased_pdfs(db, n):
+    db.add_all(PDFMetadata(pmid=str(1000 + i), processed=False) for i in range(n))
+    db.commit()
+    return [pdf_id for pdf_id, _ in claim_batch(db, "worker-1", n)]
+
+def test_failed_flush_only_fails_the_bad_pdf(db):
+    good_a, bad, good_b = leased_pdfs(db, 3)
+    writer = RejectingWriter(db, flush_size=10_000, worker_id="worker-1")
+    for pdf_id in (good_a, bad, good_b):
+        assert writer.add_document(pdf_id, rows("BAD" if pdf_id == bad else "ok"), "0" * 64)
+
+    assert writer.flush() is False
+    assert writer.failed_pdfs == [bad]
+
+    db.expire_all()
+    for pdf_id in (good_a, good_b):
+        pdf = db.get(PDFMetadata, pdf_id)
+        assert (pdf.processed, pdf.status) == (True, DONE)
+    pdf = db.get(PDFMetadata, bad)
+    assert (pdf.processed, pdf.status, pdf.lease_owner) == (False, PENDING, None)
+    assert pdf.last_error == "rejected row"
+    counts = dict(db.execute(select(LayoutFeatures.pdf_id, func.count()).group_by(LayoutFeatures.pdf_id)).all())
+    assert counts == {good_a: 3, good_b: 3}
+
+def test_flush_returns_true_when_every_pdf_is_written(db):
+    pdf_ids = leased_pdfs(db, 2)
+    writer = LayoutFeatureWriter(db, flush_size=4, worker_id="worker-1")
+    assert writer.add_document(pdf_ids[0], rows("a"))
+    assert writer.add_document(pdf_ids[1], rows("b"))  # Crosses flush_size: flushed here
+    assert writer.rows_written == 6 and writer.failed_pdfs == []
+
+def test_streamed_pdf_whose_lease_moves_mid_extraction_is_dropped(db):
+    pdf_id, other_id = leased_pdfs(db, 2)
+    writer = LayoutFeatureWriter(db, worker_id="worker-1")
+
+    def chunks(pdf_id):
+        yield lines()
+        # Another worker takes the lease over while this one still extracts. On SQLite
+        # that commit would wait on the write lock if extraction ran inside the transaction.
+        other = SessionLocal()
+        other.execute(update(PDFMetadata).where(PDFMetadata.id == pdf_id).values(lease_owner="worker-2"))
+        other.commit()
+        other.close()
+        yield lines()
+
+    assert stream_document(writer, pdf_id, chunks(pdf_id), "0" * 64) is None
+    assert sum(stream_document(writer, other_id, [lines(), lines()], "0" * 64).values()) == 6
+
+    db.expire_all()
+    pdf = db.get(PDFMetadata, pdf_id)
+    assert (pdf.processed, pdf.lease_owner) == (False, "worker-2")
+    counts = dict(db.execute(select(LayoutFeatures.pdf_id, func.count()).group_by(LayoutFeatures.pdf_id)).all())
+    assert counts == {other_id: 6}
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from benchmarks.bench_features import legacy_features
+from benchmarks.fixtures import synthetic_layout_frame
+from src.models.features import FEATURES, engineer_features, load_features
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = create_engine(f"sqlite:///{tmp_path_factory.mktemp('features') / 'features.db'}")
+    frame = synthetic_layout_frame(20_000, pdfs=25)
+    frame.index.name = "id"
+    frame.index += 1
+    frame.to_sql("layout_features", engine, index=True)
+    return engine
+
+def assert_same_features(expected, actual):
+    assert len(actual) == len(expected)
+    assert np.abs(expected[FEATURES].to_numpy(float) - actual[FEATURES].to_numpy(float)).max() <= 1e-9
+    assert (expected["label"].to_numpy() == actual["label"].to_numpy()).all()
+
+@pytest.mark.parametrize("chunksize", [20_000, 3_001, 97])
+def test_load_features_matches_legacy(engine, chunksize):
+    """Chunks that split PDFs and pages give the same features as the in-memory code."""
+    assert_same_features(legacy_features(engine), load_features(engine, chunksize=chunksize))
+
+def test_engineer_features_matches_legacy(engine):
+    frame = synthetic_layout_frame(20_000, pdfs=25)
+    engineered = engineer_features(frame).reset_index(drop=True)
+    assert_same_features(legacy_features(engine), engineered)
@@ -0,0 +1,95 @@
+import math
+
+import pytest
+
+from src.models.fit_check import FitCache, count_paragraphs, fit_to_one_page, parse_probe, trim_paragraphs
+
+TEX = (
+    "\\documentclass{article}\\begin{document}\n"
+    "\\lipsum[1-3]\n\\begin{wrapfigure}[16]{r}{0.5\\textwidth}X\\end{wrapfigure}\n\\lipsum[4-9]\n"
+    "\\end{document}\n"
+)
+
+LOG = r"""This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)
+Overfull \hbox (12.5pt too wide) in paragraph at lines 12--14
+Overfull \vbox (3.0pt too high) has occurred while \output is active
+Overfull \hbox (0.75pt too wide) in paragraph at lines 20--21
+! Undefined control sequence.
+l.22 \foo
+! Emergency stop.
+Output written on probe.pdf (2 pages, 31337 bytes).
+"""
+
+@pytest.mark.parametrize("keep, expected", [
+    (9, "\\lipsum[1-3]"),
+    (5, "\\lipsum[1-3]"),
+    (2, "\\lipsum[1-2]"),
+])
+def test_trim_paragraphs_keeps_the_first_paragraphs(keep, expected):
+    trimmed = trim_paragraphs(TEX, keep)
+    assert count_paragraphs(trimmed) == keep
+    assert expected in trimmed
+    assert "\\begin{wrapfigure}" in trimmed
+
+def test_trim_paragraphs_removes_from_the_end():
+    assert "\\lipsum[4-5]" in trim_paragraphs(TEX, 5)
+    assert "\\lipsum[4" not in trim_paragraphs(TEX, 3)
+    assert "\\lipsum" not in trim_paragraphs(TEX, 0)
+
+def test_parse_probe_reads_the_draft_mode_aux_and_log():
+    result = parse_probe(LOG, "\\relax\n\\fitcheckpages{1}\n")
+    assert result == {"pages": 1, "overfull_hbox": 2, "overfull_vbox": 1, "max_overfull_pt": 12.5,
+                      "error": "Undefined control sequence."}
+
+def test_parse_probe_falls_back_to_the_log_page_count():
+    assert parse_probe(LOG)["pages"] == 2
+    assert parse_probe("No pages of output.\n") == {
+        "pages": None, "overfull_hbox": 0, "overfull_vbox": 0, "max_overfull_pt": 0.0, "error": None,
+    }
+
+def fake_probe(limit, calls=None):
+    """Typesets to one page while at most `limit` paragraphs remain."""
+    def probe(source):
+        if calls is not None:
+            calls.append(source)
+        pages = 1 if count_paragraphs(source) <= limit else 2
+        return {"pages": pages, "overfull_hbox": 0, "overfull_vbox": 0, "max_overfull_pt": 0.0, "error": None}
+    return probe
+
+@pytest.mark.parametrize("limit", range(0, 10))
+def test_fit_keeps_the_most_paragraphs_that_fit(limit):
+    tex, report = fit_to_one_page(TEX, probe=fake_probe(limit))
+    assert count_paragraphs(tex) == report["paragraphs"] == limit
+    assert report["pages"] == 1
+    assert report["compiles"] <= 1 + math.ceil(math.log2(count_paragraphs(TEX) + 1))
+
+def test_fit_exactly_at_the_boundary_needs_one_compile():
+    calls = []
+    tex, report = fit_to_one_page(TEX, probe=fake_probe(9, calls))
+    assert tex == TEX and report["paragraphs"] == 9 and len(calls) == report["compiles"] == 1
+
+def test_component_that_does_not_fit_alone_raises():
+    with pytest.raises(ValueError, match="alone"):
+        fit_to_one_page(TEX, probe=fake_probe(-1))
+
+def test_failed_probe_raises():
+    failed = {"pages": None, "overfull_hbox": 0, "overfull_vbox": 0, "max_overfull_pt": 0.0, "error": "boom"}
+    with pytest.raises(ValueError, match="boom"):
+        fit_to_one_page(TEX, probe=lambda source: failed)
+
+def test_cache_hits_skip_the_compiler(tmp_path):
+    expected, _ = fit_to_one_page(TEX, cache=FitCache(str(tmp_path)), probe=fake_probe(4))
+
+    def no_compiler(source):
+        raise AssertionError("compiled a cached candidate")
+
+    cache = FitCache(str(tmp_path))  # A new run: results are read back from disk, then from memory
+    for _ in range(2):
+        tex, report = fit_to_one_page(TEX, cache=cache, probe=no_compiler)
+        assert tex == expected and report["compiles"] == 0 and report["cache_hits"] > 0
+    assert cache.misses == 0
+
+    memory_only = FitCache(None)
+    key = FitCache.key(TEX, "pdflatex")
+    memory_only.put(key, {"pages": 1})
+    assert memory_only.get(key) == {"pages": 1} and memory_only.hits == 1
@@ -0,0 +1,115 @@
+import fitz
+import numpy as np
+import pytest
+
+from benchmarks.bench_labeling import synthetic_lines
+from benchmarks.fixtures import make_pdf
+from src.data.extraction import extract_lines, sanitize_text
+from src.data.labeling import DEFAULT_RULES, LabelingRules, heuristic_labeling, label_lines
+
+def per_line(data, rules):
+    columns = [data[k].tolist() for k in ("size", "is_bold", "x0", "y0", "width", "page_width", "page_height")]
+    texts = ["line" if t else "  " for t in data["has_text"].tolist()]
+    return np.array([heuristic_labeling(t, *row, rules=rules) for t, row in zip(texts, zip(*columns))])
+
+@pytest.mark.parametrize("rules", [DEFAULT_RULES, LabelingRules(footer_y=0.85, header_size=11, wide_width=0.5)])
+def test_label_lines_matches_heuristic_labeling(rules):
+    data = synthetic_lines(50_000, seed=1)
+    assert (label_lines(**data, rules=rules) == per_line(data, rules)).all()
+
+def test_label_lines_on_thresholds():
+    """Values exactly on each threshold fall on the same side as the per-line rules."""
+    page_w, page_h = 600.0, 800.0
+    rules = DEFAULT_RULES
+    data = dict(
+        size=np.array([rules.title_size, rules.header_size, 12.0, 9.0, 9.0]),
+        is_bold=np.array([False, True, True, False, False]),
+        x0=np.zeros(5),
+        y0=np.array([400.0, 400.0, 400.0, page_h * rules.footer_y, page_h * rules.header_y]),
+        width=np.array([100.0, page_w * rules.wide_width, 100.0, 100.0, 100.0]),
+        page_width=np.full(5, page_w),
+        page_height=np.full(5, page_h),
+        has_text=np.ones(5, dtype=bool),
+    )
+    assert (label_lines(**data) == per_line(data, rules)).all()
+
+def baseline_rows(doc):
+    """The original extractor's rows: one `heuristic_labeling` call per line."""
+    for page_num in range(doc.page_count):
+        page = doc[page_num]
+        _, _, page_w, page_h = page.rect
+        dims = dict(page_number=page_num, page_width=round(page_w, 2), page_height=round(page_h, 2))
+        for b in page.get_text("dict")["blocks"]:
+            x0, y0, x1, y1 = b["bbox"]
+            if b["type"] == 1:
+                yield dict(is_image=True, x0=round(x0, 2), y0=round(y0, 2), width=round(x1 - x0, 2),
+                           height=round(y1 - y0, 2), label="image", **dims)
+                continue
+            for l in b.get("lines", ()):
+                spans = l["spans"]
+                text = sanitize_text(" ".join(s["text"] for s in spans).strip())
+                if not text:
+                    continue
+                size = sum(s["size"] for s in spans) / len(spans)
+                bold = sum("bold" in s["font"].lower() for s in spans) > len(spans) / 2
+                x0, y0, x1, y1 = l["bbox"]
+                yield dict(text_content=text[:1000], font_size=round(size, 2), is_bold=bold,
+                           x0=round(x0, 2), y0=round(y0, 2), width=round(x1 - x0, 2), height=round(y1 - y0, 2),
+                           label=heuristic_labeling(text, size, bold, x0, y0, x1 - x0, page_w, page_h), **dims)
+
+class FakePage:
+    rect = (0, 0, 600.0, 800.0)
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def get_text(self, kind):
+        return {"blocks": [{"type": 0, "bbox": (0, 0, 1, 1), "lines": self.lines}]}
+
+class FakeDoc(list):
+    @property
+    def page_count(self):
+        return len(self)
+
+def fake_line(texts, y0, size=9.0, font="Times", width=500.0):
+    spans = [{"text": t, "size": size, "font": font} for t in texts]
+    return {"spans": spans, "bbox": (50.0, y0, 50.0 + width, y0 + size)}
+
+def test_extracted_rows_match_the_original_extractor(tmp_path):
+    path = tmp_path / "fixture.pdf"
+    path.write_bytes(make_pdf(6, seed=0, images=True, columns=2))
+    with fitz.open(str(path)) as doc:
+        assert list(extract_lines(doc).rows()) == list(baseline_rows(doc))
+
+def test_whitespace_and_control_character_lines_match_the_original_extractor():
+    doc = FakeDoc([FakePage([
+        fake_line(["\x00", "\x00"], 400),  # Sanitizes to " ": kept, "garbage"
+        fake_line(["\x00\t\x0b\x00"], 420, size=12.0, font="Times-Bold", width=100.0),
+        fake_line(["\x00\t", "\x0b"], 440),  # Stripped before sanitizing: "", dropped
+        fake_line(["\x07bell", "\x1b"], 460),
+        fake_line(["\x00\u00a0\x00"], 30),  # In the header band
+        fake_line(["Title"], 480, size=20.0),
+    ])])
+    rows = list(extract_lines(doc).rows())
+    assert rows == list(baseline_rows(doc))
+    assert [row["label"] for row in rows] == ["garbage", "garbage", "body", "garbage", "title"]
+
+def test_relabel_records_version_only_on_relabeled_pdfs(db):
+    from sqlalchemy import insert
+    from src.data.labeling import labeler_version, relabel_layout_features
+    from src.data.models_db import LayoutFeatures, PDFMetadata
+
+    rules = LabelingRules(footer_y=0.85)
+    line = dict(font_size=9.0, is_bold=False, x0=50.0, y0=700.0, width=100.0, page_number=0, label="body")
+    for pdf_id, page_size in [(1, 800.0), (2, None)]:  # PDF 2 was extracted before page sizes were recorded
+        db.add(PDFMetadata(id=pdf_id, pmid=str(pdf_id), processed=True))
+        db.flush()
+        db.execute(insert(LayoutFeatures.__table__), [
+            dict(line, pdf_id=pdf_id, page_width=page_size and 600.0, page_height=page_size)
+        ])
+    db.commit()
+
+    assert relabel_layout_features(rules) == 1
+    db.expire_all()
+    assert db.get(PDFMetadata, 1).labeler_version == labeler_version(rules)
+    assert db.get(PDFMetadata, 2).labeler_version is None
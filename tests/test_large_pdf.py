@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+from sqlalchemy import func, select
+
+from benchmarks.bench_large_pdf import make_large_pdf
+from src.data.extraction import stream_extraction
+from src.data.feature_writer import LayoutFeatureWriter
+from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.data.pdf_processor import stream_document
+
+PAGES = 100
+PAGES_PER_TASK = 16
+# Peak RSS growth allowed to streaming PAGES pages (whole, the same PDF grows ~30 MB)
+BUDGET_MB = float(os.getenv("LARGE_PDF_BUDGET_MB", "24"))
+
+@pytest.fixture(scope="module")
+def large_pdf(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("large") / "large.pdf")
+    make_large_pdf(path, PAGES)
+    return path
+
+def run_child(mode, path, tmp_path):
+    """Extracts and writes `path` in a fresh process (so VmHWM is its own peak); returns its stats."""
+    database_url = f"sqlite:///{tmp_path / f'{mode}.db'}"
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_large_pdf", "--child", mode, path, database_url, str(PAGES_PER_TASK)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def test_streamed_peak_memory_stays_within_budget(large_pdf, tmp_path):
+    stream = run_child("stream", large_pdf, tmp_path)
+    whole = run_child("whole", large_pdf, tmp_path)
+    assert stream["rows"] == whole["rows"] > 0
+    assert stream["peak_rss_mb"] - stream["base_rss_mb"] <= BUDGET_MB
+
+def test_failed_stream_leaves_no_rows(db, large_pdf):
+    pdf = PDFMetadata(pmid="1", processed=False)
+    db.add(pdf)
+    db.commit()
+
+    def failing():
+        for i, chunk in enumerate(stream_extraction(large_pdf, pages_per_task=PAGES_PER_TASK)):
+            if i == 2:
+                raise RuntimeError("simulated extraction failure")
+            yield chunk
+
+    with pytest.raises(RuntimeError):
+        stream_document(LayoutFeatureWriter(db), pdf.id, failing(), "0" * 64)
+    db.expire_all()
+    assert db.scalar(select(func.count()).select_from(LayoutFeatures).where(LayoutFeatures.pdf_id == pdf.id)) == 0
+    assert not db.get(PDFMetadata, pdf.id).processed
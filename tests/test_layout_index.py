@@ -0,0 +1,40 @@
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import make_pdf
+from src.data.extraction import extract_pdf
+from src.models.inference import AcademicEngine
+from src.models.layout_index import table_regions
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    engine = AcademicEngine(str(tmp_path_factory.mktemp("model") / "missing.joblib"))
+    engine.load()  # No model: heuristic labels
+    return engine
+
+def extracted(tmp_path, **kwargs):
+    path = tmp_path / "source.pdf"
+    path.write_bytes(make_pdf(4, seed=1, **kwargs))
+    return extract_pdf(str(path))
+
+@pytest.mark.parametrize("columns", [1, 2])
+def test_table_is_inferred_from_line_geometry(engine, tmp_path, columns):
+    doc = extracted(tmp_path, images=False, columns=columns, table_rect=(60, 100, 535, 240))
+    choice = engine.choose_layout(doc)
+    assert (choice.layout, choice.pos, choice.c_type) == ("top", "top", "table")
+
+def test_running_text_has_no_table_regions(tmp_path):
+    for columns in (1, 2, 3):
+        doc = extracted(tmp_path, images=False, columns=columns)
+        assert table_regions(pd.DataFrame(doc.records)) == []
+
+def test_figure_is_still_an_image(engine, tmp_path):
+    doc = extracted(tmp_path, images=True, figure_rect=(315, 300, 535, 465))
+    choice = engine.choose_layout(doc)
+    assert (choice.layout, choice.pos, choice.c_type) == ("right", "middle", "image")
+
+def test_explicit_type_restricts_the_component(engine, tmp_path):
+    doc = extracted(tmp_path, images=False, table_rect=(60, 100, 535, 240))
+    choice = engine.choose_layout(doc, "image")
+    assert (choice.layout, choice.c_type) == ("full", "image")
+    assert engine.choose_layout(doc, "table").c_type == "table"
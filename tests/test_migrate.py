@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.data import db_session
+from src.data.db_session import Base, init_db
+from src.data.migrate import migrate_layout_schema, missing_schema, pending_changes
+
+@pytest.fixture
+def older_db(tmp_path, monkeypatch):
+    """A database one column and one index behind the models, as init_db's engine."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'older.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_layout_features_label"))
+        conn.execute(text("ALTER TABLE pdf_metadata DROP COLUMN extractor_version"))
+    monkeypatch.setattr(db_session, "engine", engine)
+    return engine
+
+def test_init_db_refuses_instead_of_altering(older_db):
+    with pytest.raises(RuntimeError, match="src.data.migrate"):
+        init_db()
+    assert missing_schema(older_db) == ([], ["pdf_metadata.extractor_version"], ["ix_layout_features_label"])
+
+def test_migrate_applies_the_pending_changes(older_db):
+    applied = migrate_layout_schema(older_db)
+    assert applied == ["add column pdf_metadata.extractor_version", "create index ix_layout_features_label"]
+    assert pending_changes(older_db) == []
+    init_db()
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from benchmarks.fixtures import FixtureServer, make_pdf
+from src.data import pdf_cache, pdf_processor
+from src.data.models_db import PDFMetadata
+from src.data.pdf_cache import PDFCache
+from src.data.work_queue import DONE, PENDING
+
+@pytest.fixture
+def server():
+    with FixtureServer({"1": make_pdf(1, seed=0), "2": b"<html>Service unavailable</html>"}) as server:
+        yield server
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(pdf_cache, "DEFAULT_CACHE_DIR", str(tmp_path))
+    return tmp_path
+
+def test_download_rejects_a_body_that_is_not_a_pdf(server, cache_dir):
+    cache = PDFCache()
+    assert cache.lookup("1") is None
+    assert cache.download("1", f"{server.base_url}/pdf/1.pdf") == cache.lookup("1")
+    with pytest.raises(ValueError, match="not a PDF"):
+        cache.download("2", f"{server.base_url}/pdf/2.pdf")
+    assert cache.lookup("2") is None
+    assert not os.listdir(cache_dir / "partial")
+    cache.close()
+
+def test_worker_forgets_a_cached_pdf_that_fails_to_open(db, server, cache_dir, monkeypatch):
+    server.pdfs["2"] = b"%PDF-1.4 truncated garbage"
+    monkeypatch.setattr(pdf_processor, "PMC_OA_API_URL", server.oa_url)
+    db.add_all([PDFMetadata(id=1, pmid="1"), PDFMetadata(id=2, pmid="2")])
+    db.commit()
+
+    pdf_processor.process_and_label(worker_id="test")
+    db.expire_all()
+    assert db.get(PDFMetadata, 1).status == DONE
+    assert db.get(PDFMetadata, 2).status == PENDING  # Retried later, with backoff
+    cache = PDFCache()
+    assert cache.lookup("1") is not None
+    assert cache.lookup("2") is None  # So the retry downloads it again
+    cache.close()
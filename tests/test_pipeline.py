@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+
+from benchmarks.fixtures import FixtureServer, make_pdf
+from src.data import pdf_cache, pdf_processor, work_queue
+from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.data.pdf_processor import process_and_label
+from src.data.pipeline import run_pipeline
+from src.data.work_queue import DONE, FAILED
+
+GOOD = {str(i): make_pdf(3, seed=i, images=i % 2 == 0) for i in range(1, 5)}
+BROKEN = b"%PDF-1.4 broken"  # Downloads fine, fails to open
+MISSING = "99"  # In the queue, answers 404
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    with FixtureServer({**GOOD, "5": BROKEN}) as server:
+        monkeypatch.setattr(pdf_processor, "PMC_OA_API_URL", server.oa_url)
+        monkeypatch.setattr(pdf_cache, "DEFAULT_CACHE_DIR", str(tmp_path / "cache"))
+        monkeypatch.setattr(work_queue, "MAX_ATTEMPTS", 1)  # A failure is final, so its status tells
+        yield server
+
+def queue_pdfs(db):
+    db.query(LayoutFeatures).delete()
+    db.query(PDFMetadata).delete()
+    db.add_all(PDFMetadata(pmid=pmid, processed=False) for pmid in [*GOOD, "5", MISSING])
+    db.commit()
+
+def stored(db):
+    """{pmid: (status, processed, rows without ids)} after a run."""
+    db.expire_all()
+    columns = [c for c in LayoutFeatures.__table__.c if c.name not in ("id", "pdf_id")]
+    result = {}
+    for pdf in db.scalars(select(PDFMetadata)):
+        rows = db.execute(select(*columns).where(LayoutFeatures.pdf_id == pdf.id).order_by(LayoutFeatures.id)).all()
+        result[pdf.pmid] = (pdf.status, pdf.processed, [tuple(r) for r in rows])
+    return result
+
+def test_pipeline_stores_the_same_rows_as_the_serial_worker(db, server):
+    queue_pdfs(db)
+    process_and_label()
+    serial = stored(db)
+
+    queue_pdfs(db)
+    run_pipeline(download_workers=2, extract_workers=1)
+    assert stored(db) == serial
+    assert all(serial[pmid][2] for pmid in GOOD)
+
+def test_one_failed_pdf_fails_alone(db, server):
+    queue_pdfs(db)
+    run_pipeline(download_workers=2, extract_workers=1)
+    result = stored(db)
+
+    for pmid in GOOD:
+        assert result[pmid][:2] == (DONE, True)
+    for pmid in ("5", MISSING):  # Extraction and download failures
+        assert result[pmid] == (FAILED, False, [])
@@ -0,0 +1,40 @@
+import hashlib
+
+import pytest
+
+from benchmarks.fixtures import FixtureServer
+from src.data.models_db import PDFMetadata
+from src.data.pdf_cache import PDFCache
+from src.data.reextract import changed_content
+
+OLD, NEW = b"%PDF-1.4 old bytes", b"%PDF-1.4 new bytes"
+
+@pytest.fixture
+def server():
+    with FixtureServer({"1": OLD}) as server:
+        yield server
+
+@pytest.fixture
+def cache(tmp_path, server):
+    cache = PDFCache(root=str(tmp_path))
+    cache.put_url("1", f"{server.base_url}/pdf/1.pdf")
+    cache.download("1", f"{server.base_url}/pdf/1.pdf")
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def pdf(db):
+    db.add(PDFMetadata(id=1, pmid="1", processed=True, content_sha256=hashlib.sha256(OLD).hexdigest()))
+    db.commit()
+
+def test_failed_refresh_keeps_the_cached_copy(db, pdf, server, cache):
+    del server.pdfs["1"]  # Answers 404 now
+    assert changed_content(db, cache, refresh=True) == []
+    with open(cache.lookup("1"), "rb") as f:
+        assert f.read() == OLD
+
+def test_refresh_replaces_the_cached_copy_once_downloaded(db, pdf, server, cache):
+    server.pdfs["1"] = NEW
+    assert changed_content(db, cache, refresh=True) == [1]
+    with open(cache.lookup("1"), "rb") as f:
+        assert f.read() == NEW
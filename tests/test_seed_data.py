@@ -0,0 +1,28 @@
+from sqlalchemy import event, func, select
+
+from src.data.db_session import SessionLocal
+from src.data.models_db import PDFMetadata
+from src.data.seed_data import insert_new_pmids
+
+def test_ids_another_seeder_inserts_meanwhile_are_skipped(db):
+    db.add(PDFMetadata(pmid="1", processed=False))
+    db.commit()
+    engine = db.get_bind()
+    raced = []
+
+    def other_seeder(conn, cursor, statement, parameters, context, executemany):
+        # Runs just before this session's INSERT: another seeder stores "3" first
+        if statement.startswith("INSERT") and not raced:
+            raced.append(True)
+            other = SessionLocal()
+            other.add(PDFMetadata(pmid="3", processed=False))
+            other.commit()
+            other.close()
+
+    event.listen(engine, "before_cursor_execute", other_seeder)
+    try:
+        assert insert_new_pmids(db, ["1", "2", "3", "2", "4"]) == 2
+    finally:
+        event.remove(engine, "before_cursor_execute", other_seeder)
+    assert raced
+    assert db.scalar(select(func.count()).select_from(PDFMetadata)) == 4
@@ -0,0 +1,39 @@
+import json
+import threading
+import http.client
+
+import pytest
+
+from src.models import service
+
+@pytest.fixture
+def server():
+    server = service.create_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def post(conn, path, payload):
+    conn.request("POST", path, body=json.dumps(payload), headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+def fail(*args, **kwargs):
+    raise RuntimeError("boom")
+
+def test_generate_errors_answer_500_on_the_same_connection(server, monkeypatch):
+    conn = http.client.HTTPConnection(*server.server_address[:2], timeout=10)
+    monkeypatch.setattr(service, "build_document", fail)
+    assert post(conn, "/generate", {"layout": "top"}) == (500, {"error": "Generation failed."})
+
+    monkeypatch.setattr(server.engine, "choose_layout", fail)
+    rows = [{"x0": 0, "y0": 0, "width": 10, "height": 10, "font_size": 9, "is_bold": False}]
+    assert post(conn, "/generate", {"layout": "auto", "rows": rows}) == (500, {"error": "Layout selection failed."})
+
+    monkeypatch.undo()
+    status, body = post(conn, "/generate", {"layout": "top"})
+    assert status == 200 and body["tex"]
+    conn.close()
+    assert server.stats.summary()["/generate"]["count"] == 3
@@ -0,0 +1,28 @@
+from sqlalchemy import insert
+
+from src.data.db_session import engine
+from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.data.snapshot import exported_pdf_ids, export_snapshot, read_snapshot_chunks
+
+def add_pdf(db, pdf_id, feature_ids, processed=True):
+    db.add(PDFMetadata(id=pdf_id, pmid=str(pdf_id), processed=processed))
+    db.flush()
+    db.execute(insert(LayoutFeatures.__table__), [
+        {"id": i, "pdf_id": pdf_id, "page_number": 0, "y0": float(i), "label": "body"} for i in feature_ids
+    ])
+    db.commit()
+
+def test_pdf_committed_late_under_lower_ids_is_exported(db, tmp_path):
+    add_pdf(db, 1, range(100, 110))
+    add_pdf(db, 3, range(1, 5), processed=False)  # Still being written: not exported yet
+    export_snapshot(engine, str(tmp_path))
+    assert exported_pdf_ids(str(tmp_path)) == {1}
+
+    # Ids 50-59 were reserved before PDF 1's and committed after its export
+    add_pdf(db, 2, range(50, 60))
+    export_snapshot(engine, str(tmp_path))
+    assert exported_pdf_ids(str(tmp_path)) == {1, 2}
+    assert export_snapshot(engine, str(tmp_path)) is None
+
+    rows = sorted(len(chunk) for chunk in read_snapshot_chunks(str(tmp_path)))
+    assert rows == [10, 10]
@@ -0,0 +1,73 @@
+import json
+
+import joblib
+import pytest
+from sqlalchemy import insert
+
+from benchmarks.fixtures import synthetic_layout_frame
+from src.data.models_db import PDFMetadata, LayoutFeatures
+from src.models import trainer
+
+@pytest.fixture
+def export_dir(tmp_path, monkeypatch):
+    for name, file_name in [("MODEL_PATH", "layout_model.joblib"), ("META_PATH", "layout_model.meta.json"),
+                            ("ANCHORS_PATH", "layout_model.anchors.joblib"), ("COVERED_PATH", "layout_model.pdfs.json")]:
+        monkeypatch.setattr(trainer, name, str(tmp_path / file_name))
+    return tmp_path
+
+def add_pdf(db, pdf_id, first_feature_id, rows=300, processed=True):
+    """Stores a processed PDF whose layout_features ids start at `first_feature_id`."""
+    db.add(PDFMetadata(id=pdf_id, pmid=str(pdf_id), processed=processed, content_sha256=f"{pdf_id:064x}"))
+    db.flush()
+    frame = synthetic_layout_frame(rows, pdfs=1, seed=pdf_id).assign(pdf_id=pdf_id)
+    frame["id"] = range(first_feature_id, first_feature_id + rows)
+    db.execute(insert(LayoutFeatures.__table__), frame.to_dict("records"))
+    db.commit()
+
+def covered(export_dir):
+    with open(export_dir / "layout_model.pdfs.json") as f:
+        return {int(pdf_id) for pdf_id in json.load(f)}
+
+def test_since_last_trains_pdfs_committed_late_under_lower_ids(db, export_dir):
+    for pdf_id in range(1, 9):
+        add_pdf(db, pdf_id, 10_000 + pdf_id * 1_000)
+    add_pdf(db, 20, 1, processed=False)  # Still being written: not trained yet
+    trainer.train_incremental(chunksize=1_000, trees_per_chunk=2)
+    assert covered(export_dir) == set(range(1, 9))
+    trees = joblib.load(export_dir / "layout_model.joblib").n_estimators
+
+    # Ids 2001-2300 were reserved before the trained rows and committed after
+    add_pdf(db, 9, 2_001)
+    trainer.train_incremental(chunksize=1_000, trees_per_chunk=2, since_last=True)
+    assert covered(export_dir) == set(range(1, 10))
+    assert joblib.load(export_dir / "layout_model.joblib").n_estimators > trees
+
+    # Nothing new: the saved version is left alone
+    trainer.train_incremental(chunksize=1_000, trees_per_chunk=2, since_last=True)
+    with open(export_dir / "layout_model.meta.json") as f:
+        assert json.load(f)["version"] == 2
+
+def test_since_last_refuses_a_model_the_full_trainer_replaced(db, export_dir):
+    for pdf_id in range(1, 9):
+        add_pdf(db, pdf_id, pdf_id * 1_000)
+    trainer.train_incremental(chunksize=1_000, trees_per_chunk=2)
+    trainer.train_layout_model(chunksize=1_000, model_path=trainer.MODEL_PATH,
+                               params={**trainer.DEFAULT_PARAMS, "n_estimators": 3}, compact={"max_depth": 4})
+    assert not (export_dir / "layout_model.pdfs.json").exists()
+    assert not (export_dir / "layout_model.meta.json").exists()
+
+    add_pdf(db, 9, 20_000)
+    trainer.train_incremental(chunksize=1_000, trees_per_chunk=2, since_last=True)
+    assert joblib.load(export_dir / "layout_model.joblib").n_estimators == 3
+
+def test_incremental_class_weights_are_global_and_fixed(db, export_dir, recwarn):
+    for pdf_id in range(1, 9):
+        add_pdf(db, pdf_id, pdf_id * 1_000)
+    trainer.train_incremental(chunksize=500, trees_per_chunk=2)
+    weights = joblib.load(export_dir / "layout_model.joblib").class_weight
+    assert len(weights) > 1 and weights == trainer.class_weights(trainer._create_engine(), pdf_ids=range(1, 9))
+
+    add_pdf(db, 9, 20_000)
+    trainer.train_incremental(chunksize=500, trees_per_chunk=2, since_last=True)
+    assert joblib.load(export_dir / "layout_model.joblib").class_weight == weights
+    assert not [w for w in recwarn if "class_weight" in str(w.message)]
@@ -0,0 +1,53 @@
+import threading
+import time
+
+import pytest
+
+from src.data import work_queue
+from src.data.db_session import SessionLocal
+from src.data.models_db import PDFMetadata
+from src.data.work_queue import claim_batch, claim_with_retry, heartbeat, utcnow
+
+def pending_pdfs(db, n):
+    db.add_all(PDFMetadata(id=i, pmid=str(i), processed=False) for i in range(1, n + 1))
+    db.commit()
+
+def test_claim_without_returning_reads_back_only_its_own_rows(db, monkeypatch):
+    pending_pdfs(db, 4)
+    monkeypatch.setattr(db.get_bind().dialect, "update_returning", False)
+    assert [pdf_id for pdf_id, _ in claim_batch(db, "worker-1", 2)] == [1, 2]
+    # 1 and 2 are still in flight: the next claim must not hand them out again
+    assert [pdf_id for pdf_id, _ in claim_batch(db, "worker-1", 2)] == [3, 4]
+
+def test_claim_errors_are_retried_with_backoff(db, monkeypatch):
+    pending_pdfs(db, 1)
+    calls, sleeps = [], []
+
+    def flaky(db, worker_id, batch_size=None):
+        calls.append(worker_id)
+        if len(calls) < 3:
+            raise RuntimeError("database is locked")
+        return claim_batch(db, worker_id, batch_size)
+
+    monkeypatch.setattr(work_queue, "claim_batch", flaky)
+    monkeypatch.setattr(work_queue.time, "sleep", sleeps.append)
+    assert claim_with_retry(db, "worker-1") == [(1, "1")]
+    assert sleeps == [1.0, 2.0]
+
+    calls.clear()
+    with pytest.raises(RuntimeError):
+        claim_with_retry(db, "worker-1", retries=1)
+
+def test_heartbeat_extends_leases_between_claims(db):
+    pending_pdfs(db, 1)
+    claim_batch(db, "worker-1", 1, lease_seconds=1)
+
+    stop = threading.Event()
+    thread = threading.Thread(target=heartbeat, args=(SessionLocal, "worker-1", stop, 0.05))
+    thread.start()
+    time.sleep(0.3)
+    stop.set()
+    thread.join()
+
+    db.expire_all()
+    assert (db.get(PDFMetadata, 1).lease_expires_at - utcnow()).total_seconds() > 60